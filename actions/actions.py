@@ -1,18 +1,11 @@
 """Custom actions"""
 import os
-from typing import Dict, Text, Any, List
+import asyncio
+import threading
+from typing import Dict, Text, Any, List, Optional, Tuple, Union
 import logging
 from dateutil import parser
-import sqlalchemy as sa
 import json
-from openai import AzureOpenAI
-from datetime import datetime
-
-client = AzureOpenAI(
-    api_key=os.environ.get("OPENAI_API_KEY"),
-    api_version="2024-02-15-preview",
-    azure_endpoint=os.environ.get("OPENAI_ENDPOINT")
-)
 
 from rasa_sdk.interfaces import Action
 from rasa_sdk.events import (
@@ -30,11 +23,15 @@ from rasa_sdk.types import DomainDict
 from rasa_sdk import Tracker, FormValidationAction
 from rasa_sdk.executor import CollectingDispatcher
 
-import psycopg2
-import psycopg2.extras
-
-from actions.profile_db import create_database, ProfileDB
-from actions.custom_forms import CustomFormValidationAction
+from actions.profile_db import create_database, create_profile_engine, ProfileDB
+from actions.async_profile_db import AsyncProfileDB, create_async_profile_engine
+from actions.feedback_db import FeedbackDB, create_feedback_engine, get_feedback_db_url
+from actions.outbox import Outbox, OutboxFlusher, create_outbox_engine
+from actions.custom_forms import CustomFormValidationAction, ValidationSummary
+from actions.catalog import pages_catalog, help_catalog
+from actions.llm_gateway import llm_gateway
+from actions.speculation import user_story_drafts
+from actions.single_flight import single_flight
 
 logger = logging.getLogger(__name__)
 
@@ -42,10 +39,60 @@ logger = logging.getLogger(__name__)
 # It is populated the first time `ActionSessionStart.run()` is called .
 PROFILE_DB_NAME = os.environ.get("PROFILE_DB_NAME", "profile")
 PROFILE_DB_URL = os.environ.get("PROFILE_DB_URL", f"sqlite:///{PROFILE_DB_NAME}.db")
-ENGINE = sa.create_engine(PROFILE_DB_URL)
-create_database(ENGINE, PROFILE_DB_NAME)
+# With "true" new sessions only get an account row, sample transactions,
+# recipients and cards are generated when a query first needs them
+PROFILE_DB_LAZY_POPULATE = os.environ.get(
+    "PROFILE_DB_LAZY_POPULATE", "false"
+).lower() in ("1", "true", "yes")
+# Run profile queries on the asyncio drivers (aiosqlite, asyncpg) instead of
+# blocking the event loop
+PROFILE_DB_ASYNC = os.environ.get(
+    "PROFILE_DB_ASYNC", "false"
+).lower() in ("1", "true", "yes")
+
+if PROFILE_DB_ASYNC:
+    ENGINE = create_async_profile_engine(PROFILE_DB_URL)
+    profile_db = AsyncProfileDB(ENGINE, lazy=PROFILE_DB_LAZY_POPULATE)
+else:
+    ENGINE = create_profile_engine(PROFILE_DB_URL)
+    create_database(ENGINE, PROFILE_DB_NAME)
+    profile_db = ProfileDB(ENGINE, lazy=PROFILE_DB_LAZY_POPULATE)
+
+# Confirmed feedback is written to `chatbot_results` through one pooled engine
+# shared by every persisting action. No connection is opened until first use.
+FEEDBACK_ENGINE = create_feedback_engine(get_feedback_db_url())
+feedback_db = FeedbackDB(FEEDBACK_ENGINE)
+
+# Submit actions only append to a local outbox, a background thread delivers
+# the rows to `chatbot_results` and retries while the database is unavailable.
+# Both are created by the first conversation, not when the actions are imported.
+outbox_flusher: Optional[OutboxFlusher] = None
+outbox_flusher_lock = threading.Lock()
+
+
+def get_outbox_flusher() -> OutboxFlusher:
+    """The outbox flusher, opening the outbox and starting its thread on first use"""
+    global outbox_flusher
+    with outbox_flusher_lock:
+        if outbox_flusher is None:
+            outbox_flusher = OutboxFlusher(Outbox(create_outbox_engine()), feedback_db)
+            outbox_flusher.start()
+    return outbox_flusher
+
+
+def queue_feedback(row: Dict[Text, Any]) -> Text:
+    """Append a `chatbot_results` row to the outbox and wake the flusher up"""
+    flusher = get_outbox_flusher()
+    idempotency_key = flusher.outbox.append(row)
+    flusher.notify()
+    return idempotency_key
+
+
+async def async_queue_feedback(row: Dict[Text, Any]) -> Text:
+    """`queue_feedback` in a thread, the outbox is written to synchronously"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, queue_feedback, row)
 
-profile_db = ProfileDB(ENGINE)
 
 NEXT_FORM_NAME = {
     "feature_request": "feature_request_form",
@@ -53,6 +100,26 @@ NEXT_FORM_NAME = {
     "generic_comment": "generic_comment_form",
 }
 
+# Slots the suggested user story is generated from, besides the final `feature_description`
+USER_STORY_SLOTS = [
+    "bb_request_description",
+    "feature_challenges",
+    "feature_goal",
+    "feature_use_case",
+    "feature_target_area",
+    "feature_criteria",
+    "feature_priority",
+    "feature_form_temp_challenges",
+    "feature_form_temp_goal",
+    "feature_form_temp_use_case",
+    "feature_form_temp_area",
+    "feature_form_temp_criteria",
+    "feature_form_temp_priority",
+]
+
+# Answers to the final description question which leave a drafted user story as it is
+NO_MORE_DETAILS = ["no", "nope", "none", "nothing", "nothing else", "n/a", "no more details", "that's all"]
+
 FORM_DESCRIPTION = {
     "feature_request_form": "request new feature", # Form to request new feature or function
     "bug_report_form": "report bug and errors", # Form to report a bug
@@ -85,26 +152,15 @@ class ActionProvidePageInfo(Action):
     def name(self) -> Text:
         return "action_find_page"
 
-    def run(self, dispatcher: CollectingDispatcher,
+    async def run(self, dispatcher: CollectingDispatcher,
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
-        # Construct the absolute path to the JSON file
-        dir_path = os.path.dirname(os.path.realpath(__file__))
-        json_file_path = os.path.join(dir_path, 'pages_info.json')
-
-        # Load pages URL info data
-        with open(json_file_path) as json_file:
-            pages_data = json.load(json_file)
-
-        # Extract the slot 'page' if it exists
-        page_slot = tracker.get_slot('page')
-        if page_slot:
-            page_slot = page_slot.lower()  # Convert to lower case for case-insensitive matching
-            for page in pages_data:
-                if page_slot == page["keyword"].lower():  # Check if the slot matches the keyword
-                    dispatcher.utter_message(text=f"Here is the information you requested: <a target='_new' href='{page['url']}' >{page['url']}</a>")
-                    return []
+        # Look up the slot 'page' in the pages URL catalog, tolerating typos
+        page = pages_catalog.find(tracker.get_slot('page'))
+        if page:
+            dispatcher.utter_message(text=f"Here is the information you requested: <a target='_new' href='{page['url']}' >{page['url']}</a>")
+            return []
 
         dispatcher.utter_message(text="Sorry, I couldn't find the information you were looking for.")
         return []
@@ -114,26 +170,15 @@ class ActionExplainSoftwarePart(Action):
     def name(self) -> Text:
         return "action_explain_feature"
 
-    def run(self, dispatcher: CollectingDispatcher,
+    async def run(self, dispatcher: CollectingDispatcher,
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
-        # Construct the absolute path to the JSON file
-        dir_path = os.path.dirname(os.path.realpath(__file__))
-        json_file_path = os.path.join(dir_path, 'help_descriptions.json')
-
-        # Load explanations of functions data
-        with open(json_file_path) as json_file:
-            parts_data = json.load(json_file)
-
-        # Extract the slot 'feature' if it exists
-        feature_slot = tracker.get_slot('feature_to_explain')
-        if feature_slot:
-            feature_slot = feature_slot.lower()  # Convert to lower case for case-insensitive matching
-            for feature in parts_data:
-                if feature_slot == feature["keyword"].lower():  # Check if the slot matches the keyword
-                    dispatcher.utter_message(text=f"Here is the explanation: {feature['explanation']}")
-                    return []
+        # Look up the slot 'feature_to_explain' in the explanations catalog, tolerating typos
+        feature = help_catalog.find(tracker.get_slot('feature_to_explain'))
+        if feature:
+            dispatcher.utter_message(text=f"Here is the explanation: {feature['explanation']}")
+            return []
 
         dispatcher.utter_message(text="Sorry, I couldn't find the explanation you were looking for.")
         return []
@@ -145,22 +190,7 @@ class ActionRequestFeature(Action):
         """Unique identifier of the action"""
         return "action_request_feature"
 
-    def get_db_connection(self):
-        """Create and return a new database connection."""
-        try:
-            connection = psycopg2.connect(
-                dbname=os.environ.get("RASA_DB_NAME"),
-                user=os.environ.get("RASA_DB_USER"),
-                password=os.environ.get("RASA_DB_PASSWORD"),
-                host=os.environ.get("RASA_DB_HOST"),
-                port=os.environ.get("RASA_DB_PORT")
-            )
-
-            return connection
-        except Exception as e:
-            print("Unable to connect to the database:", e)
-            return None
-
+    @single_flight
     async def run(
             self,
             dispatcher: CollectingDispatcher,
@@ -214,26 +244,18 @@ class ActionRequestFeature(Action):
 
         if tracker.get_slot("zz_confirm_form") == "yes":
 
-            # Establish database connection
-            conn = self.get_db_connection()
-            if conn is not None:
-                cursor = conn.cursor()
-                try:
-                    # Insert data into the database
-                    query = """
-                        INSERT INTO chatbot_results (sender_id, user_story, initial_description, chat_description, createdAt, updatedAt)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                    """
-                    cursor.execute(query, (
-                    sender_id, user_story, initial_description, chat_description, datetime.now(), datetime.now()))
-                    conn.commit()
-                    dispatcher.utter_message(response="utter_feedback_received")
-                except Exception as e:
-                    print("Failed to insert into database:", e)
-                    dispatcher.utter_message(text="Failed to save feature request.")
-                finally:
-                    cursor.close()
-                    conn.close()
+            try:
+                # Queue the data for insertion into the database
+                await async_queue_feedback({
+                    "sender_id": sender_id,
+                    "user_story": user_story,
+                    "initial_description": initial_description,
+                    "chat_description": chat_description,
+                })
+                dispatcher.utter_message(response="utter_feedback_received")
+            except Exception:
+                logger.exception("Failed to queue feature request")
+                dispatcher.utter_message(text="Failed to save feature request.")
         else:
             # Respond if user selects No to send feedback
             dispatcher.utter_message(response="utter_feedback_cancelled")
@@ -250,6 +272,7 @@ class ActionBugReport(Action):
         """Unique identifier of the action"""
         return "action_bug_report"
 
+    @single_flight
     async def run(
         self,
         dispatcher: CollectingDispatcher,
@@ -272,6 +295,17 @@ class ActionBugReport(Action):
             bug_description = tracker.get_slot("bug_description")
             # Log the bug report details
             print("Bug report made: " + request_subject + ": " + bug_description)
+            # Queue the bug report for insertion into the database
+            await async_queue_feedback({
+                "sender_id": tracker.sender_id,
+                "user_story": None,
+                "initial_description": json.dumps({
+                    "feedback_type": "bug_report",
+                    "request_subject": request_subject,
+                    "bug_description": bug_description,
+                }),
+                "chat_description": None,
+            })
             # Notify the user that the feedback has been received
             dispatcher.utter_message(response="utter_feedback_received")
         else:
@@ -288,6 +322,7 @@ class ActionGenericComment(Action):
         """Unique identifier of the action"""
         return "action_generic_comment"
 
+    @single_flight
     async def run(
         self,
         dispatcher: CollectingDispatcher,
@@ -310,6 +345,17 @@ class ActionGenericComment(Action):
             comment_description = tracker.get_slot("comment_description")
             # Log the comment or feedback details
             print("Comment or feedback made: " + request_subject + ": " + comment_description)
+            # Queue the comment for insertion into the database
+            await async_queue_feedback({
+                "sender_id": tracker.sender_id,
+                "user_story": None,
+                "initial_description": json.dumps({
+                    "feedback_type": "generic_comment",
+                    "request_subject": request_subject,
+                    "comment_description": comment_description,
+                }),
+                "chat_description": None,
+            })
             # Notify the user that the feedback has been received
             dispatcher.utter_message(response="utter_feedback_received")
         else:
@@ -327,27 +373,43 @@ class ActionSessionStart(Action):
         """Unique identifier of the action"""
         return "action_session_start"
 
-    @staticmethod
+    # List of slots to be carried over when restarting
+    relevant_slots = [
+        "AA_CONTINUE_FORM",
+        "feature_description",
+        "bug_description",
+        "comment_description",
+        "zz_confirm_form"]
+
+    # events after which earlier slot values no longer apply
+    slot_reset_events = {"restart", "reset_slots"}
+
+    @classmethod
     def _slot_set_events_from_tracker(
+            cls,
             tracker: "Tracker",
     ) -> List["SlotSet"]:
-        """Fetches SlotSet events from tracker and carries over keys and values"""
-
-        # List of slots to be carried over when restarting
-        relevant_slots = [
-            "AA_CONTINUE_FORM",
-            "feature_description",
-            "bug_description",
-            "comment_description",
-            "zz_confirm_form"]
+        """Carries over the latest value of each relevant slot, one `SlotSet` each.
+        Values come from `tracker.slots`; slots missing there are looked up by
+        walking the events backwards until all of them are found.
+        """
+        values = {
+            slot: tracker.slots[slot]
+            for slot in cls.relevant_slots
+            if slot in tracker.slots
+        }
+        missing = {slot for slot in cls.relevant_slots if slot not in values}
+        for event in reversed(tracker.events):
+            if not missing or event.get("event") in cls.slot_reset_events:
+                break
+            if event.get("event") == "slot" and event.get("name") in missing:
+                values[event["name"]] = event.get("value")
+                missing.discard(event["name"])
 
         return [
-            SlotSet(
-                key=event.get("name"),
-                value=event.get("value"),
-            )
-            for event in tracker.events
-            if event.get("event") == "slot" and event.get("name") in relevant_slots
+            SlotSet(key=slot, value=values[slot])
+            for slot in cls.relevant_slots
+            if values.get(slot) is not None
         ]
 
     async def run(
@@ -358,6 +420,9 @@ class ActionSessionStart(Action):
     ) -> List[EventType]:
         """Executes the custom action"""
 
+        # Starts delivering the feedback a previous run of the server left in the outbox
+        await asyncio.get_running_loop().run_in_executor(None, get_outbox_flusher)
+
         # The session should begin with a `session_started` event
         events = [SessionStarted()]
 
@@ -558,10 +623,23 @@ class ActionSwitchBackAsk(Action):
 class ValidateRequestFeatureForm(CustomFormValidationAction):
     """Validates Slots of the request_feature_form"""
 
+    # Required slots, requested in this order while they are empty
+    slot_order = [
+        "bb_request_description",
+        "feature_challenges",
+        "feature_use_case",
+        "feature_target_area",
+        "feature_goal",
+        "feature_criteria",
+        "feature_priority",
+        "feature_description",
+    ]
+
     def name(self) -> Text:
         """Unique identifier of the action"""
         return "validate_feature_request_form"
 
+    @single_flight
     async def run(
             self, dispatcher: CollectingDispatcher, tracker: Tracker, domain: Dict
     ) -> List[EventType]:
@@ -577,31 +655,27 @@ class ValidateRequestFeatureForm(CustomFormValidationAction):
         # If user answers /deny, exit the form loop
         if tracker.get_slot("AA_CONTINUE_FORM") == "no":
             print("Checking AA_CONTINUE_FORM")
+            user_story_drafts.cancel(tracker.sender_id)
             return [SlotSet("AA_CONTINUE_FORM", None), SlotSet("requested_slot", None), ActiveLoop(None)]
 
-        # Validate each slot and prepare messages if necessary
-        required_slots = [
-            "bb_request_description",
-            "feature_challenges",
-            "feature_use_case",
-            "feature_target_area",
-            "feature_goal",
-            "feature_criteria",
-            "feature_priority",
-            "feature_description",
-        ]
+        summary = self.validation_summary(tracker, events)
+
+        # Once every field the user story depends on is filled, draft it in the background, so it is
+        # ready by the time the user has answered the final description question. The fields do not
+        # change while that question is asked, so the draft is started once and never restarted.
+        if summary.first_empty_slot == "feature_description" and summary.get_slot("feature_form_temp_goal") is not None:
+            story_fields = self.user_story_fields(summary)
+            user_story_drafts.start(
+                tracker.sender_id, story_fields, lambda: self.generate_user_story(story_fields)
+            )
 
-        for slot_name in required_slots:
-            slot_value = tracker.get_slot(slot_name)
-            if not slot_value:  # Check if the slot is filled
-                # Set the slot to request the user to fill it if it is empty
-                events.append(SlotSet("requested_slot", slot_name))
-                # Send message to the user prompting for this specific slot
-                break  # Break after the first empty slot is found
+        # Request the first required slot which is still empty
+        if summary.first_empty_slot:
+            events.append(SlotSet("requested_slot", summary.first_empty_slot))
 
         return events
 
-    def validate_bb_request_description(
+    async def validate_bb_request_description(
             self,
             slot_value: Any,
             dispatcher: CollectingDispatcher,
@@ -644,9 +718,8 @@ class ValidateRequestFeatureForm(CustomFormValidationAction):
 
         try:
             # Request completion from Azure OpenAI
-            completion = client.chat.completions.create(
-                model="gpt-35-fallback",  # Use the appropriate model
-                messages=message_text,
+            response = await llm_gateway.complete(
+                message_text,
                 temperature=0.7,
                 max_tokens=800,
                 top_p=0.95,
@@ -654,14 +727,12 @@ class ValidateRequestFeatureForm(CustomFormValidationAction):
                 presence_penalty=0,
                 stop=None
             )
-
-            response = completion.choices[0].message.content
-            print(response)  # Print the response for debugging
+            logger.debug(f"Request description completion: {response}")
 
             # Parse the JSON response
             extracted_data = json.loads(response)
 
-            print(extracted_data)
+            logger.debug(f"Extracted request fields: {extracted_data}")
             # Ensure all keys are present in the parsed data, if non-existing then add to the keys
             required_keys = ["goal_and_objective", "pain_points_and_challenges", "use_case", "target_area",
                              "acceptance_criteria", "priority_and_urgency"]
@@ -690,7 +761,7 @@ class ValidateRequestFeatureForm(CustomFormValidationAction):
             dispatcher.utter_message(text="There was an error processing your request. Please try again.")
             return {"bb_request_description": None}
 
-    def validate_feature_description(
+    async def validate_feature_description(
             self,
             slot_value: Any,
             dispatcher: CollectingDispatcher,
@@ -699,22 +770,44 @@ class ValidateRequestFeatureForm(CustomFormValidationAction):
     ) -> Dict[Text, Any]:
         """Validate `feature_description` value."""
 
-        # Get slot values
-        bb_request_description = tracker.get_slot("bb_request_description")
-        feature_challenges = tracker.get_slot("feature_challenges")
-        feature_goal = tracker.get_slot("feature_goal")
-        feature_use_case = tracker.get_slot("feature_use_case")
-        feature_target_area = tracker.get_slot("feature_target_area")
-        feature_criteria = tracker.get_slot("feature_criteria")
-        feature_priority = tracker.get_slot("feature_priority")
-        feature_description = slot_value
+        # If the description is too short, return a None slot to re-prompt.
+        if len(slot_value) < 2:
+            dispatcher.utter_message(text="Description must be at least 2 character.")
+            return {"feature_description": None}
 
-        feature_form_temp_challenges = tracker.get_slot("feature_form_temp_challenges")
-        feature_form_temp_goal = tracker.get_slot("feature_form_temp_goal")
-        feature_form_temp_use_case = tracker.get_slot("feature_form_temp_use_case")
-        feature_form_temp_area = tracker.get_slot("feature_form_temp_area")
-        feature_form_temp_criteria = tracker.get_slot("feature_form_temp_criteria")
-        feature_form_temp_priority = tracker.get_slot("feature_form_temp_priority")
+        story_fields = self.user_story_fields(tracker)
+
+        # A draft started in the background from the same fields is used when the description adds
+        # nothing, only those replies are answered faster. Details are worked into a fresh user story,
+        # refining the draft would cost another completion after waiting for the draft, which is no
+        # faster than generating it once.
+        generated_user_story = None
+        if slot_value.strip().lower().strip(".!") in NO_MORE_DETAILS:
+            generated_user_story = await user_story_drafts.take(tracker.sender_id, story_fields)
+        else:
+            user_story_drafts.cancel(tracker.sender_id)
+        if not generated_user_story:
+            generated_user_story = await self.generate_user_story(story_fields, slot_value)
+
+        # Setting the 'user_story' slot
+        return {
+            "feature_description": slot_value,
+            "user_story": generated_user_story  # Now this slot change will be effectively returned
+        }
+
+    @staticmethod
+    def user_story_fields(slots: Union[Tracker, ValidationSummary]) -> Tuple[Tuple[Text, Any], ...]:
+        """Slot values the user story is generated from, apart from `feature_description`"""
+        return tuple((slot, slots.get_slot(slot)) for slot in USER_STORY_SLOTS)
+
+    @staticmethod
+    async def generate_user_story(
+            story_fields: Tuple[Tuple[Text, Any], ...],
+            feature_description: Optional[Text] = None,
+    ) -> Text:
+        """Ask the LLM for a user story, a draft if `feature_description` is not known yet"""
+        fields = dict(story_fields)
+        description = f"Description: {feature_description}\n" if feature_description is not None else ""
 
         # Once user enters text for final description field, then all relevant fields are sent to LLM to
         # generate a suggested user story before user's final confirmation.
@@ -724,29 +817,30 @@ class ValidateRequestFeatureForm(CustomFormValidationAction):
                 "content": (
                     f"Given below components, generate a user story. Return user story within 1-2 sentence and provide "
                     f"no explanations. The fields after initial description are secondary as fields before that take precedent."
-                    f"Pain points and challenges to resolve: {feature_challenges}\n"
-                    f"Goal and objectives: {feature_goal}\n"
-                    f"Use case and functionality: {feature_use_case}\n"
-                    f"Target area or section: {feature_target_area}\n"
-                    f"Priority: {feature_priority}\n"
-                    f"Criteria for acceptance or completion: {feature_criteria}\n"
-                    f"Description: {feature_description}\n"
+                    f"Pain points and challenges to resolve: {fields['feature_challenges']}\n"
+                    f"Goal and objectives: {fields['feature_goal']}\n"
+                    f"Use case and functionality: {fields['feature_use_case']}\n"
+                    f"Target area or section: {fields['feature_target_area']}\n"
+                    f"Priority: {fields['feature_priority']}\n"
+                    f"Criteria for acceptance or completion: {fields['feature_criteria']}\n"
+                    f"{description}"
 
                     "Below are user's initial description and identified temporary components:\n"
-                    f"Initial description: {bb_request_description}\n"
-                    f"Pain points and challenges to resolve: {feature_form_temp_challenges}\n"
-                    f"Goal and objectives: {feature_form_temp_goal}\n"
-                    f"Use case and functionality: {feature_form_temp_use_case}\n"
-                    f"Target area or section: {feature_form_temp_area}\n"
-                    f"Criteria: {feature_form_temp_criteria}\n"
-                    f"Feature priority: {feature_form_temp_priority}\n"
+                    f"Initial description: {fields['bb_request_description']}\n"
+                    f"Pain points and challenges to resolve: {fields['feature_form_temp_challenges']}\n"
+                    f"Goal and objectives: {fields['feature_form_temp_goal']}\n"
+                    f"Use case and functionality: {fields['feature_form_temp_use_case']}\n"
+                    f"Target area or section: {fields['feature_form_temp_area']}\n"
+                    f"Criteria: {fields['feature_form_temp_criteria']}\n"
+                    f"Feature priority: {fields['feature_form_temp_priority']}\n"
                 ),
             },
         ]
 
-        completion = client.chat.completions.create(
-            model="gpt-35-fallback",  # "deployment_name"
-            messages=message_text,
+        # The user story is streamed, reading stops after its second sentence
+        return await llm_gateway.complete_sentences(
+            message_text,
+            max_sentences=2,
             temperature=0.7,
             max_tokens=800,
             top_p=0.95,
@@ -755,19 +849,6 @@ class ValidateRequestFeatureForm(CustomFormValidationAction):
             stop=None
         )
 
-        generated_user_story = completion.choices[0].message.content
-
-        # If the description is too short, return a None slot to re-prompt.
-        if len(slot_value) < 2:
-            dispatcher.utter_message(text="Description must be at least 2 character.")
-            return {"feature_description": None}
-
-        # Setting the 'user_story' slot
-        return {
-            "feature_description": slot_value,
-            "user_story": generated_user_story  # Now this slot change will be effectively returned
-        }
-
     def validate_user_story(
             self,
             slot_value: Any,
@@ -791,22 +872,11 @@ class ValidateRequestFeatureForm(CustomFormValidationAction):
         # Accept new value if it is longer than 3 characters and not "/affirm" or "/deny"
         return {"user_story": slot_value}
 
-    async def validate_zz_confirm_form(
-            self,
-            value: Text,
-            dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any],
-    ) -> Dict[Text, Any]:
-        """Validates value of 'zz_confirm_form' slot"""
-        if value in ["yes", "no"]:
-            return {"zz_confirm_form": value}
-
-        return {"zz_confirm_form": None}
-
 class ValidateBugReportForm(CustomFormValidationAction):
     """Validates Slots of the bug_report"""
 
+    slot_order = ["bug_description"]
+
     def name(self) -> Text:
         """Unique identifier of the action"""
         return "validate_bug_report_form"
@@ -820,30 +890,19 @@ class ValidateBugReportForm(CustomFormValidationAction):
         # For 'spend' type transactions we need to know the vendor_name
         request_subject = tracker.get_slot("request_subject")
         if request_subject:
-            bug_description = tracker.get_slot("bug_description")
-            if not bug_description:
-                # Request the bug_description slot if it is not filled
-                events.append(SlotSet("requested_slot", "bug_description"))
+            # Request the bug_description slot if it is not filled
+            first_empty_slot = self.validation_summary(tracker, events).first_empty_slot
+            if first_empty_slot:
+                events.append(SlotSet("requested_slot", first_empty_slot))
 
         return events
 
-    async def validate_zz_confirm_form(
-        self,
-        value: Text,
-        dispatcher: CollectingDispatcher,
-        tracker: Tracker,
-        domain: Dict[Text, Any],
-    ) -> Dict[Text, Any]:
-        """Validates value of 'zz_confirm_form' slot"""
-        if value in ["yes", "no"]:
-            return {"zz_confirm_form": value}
-
-        return {"zz_confirm_form": None}
-
 
 class ValidateGenericCommentForm(CustomFormValidationAction):
     """Validates Slots of the generic_comment_form"""
 
+    slot_order = ["comment_description"]
+
     def name(self) -> Text:
         """Unique identifier of the action"""
         return "validate_generic_comment_form"
@@ -857,31 +916,19 @@ class ValidateGenericCommentForm(CustomFormValidationAction):
         # Check if request_subject slot is filled
         request_subject = tracker.get_slot("request_subject")
         if request_subject:
-            # Check if comment_description slot is filled
-            comment_description = tracker.get_slot("comment_description")
-            if not comment_description:
-                # Request the comment_description slot if it is not filled
-                events.append(SlotSet("requested_slot", "comment_description"))
+            # Request the comment_description slot if it is not filled
+            first_empty_slot = self.validation_summary(tracker, events).first_empty_slot
+            if first_empty_slot:
+                events.append(SlotSet("requested_slot", first_empty_slot))
 
         return events
 
-    async def validate_zz_confirm_form(
-            self,
-            value: Text,
-            dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any],
-    ) -> Dict[Text, Any]:
-        """Validates value of 'zz_confirm_form' slot"""
-        if value in ["yes", "no"]:
-            return {"zz_confirm_form": value}
-
-        return {"zz_confirm_form": None}
-
 
 class ValidateGenericCommentForm(CustomFormValidationAction):
     """Validates Slots of the generic_comment_form"""
 
+    slot_order = ["comment_description"]
+
     def name(self) -> Text:
         """Unique identifier of the action"""
         return "validate_generic_comment_form"
@@ -895,24 +942,9 @@ class ValidateGenericCommentForm(CustomFormValidationAction):
         # Check if request_subject slot is filled
         request_subject = tracker.get_slot("request_subject")
         if request_subject:
-            # Check if comment_description slot is filled
-            comment_description = tracker.get_slot("comment_description")
-            if not comment_description:
-                # Request the comment_description slot if it is not filled
-                events.append(SlotSet("requested_slot", "comment_description"))
+            # Request the comment_description slot if it is not filled
+            first_empty_slot = self.validation_summary(tracker, events).first_empty_slot
+            if first_empty_slot:
+                events.append(SlotSet("requested_slot", first_empty_slot))
 
         return events
-
-    async def validate_zz_confirm_form(
-            self,
-            value: Text,
-            dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any],
-    ) -> Dict[Text, Any]:
-        """Validates value of 'zz_confirm_form' slot"""
-        if value in ["yes", "no"]:
-            return {"zz_confirm_form": value}
-
-        return {"zz_confirm_form": None}
-
@@ -0,0 +1,351 @@
+"""Asyncio variant of `ProfileDB`.
+
+Built on SQLAlchemy's asyncio extension, with aiosqlite for SQLite files and
+asyncpg for Postgres. The queries are the ones of `ProfileDB`: each call
+opens an `AsyncSession` and runs the `ProfileDB` method on its greenlet
+adapted sync session via `run_sync`, so the event loop keeps serving other
+conversations while the driver waits on the database.
+
+Methods return what their `ProfileDB` counterparts return, except for
+`search_transactions`, which returns a list instead of a lazy `Query`.
+"""
+import asyncio
+import threading
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Text, Union
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from actions.profile_db import (
+    PROFILE_DB_POOL_MAX,
+    PROFILE_DB_POOL_MIN,
+    PROFILE_CACHE_SIZE,
+    PROFILE_CACHE_TTL,
+    SQLITE_BUSY_TIMEOUT,
+    TRANSACTIONS_PAGE_SIZE,
+    Account,
+    CreditCard,
+    GeneralAccount,
+    ProfileDB,
+    create_tables,
+    migrate,
+)
+from actions.ttl_cache import TTLCache
+
+# asyncio drivers replacing the sync drivers of a `PROFILE_DB_URL`
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def create_async_profile_engine(
+    db_url: Union[Text, sa.engine.URL],
+    pool_min_size: int = PROFILE_DB_POOL_MIN,
+    pool_max_size: int = PROFILE_DB_POOL_MAX,
+) -> AsyncEngine:
+    """Create an asyncio engine from a sync profile database URL.
+    Tuned like `create_profile_engine`: WAL and a busy timeout for SQLite
+    files, a single shared connection for in-memory SQLite.
+    """
+    db_url = sa.engine.make_url(db_url)
+    backend = db_url.get_backend_name()
+    if backend in ASYNC_DRIVERS:
+        db_url = db_url.set(drivername=ASYNC_DRIVERS[backend])
+
+    if backend != "sqlite":
+        return create_async_engine(
+            db_url,
+            pool_size=pool_min_size,
+            max_overflow=max(pool_max_size - pool_min_size, 0),
+            pool_pre_ping=True,
+        )
+
+    if db_url.database in (None, "", ":memory:"):
+        return create_async_engine(db_url, poolclass=sa.pool.StaticPool)
+
+    engine = create_async_engine(
+        db_url,
+        poolclass=sa.pool.AsyncAdaptedQueuePool,
+        pool_size=pool_min_size,
+        max_overflow=max(pool_max_size - pool_min_size, 0),
+    )
+
+    @sa.event.listens_for(engine.sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+        cursor.close()
+
+    return engine
+
+
+class SessionProfileDB(ProfileDB):
+    """`ProfileDB` running its queries on the session it is given"""
+
+    # replaces the scoped session of `ProfileDB`
+    session = None
+
+    def __init__(
+        self,
+        session: Session,
+        seed: Optional[int],
+        lazy: bool,
+        populated: TTLCache,
+        accounts_lock: threading.Lock,
+        cache: TTLCache,
+        general_accounts: Dict[Text, List[GeneralAccount]],
+    ):
+        self.session = session
+        self.seed = seed
+        self.lazy = lazy
+        self._populated = populated
+        self._accounts_lock = accounts_lock
+        self.cache = cache
+        self.general_accounts = general_accounts
+
+    def search_transactions_list(self, session_id: Text, **kwargs: Any) -> List:
+        """`search_transactions`, loaded before the session is closed"""
+        return self.search_transactions(session_id, **kwargs).all()
+
+
+class AsyncProfileDB:
+    def __init__(
+        self, db_engine: AsyncEngine, seed: Optional[int] = None, lazy: bool = False
+    ):
+        self.engine = db_engine
+        self.seed = seed
+        self.lazy = lazy
+        self.Session = sessionmaker(
+            bind=self.engine, class_=AsyncSession, expire_on_commit=False
+        )
+        # shared by the sessions of all calls
+        self._populated = TTLCache(maxsize=PROFILE_CACHE_SIZE, ttl=None)
+        self._accounts_lock = threading.Lock()
+        self.cache = TTLCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL)
+        # sessions whose account exists, bounded like `_populated`
+        self._known_sessions = TTLCache(maxsize=PROFILE_CACHE_SIZE, ttl=None)
+        self.general_accounts: Dict[Text, List[GeneralAccount]] = {}
+        self._tables_ready = False
+        # account creations in progress, by session
+        self._populating: Dict[Text, asyncio.Task] = {}
+        # created on first use, inside the running event loop
+        self._setup_lock: Optional[asyncio.Lock] = None
+
+    async def create_tables(self):
+        await self._setup()
+
+    async def migrate(self):
+        async with self.engine.begin() as connection:
+            await connection.run_sync(migrate)
+
+    async def _run(self, method: Text, *args: Any, **kwargs: Any) -> Any:
+        """Run a `ProfileDB` method on a fresh session"""
+        if not self._tables_ready:
+            await self._setup()
+        return await self._call(method, *args, **kwargs)
+
+    async def _call(self, method: Text, *args: Any, **kwargs: Any) -> Any:
+        async with self.Session() as session:
+            return await session.run_sync(
+                lambda sync_session: getattr(
+                    SessionProfileDB(
+                        sync_session,
+                        self.seed,
+                        self.lazy,
+                        self._populated,
+                        self._accounts_lock,
+                        self.cache,
+                        self.general_accounts,
+                    ),
+                    method,
+                )(*args, **kwargs)
+            )
+
+    async def _run_for_session(
+        self, session_id: Text, method: Text, *args: Any, **kwargs: Any
+    ) -> Any:
+        """Run a per-session `ProfileDB` method, creating the account first.
+        Concurrent turns of a new session share one account creation, so that it
+        is not done twice, while new sessions do not wait for each other, and no
+        coroutine ever waits on the thread lock `ProfileDB` uses for the same
+        purpose.
+        """
+        if not self._known_sessions.get(session_id):
+            populating = self._populating.get(session_id)
+            if populating is None:
+                populating = asyncio.ensure_future(self._populate_session(session_id))
+                self._populating[session_id] = populating
+                populating.add_done_callback(
+                    lambda _: self._populating.pop(session_id, None)
+                )
+            # a cancelled turn must not cancel the creation others wait for
+            await asyncio.shield(populating)
+        return await self._run(method, session_id, *args, **kwargs)
+
+    async def _populate_session(self, session_id: Text):
+        await self._run("populate_profile_db", session_id)
+        self._known_sessions.set(session_id, True)
+
+    async def _setup(self):
+        if self._setup_lock is None:
+            self._setup_lock = asyncio.Lock()
+        async with self._setup_lock:
+            if not self._tables_ready:
+                async with self.engine.begin() as connection:
+                    await connection.run_sync(create_tables)
+                self.general_accounts = await self._call("bootstrap_general_accounts")
+                self._tables_ready = True
+
+    async def dispose(self):
+        await self.engine.dispose()
+
+    def cache_stats(self) -> Dict[Text, Any]:
+        """Size and hit/miss counters of the lookup cache"""
+        return self.cache.stats()
+
+    get_account_number = staticmethod(ProfileDB.get_account_number)
+    list_balance_types = staticmethod(ProfileDB.list_balance_types)
+
+    async def get_account(self, id: int) -> Optional[Account]:
+        """Get an `Account` object based on an `Account.id`"""
+        return await self._run("get_account", id)
+
+    async def get_account_from_session_id(self, session_id: Text) -> Account:
+        """Get an `Account` object based on a `Account.session_id`"""
+        return await self._run_for_session(session_id, "get_account_from_session_id")
+
+    async def get_account_from_number(self, account_number: Text):
+        """Get a bank or credit card account based on an account number"""
+        return await self._run("get_account_from_number", account_number)
+
+    async def get_recipient_from_name(
+        self, session_id: Text, recipient_name: Text
+    ) -> Account:
+        """Get a recipient based on the nickname"""
+        return await self._run_for_session(
+            session_id, "get_recipient_from_name", recipient_name
+        )
+
+    async def list_known_recipients(self, session_id: Text) -> List[Text]:
+        """List recipient nicknames available to an account holder"""
+        return await self._run_for_session(session_id, "list_known_recipients")
+
+    async def check_session_id_exists(self, session_id: Text) -> bool:
+        """Check if an account for `session_id` already exists"""
+        return await self._run("check_session_id_exists", session_id)
+
+    async def get_account_balance(self, session_id: Text) -> float:
+        """Get the account balance for an account"""
+        return await self._run_for_session(session_id, "get_account_balance")
+
+    async def get_currency(self, session_id: Text) -> Text:
+        """Get the currency for an account"""
+        return await self._run_for_session(session_id, "get_currency")
+
+    async def search_transactions(
+        self,
+        session_id: Text,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        deposit: bool = False,
+        vendor: Optional[Text] = None,
+    ) -> List:
+        """Find all transactions for an account between `start_time` and `end_time`"""
+        return await self._run_for_session(
+            session_id,
+            "search_transactions_list",
+            start_time=start_time,
+            end_time=end_time,
+            deposit=deposit,
+            vendor=vendor,
+        )
+
+    async def iter_transactions(
+        self, session_id: Text, chunk_size: int = TRANSACTIONS_PAGE_SIZE, **search: Any
+    ) -> AsyncIterator[List[sa.engine.Row]]:
+        """Stream the transactions `search_transactions` finds in chunks,
+        each chunk is one keyset page read on its own session
+        """
+        after = None
+        while True:
+            rows, after = await self._run_for_session(
+                session_id, "transactions_page", after=after, limit=chunk_size, **search
+            )
+            if rows:
+                yield rows
+            if after is None:
+                return
+
+    async def aggregate_transactions(
+        self,
+        session_id: Text,
+        group_by: Text = "vendor",
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        deposit: bool = False,
+    ) -> List[Dict[Text, Any]]:
+        """Total amount and number of transactions per counterparty or period"""
+        return await self._run_for_session(
+            session_id,
+            "aggregate_transactions",
+            group_by=group_by,
+            start_time=start_time,
+            end_time=end_time,
+            deposit=deposit,
+        )
+
+    async def list_credit_cards(self, session_id: Text) -> List[Text]:
+        """List valid credit cards for an acccount"""
+        return await self._run_for_session(session_id, "list_credit_cards")
+
+    async def get_credit_card(
+        self, session_id: Text, credit_card_name: Text
+    ) -> Optional[CreditCard]:
+        """Get a `CreditCard` object based on the card's name and the `session_id`"""
+        return await self._run_for_session(
+            session_id, "get_credit_card", credit_card_name
+        )
+
+    async def get_credit_card_balance(
+        self,
+        session_id: Text,
+        credit_card_name: Text,
+        balance_type: Text = "current_balance",
+    ) -> float:
+        """Get the balance for a credit card based on its name and the balance type"""
+        return await self._run_for_session(
+            session_id, "get_credit_card_balance", credit_card_name, balance_type
+        )
+
+    async def list_vendors(self) -> List[Text]:
+        """List valid vendors"""
+        return await self._run("list_vendors")
+
+    async def pay_off_credit_card(
+        self, session_id: Text, credit_card_name: Text, amount: float
+    ):
+        """Do a transaction to move the specified amount from an account to a credit card"""
+        await self._run_for_session(
+            session_id, "pay_off_credit_card", credit_card_name, amount
+        )
+
+    async def populate_profile_db(self, session_id: Text):
+        """Initialize the database for a conversation session"""
+        await self._run_for_session(session_id, "check_session_id_exists")
+
+    async def transact(
+        self, from_account_number: Text, to_account_number: Text, amount: float
+    ):
+        """Add a transation to the transaction table"""
+        await self._run("transact", from_account_number, to_account_number, amount)
+
+    async def check_balances(
+        self, repair: bool = False, tolerance: float = 0.005
+    ) -> Dict[Text, Dict[Text, float]]:
+        """Compare every ledger entry with the sum of its transactions"""
+        return await self._run("check_balances", repair=repair, tolerance=tolerance)
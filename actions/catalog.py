@@ -0,0 +1,134 @@
+"""Keyword catalogs behind the page lookup and feature explanation actions.
+
+Each catalog JSON file is a list of entries with a `keyword`. The file is read
+once and indexed by lowercase keyword, so a lookup is a dict access with no
+file I/O. Keywords that do not match exactly fall back to a trigram index of
+all keywords. A background thread polls the file's mtime and swaps in a
+freshly built `CatalogSnapshot` when the file changes.
+"""
+import os
+import json
+import logging
+import pathlib
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Text, Tuple
+
+from actions.fuzzy_index import TrigramIndex
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for changed catalog files, 0 disables hot reloading
+CATALOG_RELOAD_INTERVAL = float(os.environ.get("CATALOG_RELOAD_INTERVAL", 5))
+# Minimum trigram similarity (0-1) for a keyword to answer a misspelled lookup
+CATALOG_FUZZY_CUTOFF = float(os.environ.get("CATALOG_FUZZY_CUTOFF", 0.5))
+
+here = pathlib.Path(__file__).parent.absolute()
+
+
+class CatalogSnapshot(NamedTuple):
+    """One version of a catalog file with its indexes, never modified once built"""
+
+    entries: List[Dict[Text, Any]]
+    index: Dict[Text, Dict[Text, Any]]
+    fuzzy_index: TrigramIndex
+    mtime: Optional[float]
+
+
+class Catalog:
+    def __init__(
+        self,
+        path: Text,
+        reload_interval: float = CATALOG_RELOAD_INTERVAL,
+        fuzzy_cutoff: float = CATALOG_FUZZY_CUTOFF,
+    ):
+        self.path = str(path)
+        self.reload_interval = reload_interval
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.snapshot = CatalogSnapshot([], {}, TrigramIndex([]), None)
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self.load()
+
+    def load(self):
+        """Read the catalog file and rebuild the keyword index"""
+        mtime = os.stat(self.path).st_mtime
+        with open(self.path) as json_file:
+            entries = json.load(json_file)
+
+        index = {}
+        for entry in entries:
+            # the first entry wins for duplicate keywords, as the linear scan used to
+            index.setdefault(entry["keyword"].lower(), entry)
+
+        fuzzy_index = TrigramIndex(index.keys())
+
+        # a single assignment, readers see either the old or the new version
+        self.snapshot = CatalogSnapshot(entries, index, fuzzy_index, mtime)
+        logger.debug(f"Loaded {len(index)} keywords from {self.path}")
+
+    def reload_if_changed(self) -> bool:
+        """Reload the catalog if its file changed since it was last loaded"""
+        try:
+            if os.stat(self.path).st_mtime == self.snapshot.mtime:
+                return False
+            self.load()
+        except (OSError, ValueError, KeyError) as e:
+            # keep serving the previous version of a missing or half written file
+            logger.warning(f"Could not reload catalog {self.path}: {e}")
+            return False
+        return True
+
+    def get(self, keyword: Optional[Text]) -> Optional[Dict[Text, Any]]:
+        """Get the entry for `keyword`, ignoring case"""
+        if not keyword:
+            return None
+        return self.snapshot.index.get(keyword.lower())
+
+    def search(
+        self, keyword: Optional[Text], limit: int = 5
+    ) -> List[Tuple[Dict[Text, Any], float]]:
+        """Entries whose keyword resembles `keyword`, with their similarity, best first"""
+        if not keyword:
+            return []
+        snapshot = self.snapshot
+        return [
+            (snapshot.index[match], score)
+            for match, score in snapshot.fuzzy_index.search(
+                keyword, limit=limit, cutoff=self.fuzzy_cutoff
+            )
+        ]
+
+    def find(self, keyword: Optional[Text]) -> Optional[Dict[Text, Any]]:
+        """Get the entry for `keyword`, or the closest fuzzy match above the cutoff"""
+        entry = self.get(keyword)
+        if entry is None:
+            matches = self.search(keyword, limit=1)
+            if matches:
+                entry = matches[0][0]
+        return entry
+
+    def watch(self):
+        """Start the background thread which hot reloads the catalog"""
+        if self.reload_interval <= 0 or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(
+            target=self._watch,
+            name=f"catalog-watcher-{os.path.basename(self.path)}",
+            daemon=True,
+        )
+        self._watcher.start()
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval):
+            self.reload_if_changed()
+
+    def stop(self):
+        """Stop the background reload thread"""
+        self._stop.set()
+
+
+pages_catalog = Catalog(here / "pages_info.json")
+help_catalog = Catalog(here / "help_descriptions.json")
+
+pages_catalog.watch()
+help_catalog.watch()
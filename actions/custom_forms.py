@@ -3,7 +3,8 @@
 #
 """Customization to deal nicely with repeated slot validation failures."""
 import abc
-from typing import Dict, Text, Any, List
+import contextvars
+from typing import Callable, Dict, Text, Any, List, Optional, Sequence, Set
 import logging
 import pathlib
 import ruamel.yaml
@@ -35,6 +36,132 @@ custom_forms_config = (
 # Set the maximum number of validation failures allowed
 MAX_VALIDATION_FAILURES = custom_forms_config.get("max_validation_failures", 2)
 
+# Keys a rule of `slot_rules` may have
+SLOT_RULE_KEYS = {"min_length", "max_length", "allowed_values", "message"}
+
+
+def compile_slot_rule(
+    slot_name: Text, rule: Dict[Text, Any]
+) -> Callable[[Any, CollectingDispatcher], Dict[Text, Any]]:
+    """Turn a rule of `slot_rules` into a validation function.
+    The function returns the slot with its value if it passes the rule, and
+    with None after uttering the rule's `message` otherwise.
+    """
+    unknown_keys = set(rule) - SLOT_RULE_KEYS
+    if unknown_keys:
+        raise ValueError(
+            f"Unknown keys {sorted(unknown_keys)} in the rule of slot `{slot_name}`, "
+            f"expected some of {sorted(SLOT_RULE_KEYS)}."
+        )
+    min_length = rule.get("min_length")
+    max_length = rule.get("max_length")
+    allowed_values = rule.get("allowed_values")
+    if allowed_values is not None:
+        allowed_values = frozenset(allowed_values)
+    message = rule.get("message")
+
+    def validate(value: Any, dispatcher: CollectingDispatcher) -> Dict[Text, Any]:
+        valid = True
+        if allowed_values is not None:
+            valid = value in allowed_values
+        if valid and (min_length is not None or max_length is not None):
+            valid = (
+                isinstance(value, str)
+                and (min_length is None or len(value) >= min_length)
+                and (max_length is None or len(value) <= max_length)
+            )
+        if valid:
+            return {slot_name: value}
+        if message:
+            dispatcher.utter_message(text=message)
+        return {slot_name: None}
+
+    return validate
+
+
+# Declarative validation rules by form and slot, checked after any validate_{slot}
+SLOT_RULES = {
+    form_name: {
+        slot_name: compile_slot_rule(slot_name, rule)
+        for slot_name, rule in (rules or {}).items()
+    }
+    for form_name, rules in (custom_forms_config.get("slot_rules") or {}).items()
+}
+
+
+class ValidationSummary:
+    """What the events of one form validation do to the slots, gathered in a
+    single pass over the events.
+    """
+
+    def __init__(
+        self,
+        events: List[EventType],
+        slots: Dict[Text, Any],
+        slot_order: Sequence[Text] = (),
+    ):
+        self.events = events
+        self.slots = slots
+        self.slot_order = slot_order
+        # latest value each slot is set to by the events
+        self.slot_values: Dict[Text, Any] = {}
+        # slots set to a value by any of the events
+        self.filled_slots: Set[Text] = set()
+        self.requested_slot_changed = False
+        self.requested_slot_cleared = False
+        self._first_empty_slot: Optional[Text] = None
+        self._first_empty_known = False
+        # number of `events` accounted for
+        self.counted = 0
+        self.add(events, extend=False)
+
+    def add(self, events: List[EventType], extend: bool = True):
+        """Account for more events, appending them to `events` with `extend`"""
+        if extend:
+            self.events.extend(events)
+        self.counted += len(events)
+        for event in events:
+            if event.get("event") != "slot":
+                continue
+            name, value = event.get("name"), event.get("value")
+            self.slot_values[name] = value
+            if name == "requested_slot":
+                self.requested_slot_changed = True
+                if not value:
+                    self.requested_slot_cleared = True
+            elif value:
+                self.filled_slots.add(name)
+        self._first_empty_known = False
+
+    def refresh(self):
+        """Account for events appended to `events` by others since"""
+        if len(self.events) > self.counted:
+            self.add(self.events[self.counted :], extend=False)
+
+    def get_slot(self, name: Text) -> Any:
+        """Value of a slot once the events are applied"""
+        if name in self.slot_values:
+            return self.slot_values[name]
+        return self.slots.get(name)
+
+    @property
+    def first_empty_slot(self) -> Optional[Text]:
+        """First slot of `slot_order` without a value, None if all are filled"""
+        if not self._first_empty_known:
+            self._first_empty_slot = next(
+                (slot for slot in self.slot_order if not self.get_slot(slot)), None
+            )
+            self._first_empty_known = True
+        return self._first_empty_slot
+
+
+# The summary of the validation running in the current request, shared by
+# `CustomFormValidationAction` and the `run` of its subclasses
+current_validation: contextvars.ContextVar[
+    Optional[ValidationSummary]
+] = contextvars.ContextVar("current_validation", default=None)
+
+
 class CustomFormValidationAction(FormValidationAction, metaclass=abc.ABCMeta):
     """Validates if slot values are valid and handles repeated validation failures.
 
@@ -67,6 +194,13 @@ class CustomFormValidationAction(FormValidationAction, metaclass=abc.ABCMeta):
               text: Would you like to provide a new feature (function, actions or more options etc.) request?
     """
 
+    # Required slots requested in this order while they are empty, see
+    # `ValidationSummary.first_empty_slot`
+    slot_order: List[Text] = []
+
+    # Validation rules from `custom_forms_config.yml`, by form and slot
+    slot_rules: Dict[Text, Dict[Text, Callable]] = SLOT_RULES
+
     # Avoids registering this class as a custom action
     @abc.abstractmethod
     def name(self) -> Text:
@@ -74,6 +208,51 @@ class CustomFormValidationAction(FormValidationAction, metaclass=abc.ABCMeta):
 
         raise NotImplementedError("A CustomFormValidationAction must implement a name")
 
+    def validation_summary(
+        self, tracker: Tracker, events: List[EventType]
+    ) -> ValidationSummary:
+        """Summary of the events of the current validation, built once per
+        validation by `get_validation_events` and shared through
+        `current_validation`.
+        """
+        summary = current_validation.get()
+        if summary is None or summary.events is not events:
+            summary = ValidationSummary(events, tracker.slots, self.slot_order)
+            current_validation.set(summary)
+        else:
+            summary.refresh()
+        return summary
+
+    async def get_validation_events(
+        self,
+        dispatcher: CollectingDispatcher,
+        tracker: Tracker,
+        domain: Dict,
+    ) -> List[EventType]:
+        """Validates slots with their `validate_{slot}` methods like
+        `FormValidationAction` does, then checks the validated values against
+        the form's rules in `slot_rules`. The summary of the resulting events is
+        built here, once, for the `run` of the subclasses.
+
+        Returns:
+            `SlotSet` events for every validated slot.
+        """
+        events = await super().get_validation_events(dispatcher, tracker, domain)
+
+        rules = self.slot_rules.get(self.form_name(), {})
+        for index, event in enumerate(events):
+            rule = rules.get(event.get("name"))
+            if rule is None or event.get("value") is None:
+                continue
+            validation_output = rule(event["value"], dispatcher)
+            events[index] = SlotSet(event["name"], validation_output[event["name"]])
+            tracker.slots.update(validation_output)
+
+        current_validation.set(
+            ValidationSummary(events, tracker.slots, self.slot_order)
+        )
+        return events
+
     async def validate(
         self,
         dispatcher: CollectingDispatcher,
@@ -100,8 +279,11 @@ class CustomFormValidationAction(FormValidationAction, metaclass=abc.ABCMeta):
 
         events.extend(await super().validate(dispatcher, tracker, domain))
 
-        events.extend(
-            await self.repeated_validation_failures(dispatcher, tracker, domain, events)
+        summary = self.validation_summary(tracker, events)
+        summary.add(
+            await self.repeated_validation_failures(
+                dispatcher, tracker, domain, events, summary
+            )
         )
 
         return events
@@ -112,6 +294,7 @@ class CustomFormValidationAction(FormValidationAction, metaclass=abc.ABCMeta):
         tracker: Tracker,
         domain: Dict,
         events: List[EventType],
+        summary: Optional[ValidationSummary] = None,
     ) -> List[EventType]:
         """Updates the slot repeated_validation_failures, and sets required form slot
         `AA_CONTINUE_FORM` to None when the threshold is reached.
@@ -126,16 +309,11 @@ class CustomFormValidationAction(FormValidationAction, metaclass=abc.ABCMeta):
         if not requested_slot:
             return rvf_events
 
-        # if the requested slot was not extracted, interupt the form
-        interrupt_form = False
-        if not events:
-            interrupt_form = True
-        else:
-            for event in events:
-                if event["event"] == "slot" and event["name"] == "requested_slot":
-                    interrupt_form = True
+        if summary is None:
+            summary = self.validation_summary(tracker, events)
 
-        if interrupt_form:
+        # if the requested slot was not extracted, interupt the form
+        if not events or summary.requested_slot_changed:
             # Sending LoopInterrupted will prevent rasa.core from asking for the slot
             rvf_events.append(LoopInterrupted(is_interrupted=True))
 
@@ -146,14 +324,9 @@ class CustomFormValidationAction(FormValidationAction, metaclass=abc.ABCMeta):
             return rvf_events
 
         # Skip if validate_{slot} turned off the form by setting requested_slot to None
-        for event in events:
-            if (
-                event["event"] == "slot"
-                and event["name"] == "requested_slot"
-                and not event["value"]
-            ):
-                rvf_events.append(SlotSet(RVF_SLOT, 0))
-                return rvf_events
+        if summary.requested_slot_cleared:
+            rvf_events.append(SlotSet(RVF_SLOT, 0))
+            return rvf_events
 
         rvf = tracker.get_slot(RVF_SLOT)
         if rvf:
@@ -163,15 +336,7 @@ class CustomFormValidationAction(FormValidationAction, metaclass=abc.ABCMeta):
             rvf = 0
 
         # check if validation of the requested_slot failed
-        validation_failed = True
-        for event in events:
-            if (
-                event["event"] == "slot"
-                and event["name"] == requested_slot
-                and event["value"]
-            ):
-                validation_failed = False
-                break
+        validation_failed = requested_slot not in summary.filled_slots
 
         # keep track of repeated validation failures
         if validation_failed:
@@ -0,0 +1,245 @@
+"""Persistence of confirmed feedback into the `chatbot_results` table.
+
+All persisting actions share one process-wide `FeedbackDB`. It holds a pooled
+SQLAlchemy engine (pre-ping health checks, idle recycling, bounded size), and
+runs the blocking driver calls on a small thread pool so that the action
+server's event loop is never stalled by connection handshakes or commits.
+"""
+import os
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Text
+
+import sqlalchemy as sa
+from sqlalchemy.engine.base import Engine
+
+logger = logging.getLogger(__name__)
+
+# Idle connections kept open by the pool, and the hard upper bound of open connections
+POOL_MIN_SIZE = int(os.environ.get("RASA_DB_POOL_MIN", 2))
+POOL_MAX_SIZE = int(os.environ.get("RASA_DB_POOL_MAX", 10))
+# Connections older than this many seconds are replaced on checkout
+POOL_RECYCLE = int(os.environ.get("RASA_DB_POOL_RECYCLE", 1800))
+# Seconds to wait for a free connection before giving up
+POOL_TIMEOUT = int(os.environ.get("RASA_DB_POOL_TIMEOUT", 30))
+# Rows per multi-row INSERT statement
+ROWS_PER_STATEMENT = 100
+
+metadata = sa.MetaData()
+
+# `createdAt`/`updatedAt` are left unquoted so they resolve exactly like the
+# hand written INSERT statement that used to populate this table.
+chatbot_results = sa.Table(
+    "chatbot_results",
+    metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("sender_id", sa.String(255)),
+    sa.Column("user_story", sa.Text),
+    sa.Column("initial_description", sa.Text),
+    sa.Column("chat_description", sa.Text),
+    sa.Column("createdAt", sa.DateTime, quote=False),
+    sa.Column("updatedAt", sa.DateTime, quote=False),
+)
+
+# Idempotency keys of rows delivered from the feedback outbox, written in the
+# same transaction as the row itself so a retried delivery is never duplicated
+chatbot_results_delivery = sa.Table(
+    "chatbot_results_delivery",
+    metadata,
+    sa.Column("idempotency_key", sa.String(64), primary_key=True),
+    sa.Column("delivered_at", sa.DateTime),
+)
+
+
+def get_feedback_db_url() -> sa.engine.URL:
+    """Build the results database URL from the `RASA_DB_*` environment variables.
+
+    `RASA_DB_URL` takes precedence, which allows e.g. a local SQLite stand-in.
+    """
+    url = os.environ.get("RASA_DB_URL")
+    if url:
+        return sa.engine.make_url(url)
+
+    port = os.environ.get("RASA_DB_PORT")
+    return sa.engine.URL.create(
+        "postgresql+psycopg2",
+        username=os.environ.get("RASA_DB_USER"),
+        password=os.environ.get("RASA_DB_PASSWORD"),
+        host=os.environ.get("RASA_DB_HOST"),
+        port=int(port) if port else None,
+        database=os.environ.get("RASA_DB_NAME"),
+    )
+
+
+def create_feedback_engine(
+    db_url: Any,
+    pool_min_size: int = POOL_MIN_SIZE,
+    pool_max_size: int = POOL_MAX_SIZE,
+) -> Engine:
+    """Create the pooled engine used to write feedback results."""
+    db_url = sa.engine.make_url(db_url)
+    connect_args = {}
+    if db_url.get_backend_name() == "sqlite":
+        # pooled sqlite connections are handed out to the executor threads
+        connect_args["check_same_thread"] = False
+
+    return sa.create_engine(
+        db_url,
+        poolclass=sa.pool.QueuePool,
+        pool_size=pool_min_size,
+        max_overflow=max(pool_max_size - pool_min_size, 0),
+        pool_recycle=POOL_RECYCLE,
+        pool_timeout=POOL_TIMEOUT,
+        pool_pre_ping=True,
+        connect_args=connect_args,
+    )
+
+
+class FeedbackDB:
+    def __init__(self, db_engine: Engine, max_workers: Optional[int] = None):
+        self.engine = db_engine
+        # one worker per pooled connection, more threads would only queue on the pool
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or POOL_MAX_SIZE,
+            thread_name_prefix="feedback-db",
+        )
+
+    def create_tables(self):
+        """Create the results table, only needed for local stand-in databases"""
+        chatbot_results.create(self.engine, checkfirst=True)
+        self.create_delivery_table()
+
+    def create_delivery_table(self):
+        """Create the table of delivered idempotency keys if it does not exist"""
+        chatbot_results_delivery.create(self.engine, checkfirst=True)
+
+    def insert_result(
+        self,
+        sender_id: Text,
+        user_story: Optional[Text],
+        initial_description: Optional[Text],
+        chat_description: Optional[Text],
+        created_at: Optional[datetime] = None,
+        idempotency_key: Optional[Text] = None,
+    ) -> bool:
+        """Insert one feedback row using a connection borrowed from the pool.
+
+        Rows with an `idempotency_key` are inserted only once, later calls with
+        the same key are skipped. Returns whether the row was inserted.
+        """
+        created_at = created_at or datetime.now()
+        with self.engine.begin() as connection:
+            if idempotency_key is not None:
+                if self._is_delivered(connection, idempotency_key):
+                    return False
+                connection.execute(
+                    chatbot_results_delivery.insert().values(
+                        idempotency_key=idempotency_key, delivered_at=datetime.now()
+                    )
+                )
+            connection.execute(
+                chatbot_results.insert().values(
+                    sender_id=sender_id,
+                    user_story=user_story,
+                    initial_description=initial_description,
+                    chat_description=chat_description,
+                    createdAt=created_at,
+                    updatedAt=created_at,
+                )
+            )
+        return True
+
+    def insert_results(self, rows: List[Dict[Text, Any]]) -> int:
+        """Insert many feedback rows with one multi-row INSERT in a single transaction.
+
+        Each row holds the arguments of `insert_result`. Rows whose
+        `idempotency_key` was already delivered are skipped. Returns the number
+        of rows inserted.
+        """
+        now = datetime.now()
+        with self.engine.begin() as connection:
+            keys = [row["idempotency_key"] for row in rows if row.get("idempotency_key")]
+            delivered = set()
+            if keys:
+                delivered = {
+                    key
+                    for key, in connection.execute(
+                        sa.select(chatbot_results_delivery.c.idempotency_key).where(
+                            chatbot_results_delivery.c.idempotency_key.in_(keys)
+                        )
+                    )
+                }
+
+            values, new_keys = [], []
+            for row in rows:
+                key = row.get("idempotency_key")
+                if key is not None:
+                    if key in delivered:
+                        continue
+                    # the same key twice within one batch is stored once
+                    delivered.add(key)
+                    new_keys.append({"idempotency_key": key, "delivered_at": now})
+                created_at = row.get("created_at") or now
+                values.append(
+                    {
+                        "sender_id": row["sender_id"],
+                        "user_story": row.get("user_story"),
+                        "initial_description": row.get("initial_description"),
+                        "chat_description": row.get("chat_description"),
+                        "createdAt": created_at,
+                        "updatedAt": created_at,
+                    }
+                )
+
+            # bounded statements stay below the bind parameter limits of the drivers
+            for table, table_rows in (
+                (chatbot_results_delivery, new_keys),
+                (chatbot_results, values),
+            ):
+                for start in range(0, len(table_rows), ROWS_PER_STATEMENT):
+                    connection.execute(
+                        table.insert().values(
+                            table_rows[start : start + ROWS_PER_STATEMENT]
+                        )
+                    )
+        return len(values)
+
+    @staticmethod
+    def _is_delivered(connection, idempotency_key: Text) -> bool:
+        return (
+            connection.execute(
+                sa.select(chatbot_results_delivery.c.idempotency_key).where(
+                    chatbot_results_delivery.c.idempotency_key == idempotency_key
+                )
+            ).first()
+            is not None
+        )
+
+    async def run_in_executor(self, func, *args, **kwargs):
+        """Run a blocking database call without blocking the event loop"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def async_insert_result(self, **kwargs: Any):
+        """Async variant of `insert_result`"""
+        return await self.run_in_executor(self.insert_result, **kwargs)
+
+    def pool_status(self) -> Dict[Text, int]:
+        """Current usage of the connection pool"""
+        pool = self.engine.pool
+        return {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        }
+
+    def dispose(self):
+        """Close all pooled connections and stop the worker threads"""
+        self.executor.shutdown(wait=True)
+        self.engine.dispose()
@@ -0,0 +1,72 @@
+"""Character trigram index for approximate keyword matching.
+
+Keywords are split into padded character trigrams and an inverted index maps
+each trigram to the keywords containing it. A query only touches the posting
+lists of its own trigrams, and candidates are ranked by their Dice
+coefficient: 2 * shared trigrams / (query trigrams + keyword trigrams).
+"""
+from collections import Counter, defaultdict
+from itertools import chain
+from typing import Dict, FrozenSet, Iterable, List, Optional, Text, Tuple
+
+
+def trigrams(text: Text) -> FrozenSet[Text]:
+    """Set of character trigrams of `text`, padded so short words still have some"""
+    padded = f"  {' '.join(text.lower().split())} "
+    return frozenset(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+class TrigramIndex:
+    def __init__(self, keywords: Iterable[Text]):
+        self.keywords: List[Text] = list(dict.fromkeys(k.lower() for k in keywords))
+        self.sizes: List[int] = []
+        self.postings: Dict[Text, List[int]] = defaultdict(list)
+        for keyword_id, keyword in enumerate(self.keywords):
+            keyword_trigrams = trigrams(keyword)
+            self.sizes.append(len(keyword_trigrams))
+            for trigram in keyword_trigrams:
+                self.postings[trigram].append(keyword_id)
+        self.postings = dict(self.postings)
+
+    def search(
+        self, query: Text, limit: int = 5, cutoff: float = 0.0
+    ) -> List[Tuple[Text, float]]:
+        """Keywords similar to `query` with their score, best first.
+
+        Only matches scoring at least `cutoff` (between 0 and 1) are returned.
+        """
+        query_trigrams = trigrams(query)
+        if not query_trigrams:
+            return []
+
+        # Counter tallies the concatenated posting lists in C
+        shared = Counter(
+            chain.from_iterable(
+                self.postings.get(trigram, ()) for trigram in query_trigrams
+            )
+        )
+
+        query_size = len(query_trigrams)
+        # a keyword needs at least this many shared trigrams to reach the cutoff
+        min_shared = cutoff * query_size / (2 - cutoff)
+        sizes = self.sizes
+        matches = []
+        for keyword_id, count in shared.items():
+            if count < min_shared:
+                continue
+            score = 2 * count / (query_size + sizes[keyword_id])
+            if score >= cutoff:
+                matches.append((self.keywords[keyword_id], score))
+
+        matches.sort(key=lambda match: (-match[1], match[0]))
+        return matches[:limit]
+
+    def best_match(
+        self, query: Text, cutoff: float = 0.0
+    ) -> Optional[Tuple[Text, float]]:
+        """The highest scoring keyword for `query`, or `None` below `cutoff`"""
+        matches = self.search(query, limit=1, cutoff=cutoff)
+        return matches[0] if matches else None
+
+    def __len__(self) -> int:
+        return len(self.keywords)
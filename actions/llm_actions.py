@@ -10,20 +10,37 @@ from rasa_sdk.events import (
     UserUttered
 )
 from typing import Dict, Text, Any, List
-import openai
-import os
+import logging
 
-from openai import AzureOpenAI
+from actions.llm_cache import fallback_cache
+from actions.llm_gateway import llm_gateway
+from actions.semantic_cache import semantic_index
 
-# Initialize the Azure OpenAI client with the API key and endpoint from environment variables
-client = AzureOpenAI(
-    api_key=os.environ.get("OPENAI_API_KEY"),
-    api_version="2024-02-15-preview",
-    azure_endpoint=os.environ.get("OPENAI_ENDPOINT")
-)
+logger = logging.getLogger(__name__)
+
+# If chatbot could not identify intent above threshold, then user message is sent to LLM along of list of
+# possible intent to try to identify and respond accordingly
+INTENTS_DESCRIPTION = """
+    Label a user's message from a conversation with an intent. Reply ONLY with the name of the intent.
+    The intent should be one of the following:
+    - explain_feature
+    - find_page
+    - mongolian_greeting
+    - non_english
+    - provide_feature_request (provide a request for a new feature or function)
+    - provide_bug_report (report a software bug or software errors)
+    - provide_generic_comment (provide a non-specific generic comment)
+    - out_of_scope
+"""
 
-# Set the OpenAI API key for the openai library from environment variables
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# List of valid intents
+VALID_INTENTS = [
+    'explain_feature', 'find_page', 'mongolian_greeting', 'non_english', 'help', 'inform',
+    'thankyou', 'provide_feature_request', 'provide_bug_report', 'provide_generic_comment', 'out_of_scope'
+]
+
+# The longest intent name is a handful of tokens, there is no need to allow for more
+MAX_INTENT_TOKENS = 10
 
 class ActionFallbackToLLM(Action):
     """Custom action to handle fallback to a large language model (LLM)"""
@@ -36,66 +53,68 @@ class ActionFallbackToLLM(Action):
         self, dispatcher: CollectingDispatcher, tracker: Tracker, domain: Dict
     ) -> List[EventType]:
         """Executes the custom action"""
-        dispatcher.utter_message(text="Hold on while I'm asking from a friend...")
-
-        # If chatbot could not identify intent above threshold, then user message is sent to LLM along of list of
-        # possible intent to try to identify and respond accordingly
-        intents_description = """
-            Label a user's message from a conversation with an intent. Reply ONLY with the name of the intent.
-            The intent should be one of the following:
-            - explain_feature
-            - find_page
-            - mongolian_greeting
-            - non_english
-            - provide_feature_request (provide a request for a new feature or function)
-            - provide_bug_report (report a software bug or software errors)
-            - provide_generic_comment (provide a non-specific generic comment)
-            - out_of_scope
-        """
+        text = tracker.latest_message.get('text')
 
-        # Prepare the messages for the LLM request
-        messages = [
-            {"role": "system", "content": intents_description},
-            {"role": "user", "content": tracker.latest_message.get('text')}
-        ]
+        # Utterances the LLM has already classified are answered from the cache
+        intent = await fallback_cache.aget(text)
 
-        try:
-            # Send the user's message to the LLM for intent prediction
-            response = client.chat.completions.create(
-                model="gpt-35-fallback",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=1500,
-                top_p=0.95,
-                stop=None
-            )
-
-            # Get the response text from the LLM
-            response_text = response.choices[0].message.content.strip().lower()
-
-            # List of valid intents
-            valid_intents = [
-                'explain_feature', 'find_page', 'mongolian_greeting', 'non_english', 'help', 'inform',
-                'thankyou', 'provide_feature_request', 'provide_bug_report', 'provide_generic_comment', 'out_of_scope'
-            ]
-
-            # If the response is a valid intent, return the corresponding action
-            if response_text in valid_intents:
-                data = {
-                    "intent": {
-                        "name": response_text,
-                        "confidence": 1.0,
-                    }
-                }
-                return [ActionExecuted("action_listen"), UserUttered(text=response_text, parse_data=data)]
+        if intent is None:
+            # Utterances close enough to an already classified one reuse its intent
+            match = await semantic_index.alookup(text)
+            if match is not None:
+                intent, similarity = match
+                logger.debug(f"Semantic fallback cache hit for '{text}' ({similarity:.2f}): {intent}")
+                fallback_cache.set_in_background(text, intent)
+
+        if intent is None:
+            dispatcher.utter_message(text="Hold on while I'm asking from a friend...")
+
+            try:
+                intent = await self.classify_with_llm(text)
+            except Exception as e:
+                # Handle exceptions and notify the user
+                dispatcher.utter_message(text="Sorry, I couldn't get a response. Try again later.")
+                print(f"Error with LLM call: {e}")
+                intent = None
             else:
-                # If the response is not a valid intent, notify the user
-                dispatcher.utter_message(text="Sorry, I couldn't identify the intent. Try again later.")
+                if intent in VALID_INTENTS:
+                    fallback_cache.set_in_background(text, intent)
+                    await semantic_index.aadd(text, intent)
+                else:
+                    # If the response is not a valid intent, notify the user
+                    dispatcher.utter_message(text="Sorry, I couldn't identify the intent. Try again later.")
+                    intent = None
 
-        except Exception as e:
-            # Handle exceptions and notify the user
-            dispatcher.utter_message(text="Sorry, I couldn't get a response. Try again later.")
-            print(f"Error with LLM call: {e}")
+        # If the response is a valid intent, return the corresponding action
+        if intent is not None:
+            data = {
+                "intent": {
+                    "name": intent,
+                    "confidence": 1.0,
+                }
+            }
+            return [ActionExecuted("action_listen"), UserUttered(text=intent, parse_data=data)]
 
         # If intent could not be identified, revert the user's utterance and listen for the next input
         return [UserUtteranceReverted(), FollowupAction(name="action_listen")]
+
+    @staticmethod
+    async def classify_with_llm(text: Text) -> Text:
+        """Asks the LLM to label `text` with one of the intents, returns the intent or its lowercased answer"""
+
+        # Prepare the messages for the LLM request
+        messages = [
+            {"role": "system", "content": INTENTS_DESCRIPTION},
+            {"role": "user", "content": text}
+        ]
+
+        # Send the user's message to the LLM for intent prediction. The answer is streamed and
+        # reading stops as soon as it can only be one of the valid intents.
+        return await llm_gateway.classify(
+            messages,
+            VALID_INTENTS,
+            temperature=0.7,
+            max_tokens=MAX_INTENT_TOKENS,
+            top_p=0.95,
+            stop=None
+        )
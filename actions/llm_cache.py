@@ -0,0 +1,178 @@
+"""Cache of intents the LLM assigned to fallback utterances.
+
+Utterances are keyed by a normalized form of their text, so that trivially
+different messages ("Hi!!", "hi") share one entry. Entries live in an
+in-process LRU cache and, optionally, in a shared SQL table that survives
+restarts and is visible to every action server process. `aget` and
+`set_in_background`, used by the actions, query the shared table on the
+default thread pool executor, so a slow database does not stall the event
+loop; stores are not awaited.
+"""
+import os
+import asyncio
+import re
+import time
+import logging
+import unicodedata
+from typing import Any, Dict, Optional, Set, Text
+
+import sqlalchemy as sa
+from sqlalchemy.engine.base import Engine
+
+from actions.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_CACHE_SIZE = int(os.environ.get("LLM_FALLBACK_CACHE_SIZE", 4096))
+# Seconds a classification stays valid
+FALLBACK_CACHE_TTL = float(os.environ.get("LLM_FALLBACK_CACHE_TTL", 24 * 3600))
+# Optional shared backend, e.g. `sqlite:///fallback_cache.db`
+FALLBACK_CACHE_URL = os.environ.get("LLM_FALLBACK_CACHE_URL")
+# Log the hit ratio every this many lookups
+STATS_LOG_INTERVAL = 100
+
+metadata = sa.MetaData()
+
+fallback_cache_table = sa.Table(
+    "llm_fallback_cache",
+    metadata,
+    sa.Column("key", sa.String(1024), primary_key=True),
+    sa.Column("intent", sa.String(255)),
+    sa.Column("created", sa.Float),
+)
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: Text) -> Text:
+    """Case, accent-width, punctuation and whitespace insensitive form of `text`"""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class FallbackCache:
+    def __init__(
+        self,
+        maxsize: int = FALLBACK_CACHE_SIZE,
+        ttl: float = FALLBACK_CACHE_TTL,
+        db_engine: Optional[Engine] = None,
+    ):
+        self.ttl = ttl
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.engine = db_engine
+        self.hits = 0
+        self.misses = 0
+        # stores to the shared backend that are still running
+        self._pending: Set["asyncio.Future"] = set()
+        if self.engine is not None:
+            fallback_cache_table.create(self.engine, checkfirst=True)
+
+    def get(self, text: Text) -> Optional[Text]:
+        """Get the cached intent for `text`, looking in memory first, then the shared backend"""
+        key = normalize_text(text)
+        intent = self.memory.get(key)
+        if intent is None and self.engine is not None:
+            intent = self._get_shared(key)
+            if intent is not None:
+                self.memory.set(key, intent)
+        return self._count(intent)
+
+    async def aget(self, text: Text) -> Optional[Text]:
+        """`get` for async callers, the shared backend is queried off the event loop"""
+        key = normalize_text(text)
+        intent = self.memory.get(key)
+        if intent is None and self.engine is not None:
+            loop = asyncio.get_running_loop()
+            intent = await loop.run_in_executor(None, self._get_shared, key)
+            if intent is not None:
+                self.memory.set(key, intent)
+        return self._count(intent)
+
+    def _count(self, intent: Optional[Text]) -> Optional[Text]:
+        if intent is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        if (self.hits + self.misses) % STATS_LOG_INTERVAL == 0:
+            logger.info(f"LLM fallback cache stats: {self.stats()}")
+        return intent
+
+    def set(self, text: Text, intent: Text):
+        """Remember the intent the LLM gave to `text`"""
+        key = normalize_text(text)
+        if not key:
+            return
+        self.memory.set(key, intent)
+        if self.engine is not None:
+            self._set_shared(key, intent)
+
+    def set_in_background(self, text: Text, intent: Text):
+        """`set` for async callers, the shared backend is written in the
+        background without being awaited
+        """
+        key = normalize_text(text)
+        if not key:
+            return
+        self.memory.set(key, intent)
+        if self.engine is not None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(None, self._set_shared, key, intent)
+            self._pending.add(future)
+            future.add_done_callback(self._pending.discard)
+
+    async def drain(self):
+        """Wait for the background stores to the shared backend"""
+        if self._pending:
+            await asyncio.gather(*self._pending)
+
+    def _get_shared(self, key: Text) -> Optional[Text]:
+        try:
+            with self.engine.connect() as connection:
+                row = connection.execute(
+                    sa.select(
+                        fallback_cache_table.c.intent, fallback_cache_table.c.created
+                    ).where(fallback_cache_table.c.key == key)
+                ).first()
+        except sa.exc.SQLAlchemyError as e:
+            logger.warning(f"LLM fallback cache backend unavailable: {e}")
+            return None
+        if row is None or row.created + self.ttl < time.time():
+            return None
+        return row.intent
+
+    def _set_shared(self, key: Text, intent: Text):
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(
+                    fallback_cache_table.delete().where(
+                        fallback_cache_table.c.key == key
+                    )
+                )
+                connection.execute(
+                    fallback_cache_table.insert().values(
+                        key=key, intent=intent, created=time.time()
+                    )
+                )
+        except sa.exc.SQLAlchemyError as e:
+            logger.warning(f"LLM fallback cache backend unavailable: {e}")
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> Dict[Text, Any]:
+        """Hit ratio across both cache levels, plus the in-memory level on its own"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hit_ratio,
+            "memory": self.memory.stats(),
+        }
+
+
+fallback_cache = FallbackCache(
+    db_engine=sa.create_engine(FALLBACK_CACHE_URL) if FALLBACK_CACHE_URL else None
+)
@@ -0,0 +1,247 @@
+"""Shared, non-blocking access to the LLM used by the custom actions.
+
+A single async client is reused by every action so HTTP connections are kept
+alive between calls. Each call is bounded by a timeout, and the number of
+completions in flight is capped for the whole action server.
+
+Completions can also be streamed: callers consume the text as it is
+generated and stop reading as soon as they have what they need, which aborts
+the request and saves the remaining tokens.
+"""
+import os
+import re
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Text
+
+logger = logging.getLogger(__name__)
+
+LLM_MODEL = os.environ.get("LLM_MODEL", "gpt-35-fallback")
+LLM_API_VERSION = os.environ.get("LLM_API_VERSION", "2024-02-15-preview")
+# Seconds a single completion may take before it is abandoned
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 30))
+# Maximum number of completions in flight across all conversations
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 32))
+# Optional OpenAI compatible endpoint (e.g. a local fake server) used instead of Azure
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL")
+# Characters a streamed answer needs before a unique label prefix is accepted
+LABEL_MIN_PREFIX = 4
+
+# Punctuation ending a sentence, once the whitespace after it has arrived
+_SENTENCE_END = re.compile(r"[.!?]+(?=\s)")
+# Words whose full stop does not end a sentence
+ABBREVIATIONS = {"e.g.", "i.e.", "etc.", "vs.", "mr.", "mrs.", "ms.", "dr.", "st.", "no."}
+_LABEL = re.compile(r"[\w-]+")
+
+
+def create_llm_client(base_url: Optional[Text] = LLM_BASE_URL):
+    """Create the async OpenAI client, pointing at Azure unless `base_url` is set"""
+    from openai import AsyncAzureOpenAI, AsyncOpenAI
+
+    if base_url:
+        return AsyncOpenAI(
+            api_key=os.environ.get("OPENAI_API_KEY", "not-needed"),
+            base_url=base_url,
+            max_retries=0,
+        )
+    return AsyncAzureOpenAI(
+        api_key=os.environ.get("OPENAI_API_KEY"),
+        api_version=LLM_API_VERSION,
+        azure_endpoint=os.environ.get("OPENAI_ENDPOINT"),
+        max_retries=0,
+    )
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        client: Any = None,
+        model: Text = LLM_MODEL,
+        timeout: float = LLM_TIMEOUT,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+    ):
+        self._client = client
+        self.model = model
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self._semaphore_loop = None
+
+    @property
+    def client(self):
+        """The shared client, created on first use so importing never needs credentials"""
+        if self._client is None:
+            self._client = create_llm_client()
+        return self._client
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Concurrency limit bound to the running event loop"""
+        loop = asyncio.get_event_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def complete(
+        self,
+        messages: List[Dict[Text, Text]],
+        timeout: Optional[float] = None,
+        **params: Any,
+    ) -> Text:
+        """Request a chat completion and return the text of the first choice.
+
+        Raises `asyncio.TimeoutError` if the completion takes longer than `timeout`
+        (time spent waiting for a free concurrency slot included).
+        """
+        params.setdefault("model", self.model)
+        timeout = self.timeout if timeout is None else timeout
+
+        async def _complete():
+            async with self._get_semaphore():
+                return await self.client.chat.completions.create(
+                    messages=messages, **params
+                )
+
+        response = await asyncio.wait_for(_complete(), timeout)
+        return response.choices[0].message.content
+
+    async def stream(
+        self,
+        messages: List[Dict[Text, Text]],
+        timeout: Optional[float] = None,
+        **params: Any,
+    ) -> AsyncIterator[Text]:
+        """Stream a chat completion, yielding pieces of text as they arrive.
+
+        Closing the generator early (`aclose()` or leaving an `async for` loop
+        through `break` and closing it) aborts the request. Raises
+        `asyncio.TimeoutError` if the whole stream takes longer than `timeout`.
+        """
+        params.setdefault("model", self.model)
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+
+        semaphore = self._get_semaphore()
+        await asyncio.wait_for(semaphore.acquire(), timeout)
+        try:
+            response = await asyncio.wait_for(
+                self.client.chat.completions.create(
+                    messages=messages, stream=True, **params
+                ),
+                deadline - loop.time(),
+            )
+            try:
+                chunks = response.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(
+                            chunks.__anext__(), deadline - loop.time()
+                        )
+                    except StopAsyncIteration:
+                        break
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                await response.close()
+        finally:
+            semaphore.release()
+
+    async def classify(
+        self,
+        messages: List[Dict[Text, Text]],
+        labels: Sequence[Text],
+        timeout: Optional[float] = None,
+        **params: Any,
+    ) -> Text:
+        """Stream a completion which should answer with one of `labels`.
+
+        Returns the label once the stream has gone on past an unambiguous
+        prefix of it, and the rest of the stream is not read. At the end of the
+        stream the answer has to start with a whole label, otherwise the whole
+        lowercased answer is returned, which is not a valid label.
+        """
+        answer = ""
+        label = None
+        stream = self.stream(messages, timeout=timeout, **params)
+        try:
+            async for text in stream:
+                answer += text
+                # more text arrived, so the answer was not cut off inside the label
+                if label is not None and match_label(answer, labels) == label:
+                    return label
+                label = match_label(answer, labels)
+                prefix = answer.strip().lower()
+                if label is None and not any(
+                    candidate.startswith(prefix) for candidate in labels
+                ):
+                    # no label can match any more
+                    break
+        finally:
+            await stream.aclose()
+        return match_label(answer, labels, final=True) or answer.strip().lower()
+
+    async def complete_sentences(
+        self,
+        messages: List[Dict[Text, Text]],
+        max_sentences: int,
+        timeout: Optional[float] = None,
+        **params: Any,
+    ) -> Text:
+        """Stream a completion and stop reading after `max_sentences` sentences"""
+        answer = ""
+        stream = self.stream(messages, timeout=timeout, **params)
+        try:
+            async for text in stream:
+                answer += text
+                ends = sentence_ends(answer)
+                if len(ends) >= max_sentences:
+                    answer = answer[: ends[max_sentences - 1]]
+                    break
+        finally:
+            await stream.aclose()
+        # without enough sentences the whole answer is kept
+        return answer.strip()
+
+
+def sentence_ends(text: Text) -> List[int]:
+    """Offsets just after each complete sentence of `text`.
+
+    A sentence only ends at [.!?] followed by whitespace, so the end of text
+    still being streamed is not taken for one, and neither are abbreviations.
+    """
+    ends = []
+    for match in _SENTENCE_END.finditer(text):
+        word = text[: match.end()].split()[-1].lower()
+        if word not in ABBREVIATIONS:
+            ends.append(match.end())
+    return ends
+
+
+def match_label(
+    answer: Text,
+    labels: Sequence[Text],
+    final: bool = False,
+    min_prefix: int = LABEL_MIN_PREFIX,
+) -> Optional[Text]:
+    """The label `answer` starts with.
+
+    While the stream goes on an unambiguous prefix of at least `min_prefix`
+    characters is enough. With `final`, at the end of the stream, the answer
+    has to start with the whole label.
+    """
+    answer = answer.lstrip().lower()
+    word = _LABEL.match(answer)
+    if word is None:
+        return None
+    word = word.group()
+    complete = final or len(answer) > len(word)
+    if complete:
+        return word if word in labels else None
+    candidates = [label for label in labels if label.startswith(word)]
+    if len(candidates) == 1 and len(word) >= min(min_prefix, len(candidates[0])):
+        return candidates[0]
+    return None
+
+
+llm_gateway = LLMGateway()
@@ -0,0 +1,407 @@
+"""Durable local outbox for confirmed feedback.
+
+Submit actions append the row they want stored in `chatbot_results` to a
+local SQLite file, which takes microseconds and does not depend on the
+results database being reachable. A background flusher drains the outbox to
+`FeedbackDB` in batches, retrying failed deliveries with exponential backoff.
+After being woken up it lingers a few milliseconds so that submissions arriving
+close together are written with one multi-row INSERT and one commit, unless a
+full batch is already waiting.
+Every row carries an idempotency key, so a delivery that is retried after
+an ambiguous failure is not stored twice. When a batch is rejected for any
+reason but the database being unavailable, its rows are retried one at a
+time, so a single bad row does not hold up the others. A row still rejected
+after `FEEDBACK_OUTBOX_MAX_ATTEMPTS` attempts is moved to a dead-letter table.
+
+The outbox runs in WAL mode with `synchronous=NORMAL`: appends do not fsync
+individually, the WAL is synced at checkpoints. An append survives a crash of
+the action server; only the last few appends may be lost on power failure.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Text, Tuple
+
+import sqlalchemy as sa
+from sqlalchemy.engine.base import Engine
+
+from actions.feedback_db import FeedbackDB
+
+logger = logging.getLogger(__name__)
+
+FEEDBACK_OUTBOX_URL = os.environ.get(
+    "FEEDBACK_OUTBOX_URL", "sqlite:///feedback_outbox.db"
+)
+# Rows delivered per flush
+OUTBOX_BATCH_SIZE = int(os.environ.get("FEEDBACK_OUTBOX_BATCH_SIZE", 100))
+# Seconds between flushes when nothing new was appended
+OUTBOX_FLUSH_INTERVAL = float(os.environ.get("FEEDBACK_OUTBOX_FLUSH_INTERVAL", 5))
+# Upper bound of the retry backoff in seconds
+OUTBOX_MAX_BACKOFF = float(os.environ.get("FEEDBACK_OUTBOX_MAX_BACKOFF", 300))
+# Seconds to wait for more appends after a wakeup before flushing
+OUTBOX_LINGER = float(os.environ.get("FEEDBACK_OUTBOX_LINGER", 0.005))
+# Attempts after which a row the results database rejects is dead-lettered
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("FEEDBACK_OUTBOX_MAX_ATTEMPTS", 10))
+
+# Errors meaning the results database cannot be used right now, whatever is written
+UNAVAILABLE_ERRORS = (sa.exc.DisconnectionError, sa.exc.TimeoutError, TimeoutError)
+
+metadata = sa.MetaData()
+
+outbox_table = sa.Table(
+    "feedback_outbox",
+    metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("idempotency_key", sa.String(64), unique=True, nullable=False),
+    sa.Column("payload", sa.Text, nullable=False),
+    sa.Column("created", sa.Float, nullable=False),
+    sa.Column("attempts", sa.Integer, nullable=False, default=0),
+    sa.Column("next_attempt", sa.Float, nullable=False, default=0),
+    sa.Column("last_error", sa.Text),
+)
+
+# rows given up on, kept for inspection and manual replay
+dead_letter_table = sa.Table(
+    "feedback_outbox_dead_letter",
+    metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("idempotency_key", sa.String(64), unique=True, nullable=False),
+    sa.Column("payload", sa.Text, nullable=False),
+    sa.Column("created", sa.Float, nullable=False),
+    sa.Column("attempts", sa.Integer, nullable=False),
+    sa.Column("failed", sa.Float, nullable=False),
+    sa.Column("last_error", sa.Text),
+)
+
+
+def create_outbox_engine(db_url: Any = FEEDBACK_OUTBOX_URL) -> Engine:
+    """Create the engine of the local outbox database"""
+    database = sa.engine.make_url(db_url).database
+    engine = sa.create_engine(
+        db_url,
+        # an in-memory database only exists on the connection that created it
+        poolclass=sa.pool.StaticPool
+        if database in (None, "", ":memory:")
+        else sa.pool.QueuePool,
+        connect_args={"check_same_thread": False},
+    )
+
+    @sa.event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+
+    return engine
+
+
+class Outbox:
+    def __init__(self, db_engine: Engine):
+        self.engine = db_engine
+        metadata.create_all(self.engine)
+
+    def append(
+        self, row: Dict[Text, Any], idempotency_key: Optional[Text] = None
+    ) -> Text:
+        """Queue a `chatbot_results` row for delivery, returns its idempotency key"""
+        idempotency_key = idempotency_key or uuid.uuid4().hex
+        payload = dict(row)
+        created_at = payload.get("created_at") or datetime.now()
+        payload["created_at"] = created_at.isoformat()
+        with self.engine.begin() as connection:
+            connection.execute(
+                outbox_table.insert().values(
+                    idempotency_key=idempotency_key,
+                    payload=json.dumps(payload),
+                    created=time.time(),
+                    attempts=0,
+                    next_attempt=0,
+                )
+            )
+        return idempotency_key
+
+    def pending(self, limit: int) -> List[Tuple[int, Text, Dict[Text, Any]]]:
+        """Oldest rows which are due for a delivery attempt"""
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                sa.select(
+                    outbox_table.c.id,
+                    outbox_table.c.idempotency_key,
+                    outbox_table.c.payload,
+                )
+                .where(outbox_table.c.next_attempt <= time.time())
+                .order_by(outbox_table.c.id)
+                .limit(limit)
+            ).fetchall()
+
+        pending = []
+        for row in rows:
+            payload = json.loads(row.payload)
+            payload["created_at"] = datetime.fromisoformat(payload["created_at"])
+            pending.append((row.id, row.idempotency_key, payload))
+        return pending
+
+    def mark_delivered(self, ids: List[int]):
+        """Remove delivered rows"""
+        if not ids:
+            return
+        with self.engine.begin() as connection:
+            connection.execute(outbox_table.delete().where(outbox_table.c.id.in_(ids)))
+
+    def mark_failed(
+        self,
+        ids: List[int],
+        error: Text,
+        max_backoff: float,
+        max_attempts: Optional[int] = None,
+    ) -> List[Text]:
+        """Schedule the next attempt of rows whose delivery failed.
+
+        Rows which reached `max_attempts` are moved to the dead-letter table
+        instead, their idempotency keys are returned.
+        """
+        if not ids:
+            return []
+        now = time.time()
+        dead = []
+        with self.engine.begin() as connection:
+            for row in connection.execute(
+                sa.select(outbox_table).where(outbox_table.c.id.in_(ids))
+            ).fetchall():
+                attempts = row.attempts + 1
+                if max_attempts is not None and attempts >= max_attempts:
+                    connection.execute(
+                        dead_letter_table.insert().values(
+                            idempotency_key=row.idempotency_key,
+                            payload=row.payload,
+                            created=row.created,
+                            attempts=attempts,
+                            failed=now,
+                            last_error=error[:1000],
+                        )
+                    )
+                    connection.execute(
+                        outbox_table.delete().where(outbox_table.c.id == row.id)
+                    )
+                    dead.append(row.idempotency_key)
+                    continue
+                connection.execute(
+                    outbox_table.update()
+                    .where(outbox_table.c.id == row.id)
+                    .values(
+                        attempts=attempts,
+                        next_attempt=now + min(2 ** attempts, max_backoff),
+                        last_error=error[:1000],
+                    )
+                )
+        return dead
+
+    def dead_letters(self) -> List[Tuple[Text, Dict[Text, Any], Text]]:
+        """Idempotency key, payload and last error of the rows given up on"""
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                sa.select(dead_letter_table).order_by(dead_letter_table.c.id)
+            ).fetchall()
+        return [
+            (row.idempotency_key, json.loads(row.payload), row.last_error)
+            for row in rows
+        ]
+
+    def __len__(self) -> int:
+        with self.engine.connect() as connection:
+            return connection.execute(
+                sa.select(sa.func.count()).select_from(outbox_table)
+            ).scalar()
+
+
+class OutboxFlusher:
+    """Background thread which delivers outbox rows to the results database"""
+
+    def __init__(
+        self,
+        outbox: Outbox,
+        feedback_db: FeedbackDB,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        interval: float = OUTBOX_FLUSH_INTERVAL,
+        max_backoff: float = OUTBOX_MAX_BACKOFF,
+        linger: float = OUTBOX_LINGER,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+    ):
+        self.outbox = outbox
+        self.feedback_db = feedback_db
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.linger = linger
+        self.max_attempts = max_attempts
+        self.delivered = 0
+        self.failed = 0
+        self.dead_lettered = 0
+        self.flushes = 0
+        self.last_flush_size = 0
+        self.last_flush_seconds = 0.0
+        self._delivery_table_ready = False
+        self._notified = 0
+        self._lock = threading.Lock()
+        self._batch_full = threading.Event()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def flush_once(self) -> int:
+        """Deliver one batch of due rows, returns the number of rows delivered.
+
+        The batch is written in a single transaction. If the results database
+        rejects it while being available, the rows are delivered one by one.
+        """
+        with self._lock:
+            self._notified = 0
+            self._batch_full.clear()
+        batch = self.outbox.pending(self.batch_size)
+        if not batch:
+            return 0
+
+        ids = [row_id for row_id, _, _ in batch]
+        start = time.perf_counter()
+        try:
+            self._deliver(batch)
+        except Exception as e:
+            if self.is_unavailable(e):
+                logger.warning(f"Failed to deliver {len(ids)} feedback rows: {e}")
+                self.outbox.mark_failed(ids, str(e), self.max_backoff)
+                self.failed += len(ids)
+                return 0
+            logger.warning(
+                f"Failed to deliver {len(ids)} feedback rows, retrying one by one: {e}"
+            )
+            ids = self._deliver_one_by_one(batch)
+        else:
+            self.outbox.mark_delivered(ids)
+        if not ids:
+            return 0
+
+        self.delivered += len(ids)
+        self.flushes += 1
+        self.last_flush_size = len(ids)
+        self.last_flush_seconds = time.perf_counter() - start
+        logger.debug(
+            f"Flushed {self.last_flush_size} feedback rows "
+            f"in {self.last_flush_seconds * 1000:.1f}ms"
+        )
+        return len(ids)
+
+    def is_unavailable(self, error: Exception) -> bool:
+        """Whether `error` means the results database cannot be reached, as
+        opposed to it rejecting the rows, e.g. because of a missing table.
+        Only the latter count towards `max_attempts`.
+        """
+        if isinstance(error, UNAVAILABLE_ERRORS):
+            return True
+        if not isinstance(error, sa.exc.DBAPIError):
+            return False
+        if error.connection_invalidated:
+            return True
+        # failing to connect is not always recognized as a disconnect
+        try:
+            with self.feedback_db.engine.connect():
+                return False
+        except sa.exc.DBAPIError:
+            return True
+
+    def _deliver(self, rows: List[Tuple[int, Text, Dict[Text, Any]]]):
+        if not self._delivery_table_ready:
+            self.feedback_db.create_delivery_table()
+            self._delivery_table_ready = True
+        self.feedback_db.insert_results(
+            [
+                {**payload, "idempotency_key": idempotency_key}
+                for _, idempotency_key, payload in rows
+            ]
+        )
+
+    def _deliver_one_by_one(
+        self, batch: List[Tuple[int, Text, Dict[Text, Any]]]
+    ) -> List[int]:
+        """Deliver the rows of a rejected batch separately, returns the ids delivered"""
+        delivered = []
+        for position, (row_id, idempotency_key, payload) in enumerate(batch):
+            try:
+                self._deliver([(row_id, idempotency_key, payload)])
+            except Exception as e:
+                if self.is_unavailable(e):
+                    # the database went away, the rest is retried later as a whole
+                    rest = [rest_id for rest_id, _, _ in batch[position:]]
+                    self.outbox.mark_failed(rest, str(e), self.max_backoff)
+                    self.failed += len(rest)
+                    break
+                self.failed += 1
+                for key in self.outbox.mark_failed(
+                    [row_id], str(e), self.max_backoff, self.max_attempts
+                ):
+                    self.dead_lettered += 1
+                    logger.error(
+                        f"Gave up delivering feedback row {key} after "
+                        f"{self.max_attempts} attempts, moved it to the dead letters: {e}"
+                    )
+            else:
+                self.outbox.mark_delivered([row_id])
+                delivered.append(row_id)
+        return delivered
+
+    def notify(self):
+        """Wake the flusher up, e.g. right after an append"""
+        with self._lock:
+            self._notified += 1
+            if self._notified >= self.batch_size:
+                self._batch_full.set()
+        self._wakeup.set()
+
+    def stats(self) -> Dict[Text, Any]:
+        """Delivery counters and the size and latency of the last flush"""
+        return {
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "dead_lettered": self.dead_lettered,
+            "flushes": self.flushes,
+            "average_flush_size": self.delivered / self.flushes if self.flushes else 0,
+            "last_flush_size": self.last_flush_size,
+            "last_flush_ms": self.last_flush_seconds * 1000,
+        }
+
+    def start(self):
+        """Start the background thread"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="feedback-outbox-flusher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread after its current flush"""
+        self._stop.set()
+        self._batch_full.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                # keep going while full batches are delivered
+                while self.flush_once() == self.batch_size:
+                    pass
+            except Exception as e:
+                logger.error(f"Feedback outbox flush failed: {e}")
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self.linger > 0:
+                # collect submissions arriving close together into one batch
+                self._batch_full.wait(self.linger)
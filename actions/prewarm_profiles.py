@@ -0,0 +1,187 @@
+"""Create and populate many profile database sessions ahead of time.
+
+Run before a load test or an expected traffic spike, so that conversations
+find their profile ready instead of generating it on first contact:
+
+    python -m actions.prewarm_profiles --range 0 10000 --prefix load_test_
+    python -m actions.prewarm_profiles session_a session_b
+    python -m actions.prewarm_profiles --file session_ids.txt --workers 8
+
+Session ids are split into chunks which worker processes generate and write
+with bulk inserts, one transaction per chunk. Sessions that already exist
+are skipped, so running it twice is harmless. SQLite has a single writer, so
+it defaults to one worker there; more help with Postgres.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from typing import Iterator, List, Optional, Text
+
+import sqlalchemy as sa
+
+from actions.profile_db import (
+    Account,
+    AccountBalance,
+    CreditCard,
+    PopulatedTable,
+    ProfileDB,
+    RecipientRelationship,
+    Transaction,
+    create_database,
+    create_profile_engine,
+)
+
+PROFILE_DB_NAME = os.environ.get("PROFILE_DB_NAME", "profile")
+PROFILE_DB_URL = os.environ.get("PROFILE_DB_URL", f"sqlite:///{PROFILE_DB_NAME}.db")
+PREWARM_CHUNK_SIZE = 50
+
+# tables whose rows are counted for the rows/second report
+PROFILE_TABLES = [
+    Account,
+    CreditCard,
+    Transaction,
+    RecipientRelationship,
+    AccountBalance,
+    PopulatedTable,
+]
+
+# one per worker process, created by `init_worker`
+worker_profile_db: Optional[ProfileDB] = None
+
+
+def init_worker(db_url: Text, seed: Optional[int]):
+    global worker_profile_db
+    worker_profile_db = ProfileDB(
+        create_profile_engine(db_url, pool_min_size=1, pool_max_size=1), seed=seed
+    )
+
+
+def prewarm_chunk(session_ids: List[Text]) -> int:
+    """Populate a chunk of sessions in the worker, returns how many were new"""
+    created = worker_profile_db.populate_profile_dbs(session_ids)
+    worker_profile_db.remove_session()
+    return len(created)
+
+
+def chunks(session_ids: List[Text], size: int) -> Iterator[List[Text]]:
+    for start in range(0, len(session_ids), size):
+        yield session_ids[start : start + size]
+
+
+def count_rows(engine: sa.engine.Engine) -> int:
+    with engine.connect() as connection:
+        return sum(
+            connection.execute(
+                sa.select(sa.func.count()).select_from(model.__table__)
+            ).scalar()
+            for model in PROFILE_TABLES
+        )
+
+
+def read_session_ids(args: argparse.Namespace) -> List[Text]:
+    session_ids = list(args.session_ids)
+    if args.range:
+        start, stop = args.range
+        session_ids.extend(f"{args.prefix}{i}" for i in range(start, stop))
+    if args.file:
+        with (sys.stdin if args.file == "-" else open(args.file)) as lines:
+            session_ids.extend(line.strip() for line in lines if line.strip())
+    # first occurrence wins, chunks must not share a session id
+    return list(dict.fromkeys(session_ids))
+
+
+def prewarm(
+    db_url: Text,
+    session_ids: List[Text],
+    workers: int = 1,
+    chunk_size: int = PREWARM_CHUNK_SIZE,
+    seed: Optional[int] = None,
+) -> dict:
+    """Populate `session_ids` on `workers` processes and report the throughput"""
+    engine = create_profile_engine(db_url)
+    create_database(engine, PROFILE_DB_NAME)
+    # creates the tables and general accounts once, before the workers start
+    profile_db = ProfileDB(engine, seed=seed)
+    rows_before = count_rows(engine)
+
+    start = time.perf_counter()
+    if workers > 1:
+        with multiprocessing.Pool(
+            workers, initializer=init_worker, initargs=(db_url, seed)
+        ) as pool:
+            created = sum(
+                pool.imap_unordered(prewarm_chunk, chunks(session_ids, chunk_size))
+            )
+    else:
+        created = sum(
+            len(profile_db.populate_profile_dbs(chunk))
+            for chunk in chunks(session_ids, chunk_size)
+        )
+    elapsed = time.perf_counter() - start
+
+    rows = count_rows(engine) - rows_before
+    profile_db.remove_session()
+    engine.dispose()
+    return {
+        "sessions": len(session_ids),
+        "created": created,
+        "skipped": len(session_ids) - created,
+        "rows": rows,
+        "seconds": elapsed,
+        "rows_per_second": rows / elapsed if elapsed else 0.0,
+    }
+
+
+def main(argv: Optional[List[Text]] = None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("session_ids", nargs="*", help="session ids to prewarm")
+    parser.add_argument(
+        "--range",
+        type=int,
+        nargs=2,
+        metavar=("START", "STOP"),
+        help="prewarm PREFIX + i for START <= i < STOP",
+    )
+    parser.add_argument("--prefix", default="session_")
+    parser.add_argument(
+        "--file", help="file with one session id per line, - for stdin"
+    )
+    parser.add_argument("--db-url", default=PROFILE_DB_URL)
+    parser.add_argument(
+        "--workers", type=int, help="defaults to 1 for SQLite, the CPU count otherwise"
+    )
+    parser.add_argument("--chunk-size", type=int, default=PREWARM_CHUNK_SIZE)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    session_ids = read_session_ids(args)
+    if not session_ids:
+        parser.error("no session ids, pass them as arguments, --range or --file")
+
+    workers = args.workers
+    if workers is None:
+        is_sqlite = sa.engine.make_url(args.db_url).get_backend_name() == "sqlite"
+        workers = 1 if is_sqlite else os.cpu_count() or 1
+    report = prewarm(
+        args.db_url,
+        session_ids,
+        workers=min(workers, -(-len(session_ids) // args.chunk_size)),
+        chunk_size=args.chunk_size,
+        seed=args.seed,
+    )
+    print(
+        f"created {report['created']} of {report['sessions']} sessions "
+        f"({report['skipped']} already existed)"
+    )
+    print(
+        f"wrote {report['rows']} rows in {report['seconds']:.2f}s, "
+        f"{report['rows_per_second']:.0f} rows/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,20 +3,36 @@
 #
 
 import os
+import asyncio
+import hashlib
+import threading
 import sqlalchemy as sa
-from sqlalchemy import Column, Integer, String, DateTime, REAL
-from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy import Column, Integer, String, DateTime, REAL, Index, UniqueConstraint
+from sqlalchemy.orm import Session, scoped_session, sessionmaker
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.engine.base import Engine
-from typing import Dict, Text, List, Union, Optional
+from typing import Any, Dict, Iterator, NamedTuple, Text, List, Tuple, Union, Optional
 
-from random import choice, randrange, sample, randint
-from numpy import arange
+import numpy as np
 from datetime import datetime, timedelta
 import pytz
 
+from actions.ttl_cache import TTLCache
+
 utc = pytz.UTC
 
+# Connections kept open by the pool, and the hard upper bound of open connections
+PROFILE_DB_POOL_MIN = int(os.environ.get("PROFILE_DB_POOL_MIN", 5))
+PROFILE_DB_POOL_MAX = int(os.environ.get("PROFILE_DB_POOL_MAX", 20))
+# Milliseconds a SQLite connection waits for a lock held by another writer
+SQLITE_BUSY_TIMEOUT = int(os.environ.get("PROFILE_DB_SQLITE_BUSY_TIMEOUT", 30000))
+# Entries and lifetime in seconds of the in-process cache of per-session lookups
+PROFILE_CACHE_SIZE = int(os.environ.get("PROFILE_CACHE_SIZE", 10000))
+PROFILE_CACHE_TTL = float(os.environ.get("PROFILE_CACHE_TTL", 300))
+# Lifetime of cached balances, which other processes may change, 0 disables caching them
+PROFILE_BALANCE_CACHE_TTL = float(os.environ.get("PROFILE_BALANCE_CACHE_TTL", 5))
+
 GENERAL_ACCOUNTS = {
     "recipient": [
         "katy parrow",
@@ -32,9 +48,29 @@ GENERAL_ACCOUNTS = {
     "depositor": ["interest", "employer"],
 }
 
+
+class GeneralAccount(NamedTuple):
+    """A vendor, recipient or depositor account of `GENERAL_ACCOUNTS`"""
+
+    id: int
+    account_holder_name: Text
+
+
 ACCOUNT_NUMBER_LENGTH = 12
 CREDIT_CARD_NUMBER_LENGTH = 14
 
+CREDIT_CARD_NAMES = ["iron bank", "credit all", "emblem", "justice bank"]
+
+# Rows per page of streamed transactions
+TRANSACTIONS_PAGE_SIZE = 500
+# SQLite `strftime` and Postgres `to_char` formats of the periods transactions
+# can be aggregated by
+PERIOD_FORMATS = {
+    "day": ("%Y-%m-%d", "YYYY-MM-DD"),
+    "month": ("%Y-%m", "YYYY-MM"),
+    "year": ("%Y", "YYYY"),
+}
+
 
 Base = declarative_base()
 
@@ -48,6 +84,7 @@ class Account(Base):
     """
 
     __tablename__ = "account"
+    __table_args__ = (Index("ix_account_session_id", "session_id"),)
     id = Column(Integer, primary_key=True)
     session_id = Column(String(255))
     account_holder_name = Column(String(255))
@@ -58,6 +95,9 @@ class CreditCard(Base):
     """Credit cards table. `account_id` is an `Account.id`"""
 
     __tablename__ = "creditcards"
+    __table_args__ = (
+        Index("ix_creditcards_account_id_name", "account_id", "credit_card_name"),
+    )
     id = Column(Integer, primary_key=True)
     credit_card_name = Column(String(255))
     minimum_balance = Column(REAL)
@@ -69,6 +109,10 @@ class Transaction(Base):
     """Transactions table. `to/from_acount_number` are `Account.id`s with leading zeros"""
 
     __tablename__ = "transactions"
+    __table_args__ = (
+        Index("ix_transactions_from_timestamp", "from_account_number", "timestamp"),
+        Index("ix_transactions_to_timestamp", "to_account_number", "timestamp"),
+    )
     id = Column(Integer, primary_key=True)
     timestamp = Column(DateTime)
     amount = Column(REAL)
@@ -76,16 +120,56 @@ class Transaction(Base):
     to_account_number = Column(String(14))
 
 
+# Columns of streamed transaction rows, which are plain tuples instead of
+# session tracked `Transaction` objects
+TRANSACTION_COLUMNS = (
+    Transaction.id,
+    Transaction.timestamp,
+    Transaction.amount,
+    Transaction.from_account_number,
+    Transaction.to_account_number,
+)
+
+
 class RecipientRelationship(Base):
     """Valid recipients table. `account_id` and `recipient_account_id` are `Account.id`'s"""
 
     __tablename__ = "recipient_relationships"
+    __table_args__ = (
+        Index(
+            "ix_recipient_relationships_account_id_nickname",
+            "account_id",
+            "recipient_nickname",
+        ),
+    )
     id = Column(Integer, primary_key=True)
     account_id = Column(Integer)
     recipient_account_id = Column(Integer)
     recipient_nickname = Column(String(255))
 
 
+class AccountBalance(Base):
+    """Running balance of an account, kept in step with `transactions`.
+    `account_number` is a `Transaction.to/from_account_number`.
+    """
+
+    __tablename__ = "account_balances"
+    account_number = Column(String(14), primary_key=True)
+    balance = Column(REAL, nullable=False)
+
+
+class PopulatedTable(Base):
+    """Tables whose sample rows have been generated for an account.
+    `account_id` is an `Account.id`, `table_name` one of the per-session tables.
+    """
+
+    __tablename__ = "populated_tables"
+    __table_args__ = (UniqueConstraint("account_id", "table_name"),)
+    id = Column(Integer, primary_key=True)
+    account_id = Column(Integer)
+    table_name = Column(String(255))
+
+
 def create_database(database_engine: Engine, database_name: Text):
     """Try to connect to the database. Create it if it does not exist"""
     try:
@@ -99,20 +183,203 @@ def create_database(database_engine: Engine, database_name: Text):
         conn.close()
 
 
+# the tables whose sample rows are generated per session
+PER_SESSION_TABLES = [
+    CreditCard.__tablename__,
+    Transaction.__tablename__,
+    RecipientRelationship.__tablename__,
+]
+
+
+def create_tables(bind: Union[Engine, sa.engine.Connection]):
+    """Create the profile tables which do not exist yet and migrate them"""
+    tracked = sa.inspect(bind).has_table(PopulatedTable.__tablename__)
+    CreditCard.__table__.create(bind, checkfirst=True)
+    Transaction.__table__.create(bind, checkfirst=True)
+    RecipientRelationship.__table__.create(bind, checkfirst=True)
+    Account.__table__.create(bind, checkfirst=True)
+    PopulatedTable.__table__.create(bind, checkfirst=True)
+    AccountBalance.__table__.create(bind, checkfirst=True)
+    if not tracked:
+        claim_existing_accounts(bind)
+    migrate(bind)
+
+
+def claim_existing_accounts(bind: Union[Engine, sa.engine.Connection]):
+    """Mark the tables of accounts created before `populated_tables` existed
+    as populated, those accounts already have their sample rows.
+    """
+    if isinstance(bind, Engine):
+        with bind.begin() as connection:
+            claim_existing_accounts(connection)
+        return
+    for table_name in PER_SESSION_TABLES:
+        bind.execute(
+            PopulatedTable.__table__.insert().from_select(
+                ["account_id", "table_name"],
+                sa.select(Account.__table__.c.id, sa.literal(table_name)),
+            )
+        )
+
+
+def migrate(bind: Union[Engine, sa.engine.Connection]):
+    """Bring tables created by earlier versions up to date.
+    `create` skips existing tables, so indexes added to them later are
+    created here. Idempotent, a no-op on an up to date database.
+    """
+    inspector = sa.inspect(bind)
+    existing_indexes = {
+        table_name: {index["name"] for index in inspector.get_indexes(table_name)}
+        for table_name in Base.metadata.tables
+    }
+    for table_name, table in Base.metadata.tables.items():
+        for index in table.indexes:
+            if index.name not in existing_indexes[table_name]:
+                index.create(bind)
+
+
+def create_profile_engine(
+    db_url: Union[Text, sa.engine.URL],
+    pool_min_size: int = PROFILE_DB_POOL_MIN,
+    pool_max_size: int = PROFILE_DB_POOL_MAX,
+) -> Engine:
+    """Create an engine which concurrent conversations can share.
+    SQLite files run in WAL mode, so readers do not block the writer, and wait
+    for locks instead of failing. In-memory SQLite databases exist once per
+    connection, so they are served by a single shared connection.
+    """
+    db_url = sa.engine.make_url(db_url)
+    if db_url.get_backend_name() != "sqlite":
+        return sa.create_engine(
+            db_url,
+            pool_size=pool_min_size,
+            max_overflow=max(pool_max_size - pool_min_size, 0),
+            pool_pre_ping=True,
+        )
+
+    if db_url.database in (None, "", ":memory:"):
+        return sa.create_engine(
+            db_url,
+            poolclass=sa.pool.StaticPool,
+            connect_args={"check_same_thread": False},
+        )
+
+    engine = sa.create_engine(
+        db_url,
+        poolclass=sa.pool.QueuePool,
+        pool_size=pool_min_size,
+        max_overflow=max(pool_max_size - pool_min_size, 0),
+        connect_args={"check_same_thread": False},
+    )
+
+    @sa.event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+        cursor.close()
+
+    return engine
+
+
+def session_scope() -> tuple:
+    """Scope of a `ProfileDB` session: the current thread and asyncio task"""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return threading.get_ident(), id(task) if task is not None else None
+
+
+def random_amounts(
+    rng: np.random.Generator, low: float, high: float, size: int
+) -> np.ndarray:
+    """Distinct amounts with cent precision drawn from `[low, high)`"""
+    cents = rng.choice(int(high * 100) - int(low * 100), size=size, replace=False)
+    return (cents + int(low * 100)) / 100
+
+
+def session_rng(
+    session_id: Text, table_name: Text, seed: Optional[int] = None
+) -> np.random.Generator:
+    """Random source of the sample rows of one table of a session.
+    Derived from `session_id`, so the same session always gets the same data
+    no matter in which order or process its tables are populated.
+    """
+    digest = hashlib.sha256(f"{seed}:{session_id}:{table_name}".encode()).digest()
+    return np.random.default_rng(int.from_bytes(digest[:8], "big"))
+
+
 class ProfileDB:
-    def __init__(self, db_engine: Engine):
+    # generators of the per-session tables
+    TABLE_POPULATORS = {
+        CreditCard.__tablename__: "add_credit_cards",
+        Transaction.__tablename__: "add_transactions",
+        RecipientRelationship.__tablename__: "add_recipients",
+    }
+
+    def __init__(
+        self, db_engine: Engine, seed: Optional[int] = None, lazy: bool = False
+    ):
+        """In `lazy` mode a new session only gets its account row, the sample
+        rows of each per-session table are generated when first queried.
+        """
         self.engine = db_engine
+        # mixed into the per-session seeds, `None` keeps the plain session seeds
+        self.seed = seed
+        self.lazy = lazy
+        # (account id, table name) pairs known to be populated, the least
+        # recently used are forgotten and looked up again when needed
+        self._populated = TTLCache(maxsize=PROFILE_CACHE_SIZE, ttl=None)
+        # serializes the creation of accounts within this process
+        self._accounts_lock = threading.Lock()
+        # account rows, recipient, card and vendor lists and balances, keyed by
+        # (kind, session id or account number). Entries are dropped by the
+        # methods changing them.
+        self.cache = TTLCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL)
+        # `GENERAL_ACCOUNTS` by kind, with their ids, filled by the bootstrap
+        self.general_accounts: Dict[Text, List[GeneralAccount]] = {}
+        # one session per thread and asyncio task, so concurrent conversations
+        # never share a unit of work. Objects stay usable after a commit.
+        self.Session = scoped_session(
+            sessionmaker(bind=self.engine, autoflush=True, expire_on_commit=False),
+            scopefunc=session_scope,
+        )
         self.create_tables()
-        self.session = self.get_session()
+        self.general_accounts = self.bootstrap_general_accounts()
+        self.remove_session()
+
+    @property
+    def session(self) -> Session:
+        """The session of the current thread or asyncio task"""
+        registry = self.Session.registry
+        if not registry.has():
+            scope = session_scope()
+            if scope[1] is not None:
+                # task scoped sessions go away with their task
+                asyncio.current_task().add_done_callback(
+                    lambda task: self.remove_session(scope)
+                )
+        return self.Session()
 
     def get_session(self) -> Session:
-        return sessionmaker(bind=self.engine, autoflush=True)()
+        return self.session
+
+    def remove_session(self, scope: Optional[tuple] = None):
+        """Close and forget the session of a scope, the current one by default"""
+        if scope is None:
+            self.Session.remove()
+            return
+        session = self.Session.registry.registry.pop(scope, None)
+        if session is not None:
+            session.close()
 
     def create_tables(self):
-        CreditCard.__table__.create(self.engine, checkfirst=True)
-        Transaction.__table__.create(self.engine, checkfirst=True)
-        RecipientRelationship.__table__.create(self.engine, checkfirst=True)
-        Account.__table__.create(self.engine, checkfirst=True)
+        create_tables(self.engine)
+
+    def migrate(self):
+        migrate(self.engine)
 
     def get_account(self, id: int):
         """Get an `Account` object based on an `Account.id`"""
@@ -120,14 +387,34 @@ class ProfileDB:
 
     def get_account_from_session_id(self, session_id: Text):
         """Get an `Account` object based on a `Account.session_id`"""
-        # if the action server restarts in the middle of a conversation, the db will need to be repopulated outside of an action_session_start
-        if not self.check_session_id_exists(session_id):
-            self.populate_profile_db(session_id)
+        account = self.cache.get(("account", session_id))
+        if account is not None:
+            return account
         account = (
             self.session.query(Account).filter(Account.session_id == session_id).first()
         )
+        # if the action server restarts in the middle of a conversation, the db will need to be repopulated outside of an action_session_start
+        if account is None:
+            self.populate_profile_db(session_id)
+            account = (
+                self.session.query(Account)
+                .filter(Account.session_id == session_id)
+                .first()
+            )
+        # cached objects are shared between sessions, detach it from this one
+        self.session.expunge(account)
+        self.cache.set(("account", session_id), account)
         return account
 
+    def cache_stats(self) -> Dict[Text, Any]:
+        """Size and hit/miss counters of the lookup cache"""
+        return self.cache.stats()
+
+    def invalidate_balances(self, *account_numbers: Text):
+        """Drop cached balances, e.g. after a transfer was committed"""
+        for account_number in account_numbers:
+            self.cache.invalidate(("balance", account_number))
+
     @staticmethod
     def get_account_number(account: Union[CreditCard, Account]):
         """Get a bank or credit card account number by adding the appropriate number of leading zeros to an `Account.id`"""
@@ -155,6 +442,7 @@ class ProfileDB:
         """Get a recipient based on the nickname.
         Take the first one if there are multiple that match.
         """
+        self.populate_table(session_id, RecipientRelationship.__tablename__)
         account = self.get_account_from_session_id(session_id)
         recipient = (
             self.session.query(RecipientRelationship)
@@ -167,6 +455,10 @@ class ProfileDB:
 
     def list_known_recipients(self, session_id: Text):
         """List recipient nicknames available to an account holder"""
+        nicknames = self.cache.get(("recipients", session_id))
+        if nicknames is not None:
+            return list(nicknames)
+        self.populate_table(session_id, RecipientRelationship.__tablename__)
         recipients = (
             self.session.query(RecipientRelationship.recipient_nickname)
             .filter(
@@ -175,10 +467,14 @@ class ProfileDB:
             )
             .all()
         )
-        return [recipient.recipient_nickname for recipient in recipients]
+        nicknames = tuple(recipient.recipient_nickname for recipient in recipients)
+        self.cache.set(("recipients", session_id), nicknames)
+        return list(nicknames)
 
     def check_session_id_exists(self, session_id: Text):
         """Check if an account for `session_id` already exists"""
+        if self.cache.get(("account", session_id)) is not None:
+            return True
         return self.session.query(
             self.session.query(Account.session_id)
             .filter(Account.session_id == session_id)
@@ -187,20 +483,85 @@ class ProfileDB:
 
     def get_account_balance(self, session_id: Text):
         """Get the account balance for an account"""
+        self.populate_table(session_id, Transaction.__tablename__)
         account_number = self.get_account_number(
             self.get_account_from_session_id(session_id)
         )
-        spent = float(
+        balance = self.cache.get(("balance", account_number))
+        if balance is not None:
+            return balance
+        entry = self.session.get(AccountBalance, account_number)
+        if entry is None:
+            # accounts populated before the ledger existed
+            entry = self.rebuild_balance(account_number)
+            self.session.commit()
+        # transfers made by other processes only show once the entry expired
+        if PROFILE_BALANCE_CACHE_TTL > 0:
+            self.cache.set(
+                ("balance", account_number), entry.balance, ttl=PROFILE_BALANCE_CACHE_TTL
+            )
+        return entry.balance
+
+    def compute_balance(self, account_number: Text) -> float:
+        """Sum up the transactions of an account"""
+        spent = (
             self.session.query(sa.func.sum(Transaction.amount))
             .filter(Transaction.from_account_number == account_number)
-            .all()[0][0]
+            .scalar()
         )
-        earned = float(
+        earned = (
             self.session.query(sa.func.sum(Transaction.amount))
             .filter(Transaction.to_account_number == account_number)
-            .all()[0][0]
+            .scalar()
         )
-        return earned - spent
+        return float(earned or 0) - float(spent or 0)
+
+    def rebuild_balance(self, account_number: Text) -> AccountBalance:
+        """Create the ledger entry of an account from its transactions.
+        An entry created meanwhile by a concurrent call is kept and returned.
+        """
+        values = {
+            "account_number": account_number,
+            "balance": self.compute_balance(account_number),
+        }
+        dialect = self.session.get_bind().dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+            self.session.execute(
+                insert(AccountBalance.__table__)
+                .values(**values)
+                .on_conflict_do_nothing(index_elements=["account_number"])
+            )
+        else:
+            try:
+                with self.session.begin_nested():
+                    self.session.add(AccountBalance(**values))
+            except sa.exc.IntegrityError:
+                pass
+        self.invalidate_balances(account_number)
+        return self.session.get(AccountBalance, account_number, populate_existing=True)
+
+    def check_balances(
+        self, repair: bool = False, tolerance: float = 0.005
+    ) -> Dict[Text, Dict[Text, float]]:
+        """Compare every ledger entry with the sum of its transactions.
+        Returns the entries that are off by more than `tolerance`, and
+        rebuilds them if `repair` is set.
+        """
+        mismatches = {}
+        for entry in self.session.query(AccountBalance).all():
+            actual = self.compute_balance(entry.account_number)
+            if abs(entry.balance - actual) > tolerance:
+                mismatches[entry.account_number] = {
+                    "ledger": entry.balance,
+                    "transactions": actual,
+                }
+                if repair:
+                    entry.balance = actual
+        if repair:
+            self.session.commit()
+            self.invalidate_balances(*mismatches)
+        return mismatches
 
     def get_currency(self, session_id: Text):
         """Get the currency for an account"""
@@ -222,48 +583,182 @@ class ProfileDB:
         Looks for spend transactions by default, set `deposit` to `True` to search earnings.
         Looks for transactions with anybody by default, set `vendor` to search by vendor
         """
+        return self.session.query(Transaction).filter(
+            *self.transaction_filters(session_id, start_time, end_time, deposit, vendor)
+        )
+
+    def transaction_filters(
+        self,
+        session_id: Text,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        deposit: bool = False,
+        vendor: Optional[Text] = None,
+    ) -> List:
+        """Conditions selecting the transactions `search_transactions` finds"""
+        self.populate_table(session_id, Transaction.__tablename__)
         account = self.get_account_from_session_id(session_id)
         account_number = self.get_account_number(account)
         if deposit:
-            transactions = self.session.query(Transaction).filter(
-                Transaction.to_account_number == account_number
-            )
+            filters = [Transaction.to_account_number == account_number]
         elif vendor:
-            to_account = (
-                self.session.query(Account.id)
-                .filter(Account.session_id.startswith("vendor_"))
-                .filter(Account.account_holder_name == vendor.lower())
-                .first()
+            to_account = self.get_general_account("vendor", vendor)
+            filters = [
+                Transaction.from_account_number == account_number,
+                # an unknown vendor has no transactions
+                Transaction.to_account_number == self.get_account_number(to_account)
+                if to_account
+                else sa.false(),
+            ]
+        else:
+            filters = [Transaction.from_account_number == account_number]
+        if start_time:
+            filters.append(Transaction.timestamp >= start_time)
+        if end_time:
+            filters.append(Transaction.timestamp <= end_time)
+        return filters
+
+    def transactions_page(
+        self,
+        session_id: Text,
+        after: Optional[Tuple[datetime, int]] = None,
+        limit: int = TRANSACTIONS_PAGE_SIZE,
+        **search: Any,
+    ) -> Tuple[List[sa.engine.Row], Optional[Tuple[datetime, int]]]:
+        """One page of `search_transactions` in `(timestamp, id)` order.
+        Pages are selected by keyset, so every page costs one index range scan
+        no matter how deep it is. Returns the rows and the key to pass as
+        `after` for the next page, or `None` after the last page.
+        """
+        query = self.session.query(*TRANSACTION_COLUMNS).filter(
+            *self.transaction_filters(session_id, **search)
+        )
+        if after is not None:
+            timestamp, id = after
+            # a row value comparison, which the database can seek to in the
+            # (account number, timestamp) indexes
+            query = query.filter(
+                sa.tuple_(Transaction.timestamp, Transaction.id) > (timestamp, id)
             )
-            to_account_number = self.get_account_number(to_account)
-            transactions = (
-                self.session.query(Transaction)
-                .filter(Transaction.from_account_number == account_number)
-                .filter(Transaction.to_account_number == to_account_number)
+        rows = (
+            query.order_by(Transaction.timestamp, Transaction.id).limit(limit).all()
+        )
+        if len(rows) < limit:
+            return rows, None
+        return rows, (rows[-1].timestamp, rows[-1].id)
+
+    def iter_transactions(
+        self, session_id: Text, chunk_size: int = TRANSACTIONS_PAGE_SIZE, **search: Any
+    ) -> Iterator[List[sa.engine.Row]]:
+        """Stream the transactions `search_transactions` finds in chunks of
+        `chunk_size` rows, oldest first. Only one chunk is held in memory.
+        Rows have the attributes of `Transaction`, transactions without a
+        timestamp are skipped.
+        """
+        after = None
+        while True:
+            rows, after = self.transactions_page(
+                session_id, after=after, limit=chunk_size, **search
             )
+            if rows:
+                yield rows
+            if after is None:
+                return
+
+    def aggregate_transactions(
+        self,
+        session_id: Text,
+        group_by: Text = "vendor",
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        deposit: bool = False,
+    ) -> List[Dict[Text, Any]]:
+        """Total amount and number of transactions per counterparty or period.
+        `group_by` is "vendor" (the counterparty, e.g. the depositor for
+        deposits), "day", "month" or "year". Computed by the database, no
+        transaction rows are loaded.
+        """
+        filters = self.transaction_filters(
+            session_id, start_time=start_time, end_time=end_time, deposit=deposit
+        )
+        if group_by == "vendor":
+            key = (
+                Transaction.from_account_number
+                if deposit
+                else Transaction.to_account_number
+            )
+        elif group_by in PERIOD_FORMATS:
+            key = self.period_expression(group_by)
         else:
-            transactions = self.session.query(Transaction).filter(
-                Transaction.from_account_number == account_number
+            raise ValueError(f"Cannot group transactions by '{group_by}'")
+
+        groups = (
+            self.session.query(
+                key.label("key"),
+                sa.func.sum(Transaction.amount).label("total"),
+                sa.func.count(Transaction.id).label("count"),
             )
-        if start_time:
-            transactions = transactions.filter(Transaction.timestamp >= start_time)
-        if end_time:
-            transactions = transactions.filter(Transaction.timestamp <= end_time)
+            .filter(*filters)
+            .group_by(key)
+            .order_by(key)
+            .all()
+        )
+        names = {}
+        if group_by == "vendor":
+            names = self.account_holder_names([group.key for group in groups])
+        return [
+            {
+                group_by: names.get(group.key, group.key),
+                "total": float(group.total),
+                "count": group.count,
+            }
+            for group in groups
+        ]
+
+    def period_expression(self, period: Text):
+        """SQL expression formatting `Transaction.timestamp` as a day, month or year"""
+        if self.session.get_bind().dialect.name == "sqlite":
+            return sa.func.strftime(PERIOD_FORMATS[period][0], Transaction.timestamp)
+        return sa.func.to_char(Transaction.timestamp, PERIOD_FORMATS[period][1])
 
-        return transactions
+    def account_holder_names(self, account_numbers: List[Text]) -> Dict[Text, Text]:
+        """Names of the holders of bank and credit card accounts"""
+        names = {}
+        for model, name, length in (
+            (Account, Account.account_holder_name, ACCOUNT_NUMBER_LENGTH),
+            (CreditCard, CreditCard.credit_card_name, CREDIT_CARD_NUMBER_LENGTH),
+        ):
+            numbers = {
+                int(number): number
+                for number in account_numbers
+                if number and len(number) == length
+            }
+            if numbers:
+                for id, holder_name in self.session.query(model.id, name).filter(
+                    model.id.in_(numbers)
+                ):
+                    names[numbers[id]] = holder_name
+        return names
 
     def list_credit_cards(self, session_id: Text):
         """List valid credit cards for an acccount"""
+        names = self.cache.get(("credit_cards", session_id))
+        if names is not None:
+            return list(names)
+        self.populate_table(session_id, CreditCard.__tablename__)
         account = self.get_account_from_session_id(session_id)
         cards = (
-            self.session.query(CreditCard)
+            self.session.query(CreditCard.credit_card_name)
             .filter(CreditCard.account_id == account.id)
             .all()
         )
-        return [card.credit_card_name for card in cards]
+        names = tuple(card.credit_card_name for card in cards)
+        self.cache.set(("credit_cards", session_id), names)
+        return list(names)
 
     def get_credit_card(self, session_id: Text, credit_card_name: Text):
         """Get a `CreditCard` object based on the card's name and the `session_id`"""
+        self.populate_table(session_id, CreditCard.__tablename__)
         account = self.get_account_from_session_id(session_id)
         return (
             self.session.query(CreditCard)
@@ -294,17 +789,14 @@ class ProfileDB:
 
     def list_vendors(self):
         """List valid vendors"""
-        vendors = (
-            self.session.query(Account.account_holder_name)
-            .filter(Account.session_id.startswith("vendor_"))
-            .all()
-        )
-        return [vendor.account_holder_name for vendor in vendors]
+        return [vendor.account_holder_name for vendor in self.general_accounts["vendor"]]
 
     def pay_off_credit_card(
         self, session_id: Text, credit_card_name: Text, amount: float
     ):
         """Do a transaction to move the specified amount from an account to a credit card"""
+        self.populate_table(session_id, CreditCard.__tablename__)
+        self.populate_table(session_id, Transaction.__tablename__)
         account = self.get_account_from_session_id(session_id)
         account_number = self.get_account_number(account)
         credit_card = (
@@ -317,6 +809,7 @@ class ProfileDB:
             account_number,
             self.get_account_number(credit_card),
             amount,
+            commit=False,
         )
         credit_card.current_balance -= amount
         if amount < credit_card.minimum_balance:
@@ -324,171 +817,290 @@ class ProfileDB:
         else:
             credit_card.minimum_balance = 0
         self.session.commit()
+        self.invalidate_balances(account_number, self.get_account_number(credit_card))
+        self.cache.invalidate(("credit_cards", session_id))
 
     def add_session_account(self, session_id: Text, name: Optional[Text] = ""):
         """Add a new account for a new session_id. Assumes no such account exists yet."""
         self.session.add(
             Account(session_id=session_id, account_holder_name=name, currency="$")
         )
+        self.cache.invalidate(("account", session_id))
 
     def add_credit_cards(self, session_id: Text):
         """Populate the creditcard table for a given session_id"""
-        credit_card_names = ["iron bank", "credit all", "emblem", "justice bank"]
-        credit_cards = [
-            CreditCard(
-                credit_card_name=cardname,
-                minimum_balance=choice([20, 30, 40]),
-                current_balance=choice(
-                    [round(amount, 2) for amount in list(arange(20, 500, 0.01))]
-                ),
-                account_id=self.get_account_from_session_id(session_id).id,
-            )
-            for cardname in credit_card_names
-        ]
-        self.session.add_all(credit_cards)
-
-    def check_general_accounts_populated(
-        self, general_account_names: Dict[Text, List[Text]]
-    ):
-        """Check whether tables have been populated with global values for vendors, recipients, and depositors"""
-        account_names = set(
+        account_id = self.get_account_from_session_id(session_id).id
+        rng = session_rng(session_id, CreditCard.__tablename__, self.seed)
+        minimum_balances = rng.choice([20, 30, 40], size=len(CREDIT_CARD_NAMES))
+        current_balances = rng.integers(2000, 50000, size=len(CREDIT_CARD_NAMES))
+        self.session.execute(
+            CreditCard.__table__.insert(),
             [
-                name
-                for list_names in general_account_names.values()
-                for name in list_names
-            ]
-        )
-        existing_accounts = self.session.query(Account.account_holder_name).filter(
-            Account.account_holder_name.in_(account_names)
-        )
-        existing_account_names = set(
-            [account.account_holder_name for account in existing_accounts.all()]
+                {
+                    "credit_card_name": cardname,
+                    "minimum_balance": minimum_balance,
+                    "current_balance": current_balance / 100,
+                    "account_id": account_id,
+                }
+                for cardname, minimum_balance, current_balance in zip(
+                    CREDIT_CARD_NAMES,
+                    minimum_balances.tolist(),
+                    current_balances.tolist(),
+                )
+            ],
         )
-        return account_names == existing_account_names
+        self.cache.invalidate(("credit_cards", session_id))
 
-    def add_general_accounts(self, general_account_names: Dict[Text, List[Text]]):
-        """Populate tables with global values for vendors, recipients, and depositors"""
-        general_accounts = [
-            Account(session_id=f"{prefix}_{id}", account_holder_name=name)
-            for prefix, names in general_account_names.items()
+    def bootstrap_general_accounts(self) -> Dict[Text, List[GeneralAccount]]:
+        """Add the accounts of `GENERAL_ACCOUNTS` which do not exist yet and
+        return all of them by kind. Done once, when the database is opened,
+        the sessions then look them up in memory.
+        """
+        session_ids = {
+            f"{prefix}_{id}": (prefix, name)
+            for prefix, names in GENERAL_ACCOUNTS.items()
             for id, name in enumerate(names)
-        ]
+        }
 
-        for account in general_accounts:
-            self.session.merge(account)
-        self.session.commit()
+        def existing_accounts():
+            return (
+                self.session.query(Account.id, Account.session_id)
+                .filter(Account.session_id.in_(session_ids))
+                .order_by(Account.id)
+                .all()
+            )
+
+        with self._accounts_lock:
+            accounts = existing_accounts()
+            missing = set(session_ids) - {account.session_id for account in accounts}
+            if missing:
+                self.session.execute(
+                    Account.__table__.insert(),
+                    [
+                        {
+                            "session_id": session_id,
+                            "account_holder_name": session_ids[session_id][1],
+                        }
+                        for session_id in sorted(missing)
+                    ],
+                )
+                self.session.commit()
+                accounts = existing_accounts()
+
+        general_accounts = {prefix: [] for prefix in GENERAL_ACCOUNTS}
+        seen = set()
+        for account in accounts:
+            # the oldest account wins if a session id was added twice
+            if account.session_id in seen:
+                continue
+            seen.add(account.session_id)
+            prefix, name = session_ids[account.session_id]
+            general_accounts[prefix].append(GeneralAccount(account.id, name))
+        return general_accounts
+
+    def get_general_account(self, kind: Text, name: Text) -> Optional[GeneralAccount]:
+        """Look up a vendor, recipient or depositor account by its name"""
+        return next(
+            (
+                account
+                for account in self.general_accounts.get(kind, [])
+                if account.account_holder_name == name.lower()
+            ),
+            None,
+        )
 
     def add_recipients(self, session_id: Text):
         """Populate recipients table"""
         account = self.get_account_from_session_id(session_id)
-        recipients = (
-            self.session.query(Account.account_holder_name, Account.id)
-            .filter(Account.session_id.startswith("recipient_"))
-            .all()
+        recipients = self.general_accounts["recipient"]
+        rng = session_rng(session_id, RecipientRelationship.__tablename__, self.seed)
+        number_of_recipients = int(rng.integers(3, len(recipients)))
+        session_recipients = rng.choice(
+            len(recipients), size=number_of_recipients, replace=False
         )
-        session_recipients = sample(recipients, choice(list(range(3, len(recipients)))))
-        relationships = [
-            RecipientRelationship(
-                account_id=account.id,
-                recipient_account_id=recipient.id,
-                recipient_nickname=recipient.account_holder_name,
-            )
-            for recipient in session_recipients
-        ]
-        self.session.add_all(relationships)
+        self.session.execute(
+            RecipientRelationship.__table__.insert(),
+            [
+                {
+                    "account_id": account.id,
+                    "recipient_account_id": recipients[index].id,
+                    "recipient_nickname": recipients[index].account_holder_name,
+                }
+                for index in session_recipients.tolist()
+            ],
+        )
+        self.cache.invalidate(("recipients", session_id))
 
     def add_transactions(self, session_id: Text):
-        """Populate transactions table for a session ID with random transactions"""
+        """Populate transactions table for a session ID with random transactions.
+
+        Amounts and dates of all counterparties are drawn as arrays first and
+        then written with a single executemany INSERT.
+        """
         account_number = self.get_account_number(
             self.get_account_from_session_id(session_id)
         )
-        vendors = (
-            self.session.query(Account)
-            .filter(Account.session_id.startswith("vendor_"))
-            .all()
-        )
-        depositors = (
-            self.session.query(Account)
-            .filter(Account.session_id.startswith("depositor_"))
-            .all()
-        )
+        vendors = self.general_accounts["vendor"]
+        depositors = self.general_accounts["depositor"]
 
         start_date = utc.localize(datetime(2019, 1, 1))
         end_date = utc.localize(datetime.now())
         number_of_days = (end_date - start_date).days
+        rng = session_rng(session_id, Transaction.__tablename__, self.seed)
 
-        for vendor in vendors:
-            rand_spend_amounts = sample(
-                [round(amount, 2) for amount in list(arange(5, 50, 0.01))],
-                number_of_days // 2,
+        # (from account number, to account number, amounts) per counterparty
+        batches = [
+            (
+                account_number,
+                self.get_account_number(vendor),
+                random_amounts(rng, 5, 50, number_of_days // 2),
             )
-
-            rand_dates = [
-                (start_date + timedelta(days=randrange(number_of_days)))
-                for x in range(0, len(rand_spend_amounts))
-            ]
-
-            spend_transactions = [
-                Transaction(
-                    from_account_number=account_number,
-                    to_account_number=self.get_account_number(vendor),
-                    amount=amount,
-                    timestamp=date,
-                )
-                for amount, date in zip(rand_spend_amounts, rand_dates)
-            ]
-
-            self.session.add_all(spend_transactions)
-
+            for vendor in vendors
+        ]
         for depositor in depositors:
             if depositor.account_holder_name == "interest":
-                rand_deposit_amounts = sample(
-                    [round(amount, 2) for amount in list(arange(5, 20, 0.01))],
-                    number_of_days // 30,
-                )
+                amounts = random_amounts(rng, 5, 20, number_of_days // 30)
             else:
-                rand_deposit_amounts = sample(
-                    [round(amount, 2) for amount in list(arange(1000, 2000, 0.01))],
-                    number_of_days // 14,
-                )
+                amounts = random_amounts(rng, 1000, 2000, number_of_days // 14)
+            batches.append(
+                (self.get_account_number(depositor), account_number, amounts)
+            )
+        if not batches:
+            return
 
-            rand_dates = [
-                (start_date + timedelta(days=randrange(number_of_days)))
-                for x in range(0, len(rand_deposit_amounts))
-            ]
+        counts = [len(batch_amounts) for _, _, batch_amounts in batches]
+        amounts = np.concatenate([batch_amounts for _, _, batch_amounts in batches])
+        from_numbers = np.repeat([from_number for from_number, _, _ in batches], counts)
+        to_numbers = np.repeat([to_number for _, to_number, _ in batches], counts)
+        days = np.array(
+            [start_date + timedelta(days=day) for day in range(number_of_days)],
+            dtype=object,
+        )
+        dates = days[rng.integers(number_of_days, size=len(amounts))]
 
-            deposit_transactions = [
-                Transaction(
-                    from_account_number=self.get_account_number(depositor),
-                    to_account_number=account_number,
-                    amount=amount,
-                    timestamp=date,
+        self.session.execute(
+            Transaction.__table__.insert(),
+            [
+                {
+                    "from_account_number": from_number,
+                    "to_account_number": to_number,
+                    "amount": amount,
+                    "timestamp": date,
+                }
+                for from_number, to_number, amount, date in zip(
+                    from_numbers.tolist(),
+                    to_numbers.tolist(),
+                    amounts.tolist(),
+                    dates.tolist(),
                 )
-                for amount, date in zip(rand_deposit_amounts, rand_dates)
-            ]
-
-            self.session.add_all(deposit_transactions)
+            ],
+        )
+        # seed the ledger, later transfers update it incrementally
+        self.rebuild_balance(account_number)
 
     def populate_profile_db(self, session_id: Text):
         """Initialize the database for a conversation session.
-        Will populate all tables with sample values.
-        If general accounts have already been populated, it will only
-        add account-holder-specific values to tables.
+        Will populate all tables with sample values, or only add the account
+        in `lazy` mode.
+        General accounts are added once by `bootstrap_general_accounts`.
         """
-        if not self.check_general_accounts_populated(GENERAL_ACCOUNTS):
-            self.add_general_accounts(GENERAL_ACCOUNTS)
-        if not self.check_session_id_exists(session_id):
+        with self._accounts_lock:
+            if self.check_session_id_exists(session_id):
+                return
             self.add_session_account(session_id)
-            self.add_recipients(session_id)
-            self.add_transactions(session_id)
-            self.add_credit_cards(session_id)
+            self.session.commit()
 
+        if not self.lazy:
+            for table_name in self.TABLE_POPULATORS:
+                self.populate_table(session_id, table_name)
         self.session.commit()
 
+    def populate_profile_dbs(self, session_ids: List[Text]) -> List[Text]:
+        """Create and fully populate many sessions in one transaction.
+        Sessions which already exist are skipped, as in `populate_profile_db`.
+        Returns the session ids that were created.
+        """
+        with self._accounts_lock:
+            existing = {
+                account.session_id
+                for account in self.session.query(Account.session_id).filter(
+                    Account.session_id.in_(session_ids)
+                )
+            }
+            new_session_ids = list(
+                dict.fromkeys(sid for sid in session_ids if sid not in existing)
+            )
+            if not new_session_ids:
+                return []
+            self.session.execute(
+                Account.__table__.insert(),
+                [
+                    {"session_id": sid, "account_holder_name": "", "currency": "$"}
+                    for sid in new_session_ids
+                ],
+            )
+            accounts = self.session.query(Account.id, Account.session_id).filter(
+                Account.session_id.in_(new_session_ids)
+            )
+            account_ids = {account.session_id: account.id for account in accounts}
+            # claimed up front, like `populate_table` does for a single table
+            self.session.execute(
+                PopulatedTable.__table__.insert(),
+                [
+                    {"account_id": account_ids[sid], "table_name": table_name}
+                    for sid in new_session_ids
+                    for table_name in self.TABLE_POPULATORS
+                ],
+            )
+            for session_id in new_session_ids:
+                self.cache.invalidate(("account", session_id))
+                for method in self.TABLE_POPULATORS.values():
+                    getattr(self, method)(session_id)
+            self.session.commit()
+
+        for sid in new_session_ids:
+            for table_name in self.TABLE_POPULATORS:
+                self._populated.set((account_ids[sid], table_name), True)
+        return new_session_ids
+
+    def populate_table(self, session_id: Text, table_name: Text):
+        """Generate the sample rows of one table for a session, once"""
+        account = self.get_account_from_session_id(session_id)
+        if self._populated.get((account.id, table_name)):
+            return
+        populated = self.session.query(
+            self.session.query(PopulatedTable)
+            .filter(PopulatedTable.account_id == account.id)
+            .filter(PopulatedTable.table_name == table_name)
+            .exists()
+        ).scalar()
+        if not populated:
+            try:
+                # claim the table first, concurrent conversations fail here
+                # instead of generating the same rows twice
+                self.session.add(
+                    PopulatedTable(account_id=account.id, table_name=table_name)
+                )
+                self.session.flush()
+                getattr(self, self.TABLE_POPULATORS[table_name])(session_id)
+                self.session.commit()
+            except sa.exc.IntegrityError:
+                # populated concurrently by another conversation
+                self.session.rollback()
+        self._populated.set((account.id, table_name), True)
+
     def transact(
-        self, from_account_number: Text, to_account_number: Text, amount: float
+        self,
+        from_account_number: Text,
+        to_account_number: Text,
+        amount: float,
+        commit: bool = True,
     ):
-        """Add a transation to the transaction table"""
+        """Add a transation to the transaction table.
+        The ledger entries of both accounts are updated in the same database
+        transaction, accounts without a ledger entry are left to be computed
+        on their first balance lookup.
+        """
         timestamp = datetime.now()
         transaction = Transaction(
             from_account_number=from_account_number,
@@ -497,4 +1109,16 @@ class ProfileDB:
             timestamp=timestamp,
         )
         self.session.add(transaction)
-        self.session.commit()
+        for account_number, change in (
+            (from_account_number, -amount),
+            (to_account_number, amount),
+        ):
+            self.session.query(AccountBalance).filter(
+                AccountBalance.account_number == account_number
+            ).update(
+                {AccountBalance.balance: AccountBalance.balance + change},
+                synchronize_session="fetch",
+            )
+        if commit:
+            self.session.commit()
+            self.invalidate_balances(from_account_number, to_account_number)
@@ -0,0 +1,220 @@
+"""Nearest-neighbour cache of fallback utterances and the intents the LLM gave them.
+
+Utterances are embedded with the word vectors of the spaCy model the NLU
+pipeline already uses (`en_core_web_md`). Unit-length embeddings are kept in
+one NumPy matrix, so a lookup is a single matrix-vector product. Each save
+writes a new numbered `.npy` matrix, then replaces the JSON file of labels
+that names it, so the two always match. The matrix is memory-mapped when
+loaded so that startup does not read it eagerly.
+
+Averaged word vectors hardly change when a sentence is negated, so a stored
+utterance only answers a new one when both are negated or neither is.
+"""
+import os
+import re
+import json
+import atexit
+import asyncio
+import logging
+import threading
+from typing import Callable, List, Optional, Text, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Path prefix of the persisted index (`<path>.json` and `<path>.<version>.npy`), unset keeps it in memory
+SEMANTIC_CACHE_PATH = os.environ.get("LLM_SEMANTIC_CACHE_PATH")
+# Minimum cosine similarity for a stored utterance to answer a new one
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("LLM_SEMANTIC_CACHE_THRESHOLD", 0.92))
+# Persist the index after this many additions
+SEMANTIC_CACHE_SAVE_EVERY = int(os.environ.get("LLM_SEMANTIC_CACHE_SAVE_EVERY", 20))
+SPACY_MODEL = os.environ.get("SPACY_MODEL", "en_core_web_md")
+SPACY_PIPES = ["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "ner", "senter"]
+
+NEGATIONS = {
+    "not", "no", "never", "nothing", "nobody", "none", "neither", "nor", "cannot",
+    "dont", "doesnt", "didnt", "isnt", "arent", "wasnt", "werent", "cant", "couldnt",
+    "wont", "wouldnt", "shouldnt", "havent", "hasnt", "hadnt", "aint",
+}
+_WORD = re.compile(r"[a-z']+")
+
+
+def is_negated(text: Text) -> bool:
+    """Whether `text` contains a negation, e.g. not, don't or dont"""
+    return any(
+        word.replace("'", "") in NEGATIONS for word in _WORD.findall(text.lower())
+    )
+
+
+class SpacyEmbedder:
+    """Averaged spaCy word vectors.
+
+    The model is loaded in a background thread on first use, texts embedded
+    before it is ready get `None`, just like every text when spaCy or the
+    model is not installed, which disables the semantic cache.
+    """
+
+    def __init__(self, model_name: Text = SPACY_MODEL):
+        self.model_name = model_name
+        self._nlp = None
+        self._unavailable = False
+        self._loader: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def load_in_background(self) -> threading.Thread:
+        """Start loading the model unless it already is, returns the loading thread"""
+        with self._lock:
+            if self._loader is None:
+                self._loader = threading.Thread(
+                    target=self._load, name="spacy-embedder", daemon=True
+                )
+                self._loader.start()
+            return self._loader
+
+    def _load(self):
+        try:
+            import spacy
+
+            # only the tokenizer and vectors are needed
+            self._nlp = spacy.load(self.model_name, exclude=SPACY_PIPES)
+        except (ImportError, OSError) as e:
+            logger.warning(f"Semantic fallback cache disabled: {e}")
+            self._unavailable = True
+
+    def __call__(self, text: Text) -> Optional[np.ndarray]:
+        nlp = self._nlp
+        if nlp is None:
+            if not self._unavailable:
+                self.load_in_background()
+            return None
+        return nlp.make_doc(text).vector
+
+
+class SemanticIndex:
+    def __init__(
+        self,
+        embed: Callable[[Text], Optional[np.ndarray]],
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        path: Optional[Text] = None,
+        save_every: int = SEMANTIC_CACHE_SAVE_EVERY,
+    ):
+        self.embed = embed
+        self.threshold = threshold
+        self.path = path
+        self.save_every = save_every
+        self.matrix: Optional[np.ndarray] = None
+        self.size = 0
+        self.labels: List[Text] = []
+        self.texts: List[Text] = []
+        self._unsaved = 0
+        self._version = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(f"{path}.json"):
+            self.load()
+
+    def _unit_vector(self, text: Text) -> Optional[np.ndarray]:
+        vector = self.embed(text)
+        if vector is None:
+            return None
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if not norm:
+            # no known words, e.g. text in another language
+            return None
+        return vector / norm
+
+    def lookup(self, text: Text) -> Optional[Tuple[Text, float]]:
+        """Return the label and similarity of the closest stored utterance above
+        the threshold that is negated just like `text`
+        """
+        # `add` may replace the matrix meanwhile, the rows up to `size` of
+        # the one read here are never written again
+        with self._lock:
+            matrix, size, labels, texts = self.matrix, self.size, self.labels, self.texts
+        if not size:
+            return None
+        vector = self._unit_vector(text)
+        if vector is None:
+            return None
+
+        scores = matrix[:size] @ vector
+        negated = is_negated(text)
+        candidates = np.flatnonzero(scores >= self.threshold)
+        for best in candidates[np.argsort(-scores[candidates])]:
+            if is_negated(texts[best]) == negated:
+                return labels[best], float(scores[best])
+        return None
+
+    async def alookup(self, text: Text) -> Optional[Tuple[Text, float]]:
+        """`lookup` run off the event loop, embedding a text is CPU bound"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.lookup, text)
+
+    def add(self, text: Text, label: Text):
+        """Store the label given to `text`"""
+        vector = self._unit_vector(text)
+        if vector is None:
+            return
+
+        with self._lock:
+            if self.matrix is None:
+                self.matrix = np.empty((16, vector.shape[0]), dtype=np.float32)
+            elif self.size == self.matrix.shape[0] or not self.matrix.flags.writeable:
+                # grow geometrically, this also copies a memory-mapped matrix into memory
+                grown = np.empty(
+                    (max(16, 2 * self.size), self.matrix.shape[1]), dtype=np.float32
+                )
+                grown[: self.size] = self.matrix[: self.size]
+                self.matrix = grown
+            self.matrix[self.size] = vector
+            self.size += 1
+            self.labels.append(label)
+            self.texts.append(text)
+            self._unsaved += 1
+
+        if self.path and self._unsaved >= self.save_every:
+            self.save()
+
+    async def aadd(self, text: Text, label: Text):
+        """`add` run off the event loop"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.add, text, label)
+
+    def save(self):
+        """Write the index to `<path>.<version>.npy`, then point `<path>.json` at it"""
+        if not self.path or not self._unsaved:
+            return
+        with self._lock:
+            version = self._version + 1
+            np.save(f"{self.path}.{version}.npy", self.matrix[: self.size])
+            with open(f"{self.path}.tmp.json", "w") as f:
+                json.dump(
+                    {"version": version, "labels": self.labels, "texts": self.texts}, f
+                )
+            # the only step a reader can observe, the matrix it names is complete
+            os.replace(f"{self.path}.tmp.json", f"{self.path}.json")
+            if self._version:
+                try:
+                    os.remove(f"{self.path}.{self._version}.npy")
+                except OSError as e:
+                    logger.debug(f"Could not remove the previous semantic index: {e}")
+            self._version = version
+            self._unsaved = 0
+
+    def load(self):
+        """Memory-map a previously saved index"""
+        with open(f"{self.path}.json") as f:
+            data = json.load(f)
+        matrix = np.load(f"{self.path}.{data['version']}.npy", mmap_mode="r")
+        with self._lock:
+            self.matrix = matrix
+            self.size = matrix.shape[0]
+            self.labels = data["labels"]
+            self.texts = data["texts"]
+            self._version = data["version"]
+            self._unsaved = 0
+
+
+semantic_index = SemanticIndex(SpacyEmbedder(), path=SEMANTIC_CACHE_PATH)
+atexit.register(semantic_index.save)
@@ -0,0 +1,157 @@
+"""Collapse duplicate concurrent runs of the same action request.
+
+Rasa retries a `/webhook` call that takes too long, and a double-clicked
+button can make the action server run the same action twice for the same
+tracker. Requests are keyed by conversation, action and the latest tracker
+event. The first request runs the action; identical requests arriving while
+it runs wait for it and get its events and messages instead of repeating
+LLM calls or feedback inserts. Finished results are kept for a short while,
+so a retry arriving just after the first run completed is answered too.
+"""
+import os
+import copy
+import asyncio
+import functools
+import logging
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Text,
+    Tuple,
+)
+
+from rasa_sdk import Tracker
+from rasa_sdk.executor import CollectingDispatcher
+
+from actions.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Seconds a finished result is replayed to late retries
+SINGLE_FLIGHT_TTL = float(os.environ.get("ACTION_SINGLE_FLIGHT_TTL", 30))
+SINGLE_FLIGHT_CACHE_SIZE = int(
+    os.environ.get("ACTION_SINGLE_FLIGHT_CACHE_SIZE", 1024)
+)
+
+_MISSING = object()
+
+
+class RecordingDispatcher(CollectingDispatcher):
+    """Dispatcher remembering its `utter_message` calls, to replay them"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls: List[Tuple[tuple, Dict[Text, Any]]] = []
+
+    def utter_message(self, *args: Any, **kwargs: Any):
+        self.calls.append((args, kwargs))
+        super().utter_message(*args, **kwargs)
+
+    def replay(self, dispatcher: CollectingDispatcher):
+        for args, kwargs in self.calls:
+            dispatcher.utter_message(*args, **kwargs)
+
+
+class SingleFlight:
+    def __init__(
+        self,
+        ttl: float = SINGLE_FLIGHT_TTL,
+        maxsize: int = SINGLE_FLIGHT_CACHE_SIZE,
+    ):
+        self._in_flight: Dict[Hashable, "asyncio.Future"] = {}
+        self.results = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.executed = 0
+        self.collapsed = 0
+        self.replayed = 0
+
+    async def do(
+        self, key: Hashable, factory: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """Run `factory()` unless it already runs or recently ran for `key`.
+
+        Returns the result and whether it was shared with another request.
+        Failures are passed to the waiting requests but not cached.
+        """
+        result = self.results.get(key, _MISSING)
+        if result is not _MISSING:
+            self.replayed += 1
+            return result, True
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.collapsed += 1
+            # a follower being cancelled must not cancel the shared run
+            return await asyncio.shield(task), True
+
+        task = asyncio.ensure_future(factory())
+        self._in_flight[key] = task
+        task.add_done_callback(functools.partial(self._finish, key))
+        self.executed += 1
+        # nor must the request that started it
+        return await asyncio.shield(task), False
+
+    def _finish(self, key: Hashable, task: "asyncio.Future"):
+        self._in_flight.pop(key, None)
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            logger.debug(f"Single-flight run {key} failed: {task.exception()}")
+            return
+        self.results.set(key, task.result())
+
+    def stats(self) -> Dict[Text, int]:
+        return {
+            "executed": self.executed,
+            "collapsed": self.collapsed,
+            "replayed": self.replayed,
+            "in_flight": len(self._in_flight),
+        }
+
+
+action_requests = SingleFlight()
+
+
+def request_key(action_name: Text, tracker: Tracker) -> Optional[Hashable]:
+    """(sender id, action name, number of events, latest event timestamp),
+    None for a tracker without events, which cannot be told apart.
+    """
+    if not tracker.events:
+        return None
+    latest = tracker.events[-1]
+    return (
+        tracker.sender_id,
+        action_name,
+        len(tracker.events),
+        latest.get("timestamp"),
+        latest.get("event"),
+    )
+
+
+def single_flight(run: Callable) -> Callable:
+    """Decorate an action's `run` so duplicate requests share one execution"""
+
+    @functools.wraps(run)
+    async def wrapper(
+        self, dispatcher: CollectingDispatcher, tracker: Tracker, domain: Dict
+    ) -> List[Dict[Text, Any]]:
+        key = request_key(self.name(), tracker)
+        if key is None:
+            return await run(self, dispatcher, tracker, domain)
+
+        async def execute() -> Tuple[RecordingDispatcher, List[Dict[Text, Any]]]:
+            recorder = RecordingDispatcher()
+            return recorder, await run(self, recorder, tracker, domain)
+
+        (recorder, events), shared = await action_requests.do(key, execute)
+        if shared:
+            logger.debug(f"Replaying the result of a duplicate request {key}.")
+        recorder.replay(dispatcher)
+        # every request gets its own copy of the shared result
+        return copy.deepcopy(events)
+
+    return wrapper
@@ -0,0 +1,108 @@
+"""Background work started ahead of time for a conversation.
+
+A speculative task is keyed by conversation and remembers the inputs it was
+started from. Starting a task for new inputs cancels the previous one, and a
+result is only handed out if it was computed from the inputs the caller
+expects, so a stale draft is never used.
+
+This is a narrow optimization. The only user is the user story draft of the
+feature request form, which is used when the user adds no details to the
+feature description ("no", "that's all"). Descriptions with details still
+wait for a full user story completion, as they did without speculation.
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Text, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds after which an unclaimed speculative result is dropped
+SPECULATION_MAX_AGE = float(os.environ.get("SPECULATION_MAX_AGE", 1800))
+
+
+class SpeculativeTasks:
+    def __init__(self, max_age: float = SPECULATION_MAX_AGE):
+        self.max_age = max_age
+        self._tasks: Dict[Text, Tuple[Hashable, "asyncio.Future", float]] = {}
+        self.started = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def start(
+        self,
+        key: Text,
+        inputs: Hashable,
+        factory: Callable[[], Awaitable[Any]],
+    ) -> bool:
+        """Start `factory()` in the background for `key` unless it already runs for `inputs`.
+
+        Returns whether a new task was started.
+        """
+        self._prune()
+        current = self._tasks.get(key)
+        if current is not None:
+            current_inputs, task, _ = current
+            if current_inputs == inputs and not (
+                task.done() and (task.cancelled() or task.exception())
+            ):
+                return False
+            self.cancel(key)
+
+        task = asyncio.ensure_future(factory())
+        # a failed speculation is only logged, the caller falls back to doing the work itself
+        task.add_done_callback(self._log_failure)
+        self._tasks[key] = (inputs, task, time.monotonic())
+        self.started += 1
+        return True
+
+    async def take(self, key: Text, inputs: Hashable) -> Optional[Any]:
+        """Wait for and return the result speculated for `key`, if it used the same `inputs`"""
+        current = self._tasks.pop(key, None)
+        if current is None:
+            return None
+
+        current_inputs, task, _ = current
+        if current_inputs != inputs:
+            task.cancel()
+            self.discarded += 1
+            return None
+
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                # the caller itself is being cancelled
+                raise
+            self.discarded += 1
+            return None
+        except Exception:
+            self.discarded += 1
+            return None
+        self.reused += 1
+        return result
+
+    def cancel(self, key: Text):
+        """Cancel and forget the task running for `key`"""
+        current = self._tasks.pop(key, None)
+        if current is not None:
+            current[1].cancel()
+            self.discarded += 1
+
+    def _prune(self):
+        now = time.monotonic()
+        for key, (_, _, started) in list(self._tasks.items()):
+            if now - started > self.max_age:
+                self.cancel(key)
+
+    @staticmethod
+    def _log_failure(task: "asyncio.Future"):
+        if not task.cancelled() and task.exception():
+            logger.debug(f"Speculative task failed: {task.exception()}")
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+
+user_story_drafts = SpeculativeTasks()
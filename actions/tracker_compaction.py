@@ -0,0 +1,298 @@
+"""Compact the `events` table of the SQL tracker store.
+
+Rasa's `SQLTrackerStore` keeps every event of every conversation. For each
+conversation this job keeps the events from the last `session_started` that
+is older than `--older-than-days` onwards. It writes the events before it to
+a compressed JSONL archive and deletes them from the live table. They are
+replaced by one `slot` event per slot that still had a value, so the slots
+`ActionSessionStart` carries over into new sessions stay the same.
+
+    python -m actions.tracker_compaction --older-than-days 30 --archive-dir archive
+    python -m actions.tracker_compaction --db-url sqlite:///rasa.db --dry-run
+
+Archives are `.jsonl.zst` if `zstandard` is installed and `.jsonl.gz`
+otherwise, one line per deleted event. The archived events of a conversation
+are synced to disk before its events are deleted.
+"""
+import argparse
+import gzip
+import io
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Text
+
+import sqlalchemy as sa
+from sqlalchemy.engine.base import Engine
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+TRACKER_COMPACTION_DAYS = float(os.environ.get("TRACKER_COMPACTION_DAYS", 30))
+TRACKER_ARCHIVE_DIR = os.environ.get("TRACKER_ARCHIVE_DIR", "tracker_archive")
+
+# events after which earlier slot values no longer apply
+SLOT_RESET_EVENTS = {"restart", "reset_slots"}
+# marks the slot events written in place of the compacted ones
+COMPACTED_METADATA = {"compacted": True}
+
+metadata = sa.MetaData()
+
+# the table `SQLTrackerStore` writes events to
+events_table = sa.Table(
+    "events",
+    metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("sender_id", sa.String(255), nullable=False, index=True),
+    sa.Column("type_name", sa.String(255), nullable=False),
+    sa.Column("timestamp", sa.Float),
+    sa.Column("intent_name", sa.String(255)),
+    sa.Column("action_name", sa.String(255)),
+    sa.Column("data", sa.Text),
+)
+
+
+def get_tracker_db_url() -> sa.engine.URL:
+    """Build the tracker store URL from the variables `endpoints.yml` uses.
+
+    `TRACKER_DB_URL` takes precedence, which allows e.g. a local SQLite store.
+    """
+    url = os.environ.get("TRACKER_DB_URL")
+    if url:
+        return sa.engine.make_url(url)
+
+    return sa.engine.URL.create(
+        "postgresql+psycopg2",
+        username=os.environ.get("DB_USERNAME"),
+        password=os.environ.get("DB_PASSWORD"),
+        host=os.environ.get("DB_URL"),
+        database=os.environ.get("DB_NAME"),
+    )
+
+
+def replay_slots(
+    events: List[Dict[Text, Any]], slots: Optional[Dict[Text, Any]] = None
+) -> Dict[Text, Any]:
+    """Slot values after applying `events` to `slots`"""
+    slots = dict(slots or {})
+    for event in events:
+        if event.get("event") == "slot":
+            slots[event.get("name")] = event.get("value")
+        elif event.get("event") in SLOT_RESET_EVENTS:
+            slots.clear()
+    return {name: value for name, value in slots.items() if value is not None}
+
+
+def is_snapshot(event: Dict[Text, Any]) -> bool:
+    return event.get("event") == "slot" and event.get("metadata") == COMPACTED_METADATA
+
+
+class ArchiveWriter:
+    """Compressed text file whose lines can be synced to disk"""
+
+    def __init__(self, path: Text):
+        self.path = path
+        self.raw = open(path, "wb")
+        if zstandard is not None:
+            self.compressed = zstandard.ZstdCompressor().stream_writer(self.raw)
+        else:
+            self.compressed = gzip.GzipFile(fileobj=self.raw, mode="wb")
+        self.text = io.TextIOWrapper(self.compressed, encoding="utf-8")
+        self._directory_synced = False
+
+    def write(self, line: Text):
+        self.text.write(line)
+
+    def sync(self):
+        """Write everything written so far through to the disk"""
+        self.text.flush()
+        # ends the current compressed block, so the data reaches the file
+        self.compressed.flush()
+        self.raw.flush()
+        os.fsync(self.raw.fileno())
+        if not self._directory_synced:
+            # the new file's directory entry has to be durable too
+            directory = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+            self._directory_synced = True
+
+    def close(self):
+        self.text.close()
+        if not self.raw.closed:
+            self.raw.close()
+
+
+def open_archive(archive_dir: Text) -> ArchiveWriter:
+    """Open a new archive file for writing text lines"""
+    os.makedirs(archive_dir, exist_ok=True)
+    name = f"events-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}"
+    extension = "zst" if zstandard is not None else "gz"
+    return ArchiveWriter(os.path.join(archive_dir, f"{name}.jsonl.{extension}"))
+
+
+def read_archive(path: Text) -> List[Dict[Text, Any]]:
+    """Read the events of an archive written by `compact_tracker_store`"""
+    if path.endswith(".zst"):
+        archive = zstandard.open(path, "rt", encoding="utf-8")
+    else:
+        archive = gzip.open(path, "rt", encoding="utf-8")
+    with archive:
+        return [json.loads(line) for line in archive]
+
+
+def compaction_boundaries(
+    connection: sa.engine.Connection, cutoff: float
+) -> Dict[Text, float]:
+    """Timestamp of the last `session_started` before `cutoff`, per conversation"""
+    query = (
+        sa.select(
+            events_table.c.sender_id,
+            sa.func.max(events_table.c.timestamp).label("timestamp"),
+        )
+        .where(events_table.c.type_name == "session_started")
+        .where(events_table.c.timestamp < cutoff)
+        .group_by(events_table.c.sender_id)
+    )
+    return {row.sender_id: row.timestamp for row in connection.execute(query)}
+
+
+def compact_conversation(
+    connection: sa.engine.Connection,
+    sender_id: Text,
+    boundary: float,
+    archive: Optional[Callable[[], ArchiveWriter]],
+) -> Dict[Text, int]:
+    """Archive and replace the events of a conversation before `boundary`.
+    `archive` returns the file to write to, without it nothing is changed.
+    """
+    before_boundary = sa.and_(
+        events_table.c.sender_id == sender_id,
+        events_table.c.timestamp < boundary,
+    )
+    rows = connection.execute(
+        sa.select(events_table)
+        .where(before_boundary)
+        .order_by(events_table.c.timestamp, events_table.c.id)
+    ).all()
+    events = [json.loads(row.data) for row in rows]
+    # already compacted, nothing but the snapshot of a previous run is left
+    if all(is_snapshot(event) for event in events):
+        return {"archived": 0, "snapshot": 0}
+
+    slots = replay_slots(events)
+    if archive is not None:
+        archive_file = archive()
+        for row, event in zip(rows, events):
+            archive_file.write(json.dumps({**row._asdict(), "data": event}) + "\n")
+        # on disk before the rows are deleted
+        archive_file.sync()
+        # sorted before the session that is kept
+        timestamp = rows[-1].timestamp
+        connection.execute(events_table.delete().where(before_boundary))
+        if slots:
+            connection.execute(
+                events_table.insert(),
+                [
+                    {
+                        "sender_id": sender_id,
+                        "type_name": "slot",
+                        "timestamp": timestamp,
+                        "data": json.dumps(
+                            {
+                                "event": "slot",
+                                "timestamp": timestamp,
+                                "name": name,
+                                "value": value,
+                                "metadata": COMPACTED_METADATA,
+                            }
+                        ),
+                    }
+                    for name, value in slots.items()
+                ],
+            )
+    return {"archived": len(rows), "snapshot": len(slots)}
+
+
+def compact_tracker_store(
+    engine: Engine,
+    older_than_days: float = TRACKER_COMPACTION_DAYS,
+    archive_dir: Text = TRACKER_ARCHIVE_DIR,
+    dry_run: bool = False,
+) -> Dict[Text, Any]:
+    """Compact all conversations, one transaction per conversation.
+    With `dry_run` only counts what would be archived.
+    """
+    cutoff = time.time() - older_than_days * 24 * 60 * 60
+    with engine.connect() as connection:
+        boundaries = compaction_boundaries(connection, cutoff)
+
+    stats = {"conversations": 0, "archived": 0, "snapshot": 0, "archive": None}
+    archive_files = []
+
+    def archive() -> ArchiveWriter:
+        # opened once there is something to archive
+        if not archive_files:
+            archive_files.append(open_archive(archive_dir))
+            stats["archive"] = archive_files[0].path
+        return archive_files[0]
+
+    try:
+        for sender_id, boundary in boundaries.items():
+            with engine.begin() as connection:
+                counts = compact_conversation(
+                    connection, sender_id, boundary, None if dry_run else archive
+                )
+            if counts["archived"]:
+                logger.debug(
+                    f"Compacted {counts['archived']} events of '{sender_id}'."
+                )
+                stats["conversations"] += 1
+                stats["archived"] += counts["archived"]
+                stats["snapshot"] += counts["snapshot"]
+    finally:
+        for archive_file in archive_files:
+            archive_file.close()
+    return stats
+
+
+def main(argv: Optional[List[Text]] = None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--db-url", help="defaults to the tracker store of endpoints.yml"
+    )
+    parser.add_argument(
+        "--older-than-days", type=float, default=TRACKER_COMPACTION_DAYS
+    )
+    parser.add_argument("--archive-dir", default=TRACKER_ARCHIVE_DIR)
+    parser.add_argument(
+        "--dry-run", action="store_true", help="count, but do not change anything"
+    )
+    args = parser.parse_args(argv)
+
+    engine = sa.create_engine(args.db_url or get_tracker_db_url())
+    stats = compact_tracker_store(
+        engine, args.older_than_days, args.archive_dir, args.dry_run
+    )
+    engine.dispose()
+    verb = "would archive" if args.dry_run else "archived"
+    print(
+        f"{verb} {stats['archived']} events of {stats['conversations']} "
+        f"conversations, kept {stats['snapshot']} slot values"
+    )
+    if stats["archive"]:
+        print(f"archive: {stats['archive']}")
+
+
+if __name__ == "__main__":
+    main()
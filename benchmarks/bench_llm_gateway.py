@@ -0,0 +1,64 @@
+"""Throughput of the shared LLM gateway under many concurrent conversations.
+
+Starts the fake completion server in-process and fires `--conversations`
+fallback classifications at once through `LLMGateway`, optionally streamed.
+
+    python benchmarks/bench_llm_gateway.py --conversations 200 --delay 0.5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_llm_server import FakeLLMServer  # noqa: E402
+from actions.llm_gateway import LLMGateway, create_llm_client  # noqa: E402
+
+
+async def run(args):
+    server = FakeLLMServer(delay=args.delay)
+    port = await server.start()
+    gateway = LLMGateway(
+        client=create_llm_client(f"http://127.0.0.1:{port}/v1"),
+        max_concurrency=args.concurrency,
+    )
+    messages = [
+        {"role": "system", "content": "Label a user's message with an intent."},
+        {"role": "user", "content": "sain baina uu"},
+    ]
+
+    async def conversation():
+        start = time.perf_counter()
+        if args.stream:
+            await gateway.classify(messages, ["out_of_scope", "find_page"], max_tokens=10)
+        else:
+            await gateway.complete(messages, max_tokens=10)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = sorted(
+        await asyncio.gather(*[conversation() for _ in range(args.conversations)])
+    )
+    elapsed = time.perf_counter() - start
+    await gateway.client.close()
+    await server.stop()
+
+    print(f"conversations:  {args.conversations}")
+    print(f"concurrency:    {args.concurrency}")
+    print(f"server delay:   {args.delay:.3f}s")
+    print(f"elapsed:        {elapsed:.3f}s")
+    print(f"throughput:     {args.conversations / elapsed:.1f} completions/s")
+    print(f"p50 latency:    {latencies[len(latencies) // 2]:.3f}s")
+    print(f"p99 latency:    {latencies[int(len(latencies) * 0.99) - 1]:.3f}s")
+    print(f"tcp connections: {server.connections}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--delay", type=float, default=0.5)
+    parser.add_argument("--stream", action="store_true", help="stream and classify")
+    asyncio.run(run(parser.parse_args()))
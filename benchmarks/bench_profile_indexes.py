@@ -0,0 +1,164 @@
+"""Per-session profile queries with and without the secondary indexes.
+
+Builds a profile database with `--sessions` accounts (a handful of cards and
+recipients and `--transactions` transactions each), times the session
+lookups the actions make with the indexes dropped, then runs
+`ProfileDB.migrate()` and times them again.
+
+    python benchmarks/bench_profile_indexes.py --sessions 1000 10000 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from actions.profile_db import (  # noqa: E402
+    Account,
+    Base,
+    CREDIT_CARD_NAMES,
+    CreditCard,
+    PopulatedTable,
+    ProfileDB,
+    RecipientRelationship,
+    Transaction,
+)
+
+CHUNK_SIZE = 10000
+
+
+def insert_chunked(connection, table, rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        connection.execute(table.insert(), rows[start : start + CHUNK_SIZE])
+
+
+def build(engine, sessions, transactions):
+    start_date = datetime(2019, 1, 1)
+    with engine.begin() as connection:
+        # after the general accounts `ProfileDB` adds
+        first_id = connection.execute(sa.select(sa.func.max(Account.id))).scalar() + 1
+        ids = range(first_id, first_id + sessions)
+        counterparty = "%0.12d" % (first_id + sessions)
+        insert_chunked(
+            connection,
+            Account.__table__,
+            [{"id": i, "session_id": f"session_{i}", "currency": "$"} for i in ids],
+        )
+        insert_chunked(
+            connection,
+            CreditCard.__table__,
+            [
+                {"account_id": i, "credit_card_name": name, "current_balance": 100}
+                for i in ids
+                for name in CREDIT_CARD_NAMES
+            ],
+        )
+        insert_chunked(
+            connection,
+            RecipientRelationship.__table__,
+            [
+                {"account_id": i, "recipient_account_id": 0, "recipient_nickname": name}
+                for i in ids
+                for name in ("evan oslo", "kyle gardner", "lisa macintyre")
+            ],
+        )
+        insert_chunked(
+            connection,
+            PopulatedTable.__table__,
+            [
+                {"account_id": i, "table_name": table_name}
+                for i in ids
+                for table_name in (
+                    CreditCard.__tablename__,
+                    RecipientRelationship.__tablename__,
+                    Transaction.__tablename__,
+                )
+            ],
+        )
+        rows = []
+        for i in ids:
+            account_number = "%0.12d" % i
+            for t in range(transactions):
+                spend = t % 4 != 0
+                rows.append(
+                    {
+                        "from_account_number": account_number if spend else counterparty,
+                        "to_account_number": counterparty if spend else account_number,
+                        "amount": 10.0,
+                        "timestamp": start_date + timedelta(days=t),
+                    }
+                )
+            if len(rows) >= CHUNK_SIZE:
+                insert_chunked(connection, Transaction.__table__, rows)
+                rows = []
+        insert_chunked(connection, Transaction.__table__, rows)
+    return ids
+
+
+def drop_indexes(engine):
+    with engine.begin() as connection:
+        for table in Base.metadata.tables.values():
+            for index in table.indexes:
+                connection.execute(f"DROP INDEX IF EXISTS {index.name}")
+
+
+def time_queries(profile_db, session_ids):
+    since = datetime(2019, 3, 1)
+    queries = {
+        "check_session_id_exists": profile_db.check_session_id_exists,
+        "get_account_balance": profile_db.get_account_balance,
+        "search_transactions": lambda session_id: profile_db.search_transactions(
+            session_id, start_time=since
+        ).all(),
+        "list_known_recipients": profile_db.list_known_recipients,
+        "list_credit_cards": profile_db.list_credit_cards,
+    }
+    timings = {}
+    for name, query in queries.items():
+        samples = []
+        for session_id in session_ids:
+            start = time.perf_counter()
+            query(session_id)
+            samples.append(time.perf_counter() - start)
+        timings[name] = statistics.median(samples)
+    return timings
+
+
+def main(args):
+    for sessions in args.sessions:
+        engine = sa.create_engine(f"sqlite:///{tempfile.mkdtemp()}/profile.db")
+        profile_db = ProfileDB(engine, lazy=True)
+        ids = build(engine, sessions, args.transactions)
+        session_ids = [f"session_{i}" for i in random.choices(ids, k=args.queries)]
+
+        drop_indexes(engine)
+        without = time_queries(profile_db, session_ids)
+        profile_db.migrate()
+        with_indexes = time_queries(profile_db, session_ids)
+
+        print(f"\n{sessions} sessions, median per query")
+        print(f"{'query':26} {'no indexes':>12} {'indexes':>12}")
+        for name in without:
+            print(
+                f"{name:26} {without[name] * 1000:10.3f}ms "
+                f"{with_indexes[name] * 1000:10.3f}ms"
+            )
+        profile_db.session.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sessions", type=int, nargs="+", default=[1000, 10000, 100000]
+    )
+    parser.add_argument("--transactions", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200)
+    main(parser.parse_args())
@@ -0,0 +1,134 @@
+"""Per-session populate time of `ProfileDB.populate_profile_db`.
+
+Populates `--sessions` new sessions with the vectorized generator, with
+the previous implementation (Python lists built from `numpy.arange`, one ORM
+object per row) for comparison, and in lazy mode, which only adds the account.
+
+    python benchmarks/bench_profile_populate.py --sessions 20
+    python benchmarks/bench_profile_populate.py --db-url sqlite:////tmp/profiles.db
+"""
+import argparse
+import functools
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from random import choice, randrange, sample
+
+import sqlalchemy as sa
+from numpy import arange
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from actions.profile_db import (  # noqa: E402
+    Account,
+    CreditCard,
+    ProfileDB,
+    Transaction,
+    utc,
+)
+
+
+class LegacyProfileDB(ProfileDB):
+    """Card and transaction generation as it was before vectorization"""
+
+    def add_credit_cards(self, session_id):
+        credit_card_names = ["iron bank", "credit all", "emblem", "justice bank"]
+        credit_cards = [
+            CreditCard(
+                credit_card_name=cardname,
+                minimum_balance=choice([20, 30, 40]),
+                current_balance=choice(
+                    [round(amount, 2) for amount in list(arange(20, 500, 0.01))]
+                ),
+                account_id=self.get_account_from_session_id(session_id).id,
+            )
+            for cardname in credit_card_names
+        ]
+        self.session.add_all(credit_cards)
+
+    def add_transactions(self, session_id):
+        account_number = self.get_account_number(
+            self.get_account_from_session_id(session_id)
+        )
+        vendors = (
+            self.session.query(Account)
+            .filter(Account.session_id.startswith("vendor_"))
+            .all()
+        )
+        depositors = (
+            self.session.query(Account)
+            .filter(Account.session_id.startswith("depositor_"))
+            .all()
+        )
+        start_date = utc.localize(datetime(2019, 1, 1))
+        end_date = utc.localize(datetime.now())
+        number_of_days = (end_date - start_date).days
+
+        for vendor in vendors:
+            amounts = sample(
+                [round(amount, 2) for amount in list(arange(5, 50, 0.01))],
+                number_of_days // 2,
+            )
+            self.session.add_all(
+                Transaction(
+                    from_account_number=account_number,
+                    to_account_number=self.get_account_number(vendor),
+                    amount=amount,
+                    timestamp=start_date + timedelta(days=randrange(number_of_days)),
+                )
+                for amount in amounts
+            )
+        for depositor in depositors:
+            if depositor.account_holder_name == "interest":
+                pool, count = arange(5, 20, 0.01), number_of_days // 30
+            else:
+                pool, count = arange(1000, 2000, 0.01), number_of_days // 14
+            amounts = sample([round(amount, 2) for amount in list(pool)], count)
+            self.session.add_all(
+                Transaction(
+                    from_account_number=self.get_account_number(depositor),
+                    to_account_number=account_number,
+                    amount=amount,
+                    timestamp=start_date + timedelta(days=randrange(number_of_days)),
+                )
+                for amount in amounts
+            )
+
+
+def bench(profile_db_class, db_url, sessions, label):
+    engine = sa.create_engine(db_url)
+    profile_db = profile_db_class(engine)
+    # general accounts are shared, keep them out of the per-session numbers
+    profile_db.populate_profile_db(f"{label}_warmup")
+    timings = []
+    for i in range(sessions):
+        start = time.perf_counter()
+        profile_db.populate_profile_db(f"{label}_{i}")
+        timings.append(time.perf_counter() - start)
+    profile_db.session.close()
+    engine.dispose()
+    return timings
+
+
+def main(args):
+    print(f"sessions: {args.sessions}")
+    for label, profile_db_class in (
+        ("legacy", LegacyProfileDB),
+        ("vectorized", ProfileDB),
+        ("lazy", functools.partial(ProfileDB, lazy=True)),
+    ):
+        timings = bench(profile_db_class, args.db_url, args.sessions, label)
+        print(
+            f"{label:11} mean {statistics.mean(timings) * 1000:8.1f}ms  "
+            f"median {statistics.median(timings) * 1000:8.1f}ms  "
+            f"max {max(timings) * 1000:8.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db-url", default="sqlite://")
+    parser.add_argument("--sessions", type=int, default=20)
+    main(parser.parse_args())
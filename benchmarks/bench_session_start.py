@@ -0,0 +1,105 @@
+"""Time of `ActionSessionStart` slot carry-over on long trackers.
+
+Builds trackers with `--events` synthetic events (user turns, bot turns and
+slot sets) and times `_slot_set_events_from_tracker` with the previous
+forward scan, which returned a `SlotSet` per historical slot event, and with
+the current one, reading `tracker.slots` or walking the events backwards.
+
+    python benchmarks/bench_session_start.py --events 10000 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# importing the actions connects the databases, keep them in memory
+os.environ.setdefault("PROFILE_DB_URL", "sqlite://")
+os.environ.setdefault("RASA_DB_URL", "sqlite://")
+os.environ.setdefault("FEEDBACK_OUTBOX_URL", "sqlite://")
+
+from rasa_sdk import Tracker  # noqa: E402
+from rasa_sdk.events import SlotSet  # noqa: E402
+
+from actions.actions import ActionSessionStart  # noqa: E402
+
+
+def legacy_slot_set_events(tracker):
+    return [
+        SlotSet(key=event.get("name"), value=event.get("value"))
+        for event in tracker.events
+        if event.get("event") == "slot"
+        and event.get("name") in ActionSessionStart.relevant_slots
+    ]
+
+
+def make_events(count):
+    slots = ActionSessionStart.relevant_slots + ["page", "feedback_type"]
+    events = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            events.append({"event": "user", "text": f"message {i}"})
+        elif kind == 1:
+            events.append({"event": "bot", "text": f"answer {i}"})
+        else:
+            events.append(
+                {"event": "slot", "name": random.choice(slots), "value": f"value {i}"}
+            )
+    return events
+
+
+def make_tracker(events, slots):
+    return Tracker(
+        sender_id="bench",
+        slots=slots,
+        latest_message={},
+        events=events,
+        paused=False,
+        followup_action=None,
+        active_loop={"name": None},
+        latest_action_name="action_listen",
+    )
+
+
+def median_time(carry_over, tracker, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        slot_sets = carry_over(tracker)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), len(slot_sets)
+
+
+def main(args):
+    random.seed(0)
+    print(f"{'events':>8} {'mode':>16} {'time':>10} {'slot sets':>10}")
+    for count in args.events:
+        events = make_events(count)
+        slots = {}
+        for event in events:
+            if event["event"] == "slot":
+                slots[event["name"]] = event["value"]
+        modes = {
+            "forward scan": (legacy_slot_set_events, make_tracker(events, {})),
+            "backward walk": (
+                ActionSessionStart._slot_set_events_from_tracker,
+                make_tracker(events, {}),
+            ),
+            "tracker.slots": (
+                ActionSessionStart._slot_set_events_from_tracker,
+                make_tracker(events, slots),
+            ),
+        }
+        for mode, (carry_over, tracker) in modes.items():
+            elapsed, slot_sets = median_time(carry_over, tracker, args.repeat)
+            print(f"{count:8} {mode:>16} {elapsed * 1000:8.3f}ms {slot_sets:10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,101 @@
+"""Peak memory of loading transactions with `.all()` against streaming them.
+
+Gives one session `--transactions` spend transactions per size, then reads
+them back with `search_transactions(...).all()`, with `iter_transactions` and
+with `aggregate_transactions`, tracing the peak Python memory of each.
+
+    python benchmarks/bench_transaction_streaming.py --transactions 10000 100000 300000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from actions.profile_db import (  # noqa: E402
+    ProfileDB,
+    Transaction,
+    create_profile_engine,
+)
+
+CHUNK_SIZE = 10000
+
+
+def add_transactions(profile_db, session_id, count):
+    account_number = profile_db.get_account_number(
+        profile_db.get_account_from_session_id(session_id)
+    )
+    vendor_number = "%0.12d" % 1
+    start_date = datetime(2019, 1, 1)
+    with profile_db.engine.begin() as connection:
+        for start in range(0, count, CHUNK_SIZE):
+            connection.execute(
+                Transaction.__table__.insert(),
+                [
+                    {
+                        "from_account_number": account_number,
+                        "to_account_number": vendor_number,
+                        "amount": 10.0,
+                        "timestamp": start_date + timedelta(minutes=i),
+                    }
+                    for i in range(start, min(start + CHUNK_SIZE, count))
+                ],
+            )
+
+
+def measure(read):
+    start = time.perf_counter()
+    rows = read()
+    elapsed = time.perf_counter() - start
+    # tracing slows reads down a lot, the peak is taken on a second read
+    tracemalloc.start()
+    read()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return rows, elapsed, peak
+
+
+def main(args):
+    print(f"{'transactions':>12} {'mode':>10} {'rows':>8} {'time':>9} {'peak memory':>12}")
+    for count in args.transactions:
+        engine = create_profile_engine(f"sqlite:///{tempfile.mkdtemp()}/profile.db")
+        profile_db = ProfileDB(engine, lazy=True)
+        session_id = f"session_{count}"
+        profile_db.populate_profile_db(session_id)
+        # no generated sample rows, only the ones added below
+        profile_db.populate_table(session_id, Transaction.__tablename__)
+        profile_db.session.query(Transaction).delete()
+        profile_db.session.commit()
+        add_transactions(profile_db, session_id, count)
+
+        modes = {
+            "all": lambda: len(profile_db.search_transactions(session_id).all()),
+            "stream": lambda: sum(
+                len(chunk) for chunk in profile_db.iter_transactions(session_id)
+            ),
+            "aggregate": lambda: sum(
+                group["count"]
+                for group in profile_db.aggregate_transactions(session_id)
+            ),
+        }
+        for mode, read in modes.items():
+            profile_db.remove_session()
+            rows, elapsed, peak = measure(read)
+            profile_db.remove_session()
+            print(
+                f"{count:12} {mode:>10} {rows:8} {elapsed:8.3f}s "
+                f"{peak / 2 ** 20:10.1f}MB"
+            )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--transactions", type=int, nargs="+", default=[10000, 100000, 300000]
+    )
+    main(parser.parse_args())
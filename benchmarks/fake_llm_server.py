@@ -0,0 +1,132 @@
+"""Minimal OpenAI compatible chat completion server for load testing.
+
+Answers every `POST .../chat/completions` with a fixed reply after a
+configurable delay, keeping HTTP connections alive between requests.
+Streaming requests get the reply as server-sent events, one word per chunk.
+
+    python benchmarks/fake_llm_server.py --port 8765 --delay 0.5
+    LLM_BASE_URL=http://127.0.0.1:8765/v1 rasa run actions
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Text
+
+
+def stream_chunk(content: Text) -> bytes:
+    chunk = {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": "fake",
+        "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}],
+    }
+    return f"data: {json.dumps(chunk)}\n\n".encode()
+
+
+def completion_body(content: Text) -> bytes:
+    return json.dumps(
+        {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "fake",
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }
+    ).encode()
+
+
+class FakeLLMServer:
+    def __init__(self, delay: float = 0.5, reply: Text = "out_of_scope"):
+        self.delay = delay
+        self.reply = reply
+        self.requests = 0
+        self.connections = 0
+        self.server = None
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                content_length = 0
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode().partition(":")
+                    if name.strip().lower() == "content-length":
+                        content_length = int(value.strip())
+                request = {}
+                if content_length:
+                    request = json.loads(await reader.readexactly(content_length))
+
+                self.requests += 1
+                await asyncio.sleep(self.delay)
+                if request.get("stream"):
+                    await self.write_stream(writer)
+                    continue
+
+                body = completion_body(self.reply)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: application/json\r\n"
+                    b"Connection: keep-alive\r\n"
+                    + f"Content-Length: {len(body)}\r\n\r\n".encode()
+                    + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def write_stream(self, writer: asyncio.StreamWriter):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\n"
+            b"Connection: keep-alive\r\n\r\n"
+        )
+        words = self.reply.split(" ")
+        events = [stream_chunk(w if i == 0 else f" {w}") for i, w in enumerate(words)]
+        for event in events + [b"data: [DONE]\n\n"]:
+            writer.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def start(self, host: Text = "127.0.0.1", port: int = 0) -> int:
+        """Start serving and return the bound port"""
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+async def main(args):
+    server = FakeLLMServer(delay=args.delay, reply=args.reply)
+    port = await server.start(args.host, args.port)
+    print(f"Fake LLM server listening on http://{args.host}:{port}/v1")
+    await server.server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.5)
+    parser.add_argument("--reply", default="out_of_scope")
+    asyncio.run(main(parser.parse_args()))
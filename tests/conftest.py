@@ -0,0 +1,22 @@
+import os
+import tempfile
+from unittest.mock import MagicMock
+
+import pytest
+
+# Keep the test run away from the bundled `profile.db` and any real results database
+os.environ.setdefault("PROFILE_DB_URL", "sqlite://")
+os.environ.setdefault("RASA_DB_URL", "sqlite://")
+os.environ.setdefault(
+    "FEEDBACK_OUTBOX_URL", f"sqlite:///{tempfile.mkdtemp()}/feedback_outbox.db"
+)
+
+
+@pytest.fixture
+def dispatcher():
+    return MagicMock()
+
+
+@pytest.fixture
+def domain():
+    return {}
@@ -26,7 +26,38 @@ async def test_run_action_session_start(dispatcher, domain):
     assert events == expected_events
 
 @pytest.mark.asyncio
-async def test_run_action_check_mongolian_greeting(dispatcher, domain):
+async def test_run_action_session_start_carries_over_latest_slot_values(dispatcher, domain):
+    events = [
+        {"event": "slot", "name": "feature_description", "value": "dark mode"},
+        {"event": "slot", "name": "bug_description", "value": "old crash"},
+        {"event": "reset_slots"},
+        {"event": "slot", "name": "zz_confirm_form", "value": "no"},
+        {"event": "slot", "name": "feature_description", "value": "export to csv"},
+        {"event": "slot", "name": "page", "value": "calculator"},
+        {"event": "slot", "name": "zz_confirm_form", "value": "yes"},
+    ]
+    tracker = Tracker(
+        sender_id="test_user",
+        slots={"AA_CONTINUE_FORM": "yes"},
+        latest_message={},
+        events=events,
+        paused=False,
+        followup_action=None,
+        active_loop={"name": None},
+        latest_action_name="action_listen",
+    )
+    action = ActionSessionStart()
+    events = await action.run(dispatcher, tracker, domain)
+    expected_events = [
+        SessionStarted(),
+        SlotSet("AA_CONTINUE_FORM", "yes"),
+        SlotSet("feature_description", "export to csv"),
+        SlotSet("zz_confirm_form", "yes"),
+        ActionExecuted("action_listen"),
+    ]
+    assert events == expected_events
+
+def test_run_action_check_mongolian_greeting(dispatcher, domain):
     tracker = Tracker(
         sender_id="test_user",
         slots={"mongolian_greeting_used": None},
@@ -38,7 +69,8 @@ async def test_run_action_check_mongolian_greeting(dispatcher, domain):
         latest_action_name="action_listen",
     )
     action = ActionCheckMongolianGreeting()
-    events = await action.run(dispatcher, tracker, domain)
+    # a synchronous action, the SDK only awaits the result of a coroutine run
+    events = action.run(dispatcher, tracker, domain)
     expected_events = [SlotSet("mongolian_greeting_used", True)]
     assert events == expected_events
 
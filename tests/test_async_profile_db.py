@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+from actions.async_profile_db import AsyncProfileDB, create_async_profile_engine
+from actions.profile_db import CREDIT_CARD_NAMES, ProfileDB, create_profile_engine
+
+
+@pytest_asyncio.fixture
+async def profile_db(tmp_path):
+    db = AsyncProfileDB(
+        create_async_profile_engine(f"sqlite:///{tmp_path}/profile.db"), lazy=True
+    )
+    yield db
+    await db.dispose()
+
+
+def test_engine_uses_asyncio_drivers():
+    engine = create_async_profile_engine("postgresql+psycopg2://user@localhost/profile")
+    assert engine.url.drivername == "postgresql+asyncpg"
+    assert create_async_profile_engine("sqlite://").url.drivername == "sqlite+aiosqlite"
+
+
+@pytest.mark.asyncio
+async def test_same_data_as_sync_profile_db(profile_db, tmp_path):
+    sync_db = ProfileDB(create_profile_engine(f"sqlite:///{tmp_path}/sync.db"), lazy=True)
+
+    assert sorted(await profile_db.list_credit_cards("session")) == sorted(
+        CREDIT_CARD_NAMES
+    )
+    assert await profile_db.list_known_recipients(
+        "session"
+    ) == sync_db.list_known_recipients("session")
+    assert await profile_db.get_account_balance("session") == pytest.approx(
+        sync_db.get_account_balance("session")
+    )
+    transactions = await profile_db.search_transactions("session", vendor="amazon")
+    assert [t.amount for t in transactions] == [
+        t.amount for t in sync_db.search_transactions("session", vendor="amazon")
+    ]
+    assert await profile_db.get_currency("session") == "$"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_turns_of_a_new_session(profile_db):
+    balances = await asyncio.gather(
+        *[profile_db.get_account_balance("session") for _ in range(20)]
+    )
+    assert len(set(balances)) == 1
+
+    await profile_db.pay_off_credit_card("session", "emblem", 10)
+    assert await profile_db.get_account_balance("session") == pytest.approx(
+        balances[0] - 10
+    )
+    assert await profile_db.check_balances() == {}
+
+
+@pytest.mark.asyncio
+async def test_new_sessions_do_not_wait_for_each_other(profile_db, monkeypatch):
+    await profile_db.create_tables()
+    started = []
+    release = asyncio.Event()
+    populate = profile_db._populate_session
+
+    async def slow_populate(session_id):
+        started.append(session_id)
+        if session_id == "slow":
+            await release.wait()
+        await populate(session_id)
+
+    monkeypatch.setattr(profile_db, "_populate_session", slow_populate)
+    slow = asyncio.ensure_future(profile_db.get_currency("slow"))
+    assert await profile_db.get_currency("fast") == "$"
+    assert not slow.done()
+
+    release.set()
+    assert await slow == "$"
+    assert sorted(started) == ["fast", "slow"]
+    assert profile_db._populating == {}
+
+
+@pytest.mark.asyncio
+async def test_iter_and_aggregate_transactions(profile_db):
+    chunks = [
+        chunk
+        async for chunk in profile_db.iter_transactions("session", chunk_size=100)
+    ]
+    per_vendor = await profile_db.aggregate_transactions("session")
+    assert sum(len(chunk) for chunk in chunks) == sum(g["count"] for g in per_vendor)
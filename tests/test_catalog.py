@@ -0,0 +1,59 @@
+import json
+import os
+
+from actions.catalog import Catalog, pages_catalog
+
+
+def write_catalog(path, entries, mtime):
+    path.write_text(json.dumps(entries))
+    os.utime(path, (mtime, mtime))
+
+
+def test_get_is_case_insensitive():
+    assert pages_catalog.get("CalcuLator")["url"] == "https://becs.e-nomads.com/calculator"
+    assert pages_catalog.get("no such page") is None
+    assert pages_catalog.get(None) is None
+
+
+def test_reload_if_changed(tmp_path):
+    path = tmp_path / "pages.json"
+    write_catalog(path, [{"keyword": "Home", "url": "/"}], mtime=1000)
+    catalog = Catalog(path, reload_interval=0)
+    assert catalog.get("home")["url"] == "/"
+
+    assert not catalog.reload_if_changed()
+
+    write_catalog(path, [{"keyword": "home", "url": "/home"}], mtime=2000)
+    assert catalog.reload_if_changed()
+    assert catalog.get("home")["url"] == "/home"
+
+
+def test_broken_file_keeps_previous_version(tmp_path):
+    path = tmp_path / "pages.json"
+    write_catalog(path, [{"keyword": "home", "url": "/"}], mtime=1000)
+    catalog = Catalog(path, reload_interval=0)
+
+    path.write_text("[{")
+    os.utime(path, (2000, 2000))
+    assert not catalog.reload_if_changed()
+    assert catalog.get("home")["url"] == "/"
+
+
+def test_find_tolerates_typos():
+    assert pages_catalog.find("calculater")["url"] == "https://becs.e-nomads.com/calculator"
+    assert pages_catalog.find("the dashboard page")["url"] == "https://becs.e-nomads.com/dashboard"
+    assert pages_catalog.find("xyzzy") is None
+
+
+def test_reload_swaps_in_a_new_snapshot(tmp_path):
+    path = tmp_path / "pages.json"
+    write_catalog(path, [{"keyword": "home", "url": "/"}], mtime=1000)
+    catalog = Catalog(path, reload_interval=0)
+    old = catalog.snapshot
+
+    write_catalog(path, [{"keyword": "about", "url": "/about"}], mtime=2000)
+    assert catalog.reload_if_changed()
+    # a search still holding the old snapshot finds its matches in its own index
+    assert [m for m, _ in old.fuzzy_index.search("hom")] == ["home"]
+    assert "home" in old.index
+    assert catalog.search("abot")[0][0]["url"] == "/about"
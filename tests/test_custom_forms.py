@@ -0,0 +1,179 @@
+import pytest
+from rasa_sdk.events import ActionExecutionRejected, LoopInterrupted, SlotSet
+from rasa_sdk.executor import Tracker
+
+from actions.actions import ValidateBugReportForm, ValidateRequestFeatureForm
+from actions.custom_forms import (
+    CF_SLOT,
+    MAX_VALIDATION_FAILURES,
+    RVF_SLOT,
+    SLOT_RULES,
+    ValidationSummary,
+    compile_slot_rule,
+    current_validation,
+)
+
+
+def make_tracker(slots, events=()):
+    return Tracker(
+        sender_id="test_user",
+        slots=slots,
+        latest_message={},
+        events=list(events),
+        paused=False,
+        followup_action=None,
+        active_loop={"name": "feature_request_form"},
+        latest_action_name="action_listen",
+    )
+
+
+def test_validation_summary_applies_events_in_one_pass():
+    events = [
+        SlotSet("feature_goal", "faster exports"),
+        SlotSet("feature_use_case", None),
+        SlotSet("requested_slot", None),
+    ]
+    summary = ValidationSummary(
+        events,
+        {"feature_challenges": "slow", "feature_use_case": "reports"},
+        ["feature_challenges", "feature_goal", "feature_use_case", "feature_criteria"],
+    )
+
+    assert summary.filled_slots == {"feature_goal"}
+    assert summary.requested_slot_changed and summary.requested_slot_cleared
+    assert summary.get_slot("feature_use_case") is None
+    assert summary.first_empty_slot == "feature_use_case"
+
+    summary.add([SlotSet("feature_use_case", "monthly reports")])
+    assert summary.first_empty_slot == "feature_criteria"
+    assert len(summary.events) == 4
+
+
+@pytest.mark.asyncio
+async def test_repeated_validation_failures_count_up_to_the_limit(dispatcher, domain):
+    action = ValidateRequestFeatureForm()
+    tracker = make_tracker({"requested_slot": "feature_goal", RVF_SLOT: 0})
+    events = [SlotSet("feature_challenges", "slow")]
+
+    for failures in range(1, MAX_VALIDATION_FAILURES):
+        rvf_events = await action.repeated_validation_failures(
+            dispatcher, tracker, domain, events
+        )
+        assert rvf_events == [SlotSet(RVF_SLOT, failures)]
+        tracker.slots[RVF_SLOT] = failures
+
+    rvf_events = await action.repeated_validation_failures(
+        dispatcher, tracker, domain, events
+    )
+    assert rvf_events == [SlotSet(CF_SLOT, None), SlotSet(RVF_SLOT, 0)]
+
+    events = [SlotSet("feature_goal", "faster exports")]
+    rvf_events = await action.repeated_validation_failures(
+        dispatcher, tracker, domain, events
+    )
+    assert rvf_events == [SlotSet(RVF_SLOT, 0)]
+
+
+@pytest.mark.asyncio
+async def test_repeated_validation_failures_interrupts_on_requested_slot(
+    dispatcher, domain
+):
+    action = ValidateRequestFeatureForm()
+    tracker = make_tracker({"requested_slot": "feature_goal"})
+    events = [SlotSet("requested_slot", "feature_criteria")]
+
+    rvf_events = await action.repeated_validation_failures(
+        dispatcher, tracker, domain, events
+    )
+    assert rvf_events == [
+        LoopInterrupted(is_interrupted=True),
+        ActionExecutionRejected(action_name=action.form_name()),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_feature_request_form_requests_first_empty_slot(dispatcher, domain):
+    slots = {slot: None for slot in ValidateRequestFeatureForm.slot_order}
+    slots.update(
+        {
+            CF_SLOT: "yes",
+            "bb_request_description": "faster exports",
+            "feature_challenges": "slow",
+        }
+    )
+    events = await ValidateRequestFeatureForm().run(
+        dispatcher, make_tracker(slots), domain
+    )
+
+    assert events[-1] == SlotSet("requested_slot", "feature_use_case")
+    assert current_validation.get().first_empty_slot == "feature_use_case"
+
+
+def test_slot_rules(dispatcher):
+    rule = compile_slot_rule(
+        "feature_goal", {"min_length": 3, "max_length": 10, "message": "Too short."}
+    )
+    assert rule("faster", dispatcher) == {"feature_goal": "faster"}
+    assert rule("no", dispatcher) == {"feature_goal": None}
+    assert rule(None, dispatcher) == {"feature_goal": None}
+    dispatcher.utter_message.assert_called_with(text="Too short.")
+
+    with pytest.raises(ValueError):
+        compile_slot_rule("feature_goal", {"min_lenght": 3})
+
+
+@pytest.mark.asyncio
+async def test_get_validation_events_applies_the_form_rules(dispatcher, monkeypatch):
+    domain = {
+        "forms": {
+            "bug_report_form": {"required_slots": [CF_SLOT, "zz_confirm_form"]}
+        }
+    }
+    action = ValidateBugReportForm()
+
+    def slot_events(**slots):
+        return [
+            {"event": "slot", "name": name, "value": value}
+            for name, value in slots.items()
+        ]
+
+    tracker = make_tracker({}, slot_events(zz_confirm_form="maybe"))
+    events = await action.get_validation_events(dispatcher, tracker, domain)
+    assert events == [SlotSet("zz_confirm_form", None)]
+
+    tracker = make_tracker({}, slot_events(zz_confirm_form="yes"))
+    events = await action.get_validation_events(dispatcher, tracker, domain)
+    assert events == [SlotSet("zz_confirm_form", "yes")]
+
+    # validate_AA_CONTINUE_FORM cancels the form
+    tracker = make_tracker({}, slot_events(AA_CONTINUE_FORM="no"))
+    events = await action.get_validation_events(dispatcher, tracker, domain)
+    assert SlotSet("requested_slot", None) in events
+    assert SlotSet("zz_confirm_form", "no") in events
+
+    # rules of other forms do not apply
+    monkeypatch.setattr(
+        ValidateBugReportForm,
+        "slot_rules",
+        {"feature_request_form": SLOT_RULES["feature_request_form"]},
+    )
+    tracker = make_tracker({}, slot_events(zz_confirm_form="maybe"))
+    events = await action.get_validation_events(dispatcher, tracker, domain)
+    assert events == [SlotSet("zz_confirm_form", "maybe")]
+
+
+@pytest.mark.asyncio
+async def test_run_summarizes_without_adding_events(dispatcher):
+    domain = {
+        "forms": {
+            "bug_report_form": {"required_slots": [CF_SLOT, "zz_confirm_form"]}
+        }
+    }
+    action = ValidateBugReportForm()
+    answer = [{"event": "slot", "name": "zz_confirm_form", "value": "maybe"}]
+
+    slots = {CF_SLOT: "yes", "requested_slot": "zz_confirm_form", RVF_SLOT: 1}
+    events = await action.run(dispatcher, make_tracker(slots, answer), domain)
+    # the rejected answer is reset by the form's rule, nothing else is emitted
+    assert events == [SlotSet("zz_confirm_form", None)]
+    assert current_validation.get().events is events
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+import sqlalchemy as sa
+
+from actions.feedback_db import FeedbackDB, chatbot_results, create_feedback_engine
+
+
+@pytest.fixture
+def feedback_db(tmp_path):
+    engine = create_feedback_engine(
+        f"sqlite:///{tmp_path}/results.db", pool_min_size=2, pool_max_size=4
+    )
+    db = FeedbackDB(engine)
+    db.create_tables()
+    yield db
+    db.dispose()
+
+
+def count_rows(db):
+    with db.engine.connect() as connection:
+        return connection.execute(
+            sa.select(sa.func.count()).select_from(chatbot_results)
+        ).scalar()
+
+
+def test_insert_result(feedback_db):
+    feedback_db.insert_result(
+        sender_id="test_user",
+        user_story="As a user I want a faster dashboard",
+        initial_description="{}",
+        chat_description="{}",
+    )
+    with feedback_db.engine.connect() as connection:
+        row = connection.execute(sa.select(chatbot_results)).first()
+    assert row.sender_id == "test_user"
+    assert row.createdAt == row.updatedAt
+
+
+@pytest.mark.asyncio
+async def test_async_inserts_reuse_pooled_connections(feedback_db):
+    await asyncio.gather(
+        *[
+            feedback_db.async_insert_result(
+                sender_id=f"user_{i}",
+                user_story="story",
+                initial_description="{}",
+                chat_description="{}",
+            )
+            for i in range(50)
+        ]
+    )
+    assert count_rows(feedback_db) == 50
+    status = feedback_db.pool_status()
+    assert status["checked_out"] == 0
+    assert status["checked_in"] <= 4
+
+
+def test_insert_results_skips_delivered_keys(feedback_db):
+    rows = [
+        {"sender_id": f"user_{i}", "idempotency_key": f"key_{i}"} for i in range(250)
+    ]
+    assert feedback_db.insert_results(rows) == 250
+    # a retried batch, partly delivered already and with a duplicate key
+    retry = rows[200:] + [{"sender_id": "new", "idempotency_key": "key_new"}] * 2
+    assert feedback_db.insert_results(retry) == 1
+    assert count_rows(feedback_db) == 251
@@ -0,0 +1,24 @@
+from actions.fuzzy_index import TrigramIndex, trigrams
+
+
+def test_trigrams_are_padded_and_case_insensitive():
+    assert trigrams("Ab") == {"  a", " ab", "ab "}
+
+
+def test_search_ranks_closest_keywords_first():
+    index = TrigramIndex(["calculator", "certificates", "dashboard", "password"])
+    matches = index.search("calcluator")
+    assert matches[0][0] == "calculator"
+    assert all(a[1] >= b[1] for a, b in zip(matches, matches[1:]))
+
+
+def test_cutoff():
+    index = TrigramIndex(["dashboard", "password"])
+    assert index.best_match("pasword", cutoff=0.5)[0] == "password"
+    assert index.best_match("zzz", cutoff=0.5) is None
+
+
+def test_large_catalog():
+    index = TrigramIndex([f"project {i} settings" for i in range(20000)] + ["calculator"])
+    assert len(index) == 20001
+    assert index.best_match("calculatr", cutoff=0.5)[0] == "calculator"
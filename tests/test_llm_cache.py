@@ -0,0 +1,123 @@
+import threading
+
+import pytest
+import sqlalchemy as sa
+
+from rasa_sdk.executor import Tracker
+from rasa_sdk.events import ActionExecuted, UserUttered
+
+from actions import llm_actions
+from actions.llm_actions import ActionFallbackToLLM
+from actions.llm_cache import FallbackCache, normalize_text
+from actions.ttl_cache import TTLCache
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expires_entries():
+    timer = FakeTimer()
+    cache = TTLCache(maxsize=10, ttl=5, timer=timer)
+    cache.set("hi", "greet")
+    timer.now = 4
+    assert cache.get("hi") == "greet"
+    timer.now = 6
+    assert cache.get("hi") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_normalize_text():
+    assert normalize_text("  Сайн   байна уу?!") == "сайн байна уу"
+    assert normalize_text("HELLO, there") == normalize_text("hello there")
+
+
+def test_fallback_cache_shared_backend(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path}/cache.db")
+    FallbackCache(db_engine=engine).set("Bonjour!", "non_english")
+
+    # a fresh process only sees the shared backend
+    cache = FallbackCache(db_engine=engine)
+    assert cache.get("bonjour") == "non_english"
+    assert cache.get("guten tag") is None
+    assert cache.hit_ratio == 0.5
+
+
+@pytest.mark.asyncio
+async def test_fallback_cache_shared_backend_off_the_event_loop(tmp_path, monkeypatch):
+    engine = sa.create_engine(f"sqlite:///{tmp_path}/cache.db")
+    cache = FallbackCache(db_engine=engine)
+    loop_thread = threading.get_ident()
+    threads = []
+    set_shared = cache._set_shared
+
+    def record_set_shared(key, intent):
+        threads.append(threading.get_ident())
+        set_shared(key, intent)
+
+    monkeypatch.setattr(cache, "_set_shared", record_set_shared)
+    cache.set_in_background("Bonjour!", "non_english")
+    await cache.drain()
+    assert threads and loop_thread not in threads
+
+    # a fresh process only sees the shared backend
+    cache = FallbackCache(db_engine=engine)
+    assert await cache.aget("bonjour") == "non_english"
+    assert await cache.aget("guten tag") is None
+    assert cache.hit_ratio == 0.5
+
+
+@pytest.mark.asyncio
+async def test_fallback_to_llm_uses_cache(dispatcher, domain, monkeypatch):
+    calls = []
+
+    async def classify(messages, labels, **params):
+        calls.append(messages)
+        return "non_english"
+
+    monkeypatch.setattr(llm_actions, "fallback_cache", FallbackCache())
+    monkeypatch.setattr(llm_actions.llm_gateway, "classify", classify)
+
+    def tracker(text):
+        return Tracker(
+            sender_id="test_user",
+            slots={},
+            latest_message={"text": text},
+            events=[],
+            paused=False,
+            followup_action=None,
+            active_loop={"name": None},
+            latest_action_name="action_listen",
+        )
+
+    action = ActionFallbackToLLM()
+    first = await action.run(dispatcher, tracker("Hola amigo"), domain)
+    second = await action.run(dispatcher, tracker("hola, amigo!"), domain)
+
+    expected_events = [
+        ActionExecuted("action_listen"),
+        UserUttered(
+            text="non_english",
+            parse_data={"intent": {"name": "non_english", "confidence": 1.0}},
+        ),
+    ]
+    assert first == expected_events
+    assert second == expected_events
+    assert len(calls) == 1
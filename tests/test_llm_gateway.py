@@ -0,0 +1,174 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from actions.llm_gateway import LLMGateway, match_label, sentence_ends
+
+
+class FakeCompletions:
+    def __init__(self, delay=0.01, content="out_of_scope"):
+        self.delay = delay
+        self.content = content
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = []
+
+    async def create(self, **params):
+        self.calls.append(params)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        message = SimpleNamespace(content=self.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class FakeStream:
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.read = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.read == len(self.pieces):
+            raise StopAsyncIteration
+        delta = SimpleNamespace(content=self.pieces[self.read])
+        self.read += 1
+        return SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeStreamingCompletions:
+    def __init__(self, pieces):
+        self.stream = FakeStream(pieces)
+
+    async def create(self, stream=False, **params):
+        assert stream
+        return self.stream
+
+
+def fake_streaming_client(pieces):
+    completions = FakeStreamingCompletions(pieces)
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions)), completions.stream
+
+
+def fake_client(**kwargs):
+    completions = FakeCompletions(**kwargs)
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions)), completions
+
+
+@pytest.mark.asyncio
+async def test_complete_returns_first_choice_text():
+    client, completions = fake_client(content="find_page")
+    gateway = LLMGateway(client=client, model="test-model")
+    messages = [{"role": "user", "content": "where is the calculator"}]
+
+    assert await gateway.complete(messages, max_tokens=5) == "find_page"
+    assert completions.calls == [
+        {"model": "test-model", "messages": messages, "max_tokens": 5}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_limited():
+    client, completions = fake_client(delay=0.01)
+    gateway = LLMGateway(client=client, max_concurrency=5)
+
+    await asyncio.gather(*[gateway.complete([]) for _ in range(100)])
+
+    assert len(completions.calls) == 100
+    assert completions.max_in_flight == 5
+
+
+@pytest.mark.asyncio
+async def test_complete_times_out():
+    client, _ = fake_client(delay=1)
+    gateway = LLMGateway(client=client)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await gateway.complete([], timeout=0.01)
+
+
+LABELS = ["find_page", "provide_feature_request", "provide_bug_report", "help", "inform"]
+
+
+def test_match_label():
+    assert match_label("prov", LABELS) is None
+    assert match_label("provide_b", LABELS) == "provide_bug_report"
+    assert match_label(" Help", LABELS) == "help"
+    assert match_label("fin", LABELS) is None
+    assert match_label("info", LABELS) == "inform"
+    # at the end of the stream only a whole label counts
+    assert match_label("info", LABELS, final=True) is None
+    assert match_label("inform", LABELS, final=True) == "inform"
+    assert match_label("help\nBecause", LABELS, final=True) == "help"
+    # a word that has ended must be a label
+    assert match_label("info ", LABELS) is None
+    assert match_label("information", LABELS) is None
+
+
+@pytest.mark.asyncio
+async def test_classify_stops_reading_once_label_is_unambiguous():
+    client, stream = fake_streaming_client(["provide", "_bug", "_report", "\n", "Because"])
+    gateway = LLMGateway(client=client)
+
+    assert await gateway.classify([], LABELS) == "provide_bug_report"
+    assert stream.read == 3
+    assert stream.closed
+
+
+@pytest.mark.asyncio
+async def test_classify_requires_whole_label_at_end_of_stream():
+    client, stream = fake_streaming_client(["in", "fo"])
+    gateway = LLMGateway(client=client)
+    assert await gateway.classify([], LABELS) == "info"
+
+    client, stream = fake_streaming_client(["info", "rmation"])
+    gateway = LLMGateway(client=client)
+    assert await gateway.classify([], LABELS) == "information"
+
+    client, stream = fake_streaming_client(["info", "rm"])
+    gateway = LLMGateway(client=client)
+    assert await gateway.classify([], LABELS) == "inform"
+
+
+@pytest.mark.asyncio
+async def test_classify_returns_invalid_answer():
+    client, stream = fake_streaming_client(["Intent", ": help"])
+    gateway = LLMGateway(client=client)
+
+    assert await gateway.classify([], LABELS) == "intent"
+    assert stream.closed
+
+
+@pytest.mark.asyncio
+async def test_complete_sentences_stops_after_limit():
+    client, stream = fake_streaming_client(["As a user I want X.", " So that Y.", " Extra text."])
+    gateway = LLMGateway(client=client)
+
+    assert await gateway.complete_sentences([], max_sentences=2) == "As a user I want X. So that Y."
+    # the second sentence only ends once the whitespace after it arrived
+    assert stream.read == 3
+    assert stream.closed
+
+
+@pytest.mark.asyncio
+async def test_complete_sentences_keeps_the_tail():
+    client, stream = fake_streaming_client(["As a user I want X", ", e.g. exports."])
+    gateway = LLMGateway(client=client)
+
+    assert await gateway.complete_sentences([], max_sentences=1) == "As a user I want X, e.g. exports."
+
+
+def test_sentence_ends():
+    assert sentence_ends("Mr. Smith wants X, e.g. PDFs. So that Y") == [len("Mr. Smith wants X, e.g. PDFs.")]
+    assert sentence_ends("Version 3.5 is out!") == []
+    assert sentence_ends("Done?! Yes. ") == [len("Done?!"), len("Done?! Yes.")]
@@ -0,0 +1,152 @@
+import time
+
+import sqlalchemy as sa
+
+import pytest
+
+from actions.feedback_db import FeedbackDB, chatbot_results, create_feedback_engine
+from actions.outbox import Outbox, OutboxFlusher, create_outbox_engine, outbox_table
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return Outbox(create_outbox_engine(f"sqlite:///{tmp_path}/outbox.db"))
+
+
+@pytest.fixture
+def feedback_db(tmp_path):
+    db = FeedbackDB(create_feedback_engine(f"sqlite:///{tmp_path}/results.db"))
+    db.create_tables()
+    yield db
+    db.dispose()
+
+
+def result_rows(db):
+    with db.engine.connect() as connection:
+        return connection.execute(sa.select(chatbot_results)).fetchall()
+
+
+def row(sender_id):
+    return {
+        "sender_id": sender_id,
+        "user_story": None,
+        "initial_description": '{"feedback_type": "bug_report"}',
+        "chat_description": None,
+    }
+
+
+def test_flush_delivers_and_empties_outbox(outbox, feedback_db):
+    for i in range(5):
+        outbox.append(row(f"user_{i}"))
+    assert len(outbox) == 5
+
+    flusher = OutboxFlusher(outbox, feedback_db, batch_size=3)
+    assert flusher.flush_once() == 3
+    assert flusher.flush_once() == 2
+    assert len(outbox) == 0
+    assert flusher.stats()["flushes"] == 2
+    assert flusher.stats()["last_flush_size"] == 2
+    assert [r.sender_id for r in result_rows(feedback_db)] == [f"user_{i}" for i in range(5)]
+
+
+def test_failed_delivery_is_retried_later(outbox, tmp_path):
+    # the results table does not exist yet
+    feedback_db = FeedbackDB(create_feedback_engine(f"sqlite:///{tmp_path}/down.db"))
+    outbox.append(row("user"))
+
+    flusher = OutboxFlusher(outbox, feedback_db)
+    assert flusher.flush_once() == 0
+    assert flusher.failed == 1
+    assert len(outbox) == 1
+    # backing off, not due yet
+    assert outbox.pending(10) == []
+
+
+def test_schema_errors_are_dead_lettered(outbox, tmp_path):
+    # "no such table" is an OperationalError too, but retrying does not help
+    feedback_db = FeedbackDB(create_feedback_engine(f"sqlite:///{tmp_path}/down.db"))
+    outbox.append(row("user"))
+
+    flusher = OutboxFlusher(outbox, feedback_db, max_attempts=1)
+    assert flusher.flush_once() == 0
+    assert len(outbox) == 0
+    assert flusher.stats()["dead_lettered"] == 1
+    (_, _, error), = outbox.dead_letters()
+    assert "no such table" in error
+
+
+def test_unreachable_database_is_never_dead_lettered(outbox, tmp_path):
+    feedback_db = FeedbackDB(
+        create_feedback_engine(f"sqlite:///{tmp_path}/missing/results.db")
+    )
+    outbox.append(row("user"))
+
+    flusher = OutboxFlusher(outbox, feedback_db, max_attempts=1)
+    assert flusher.flush_once() == 0
+    assert flusher.failed == 1
+    assert len(outbox) == 1
+    assert flusher.stats()["dead_lettered"] == 0
+
+
+def test_redelivery_is_idempotent(outbox, feedback_db):
+    key = outbox.append(row("user"))
+    (_, _, payload), = outbox.pending(10)
+
+    assert feedback_db.insert_result(idempotency_key=key, **payload)
+    # e.g. the flusher crashed before removing the row from the outbox
+    assert OutboxFlusher(outbox, feedback_db).flush_once() == 1
+    assert len(result_rows(feedback_db)) == 1
+    assert len(outbox) == 0
+
+
+def test_submissions_close_together_are_flushed_as_one_batch(outbox, feedback_db):
+    flusher = OutboxFlusher(outbox, feedback_db, interval=60, linger=0.2)
+    flusher.start()
+    try:
+        # let the startup flush of leftover rows pass
+        time.sleep(0.05)
+        for i in range(10):
+            outbox.append(row(f"user_{i}"))
+            flusher.notify()
+        deadline = time.time() + 5
+        while flusher.delivered < 10 and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        flusher.stop()
+
+    assert flusher.delivered == 10
+    assert flusher.flushes == 1
+    assert len(result_rows(feedback_db)) == 10
+
+
+def test_bad_row_does_not_hold_up_the_batch(outbox, feedback_db):
+    outbox.append(row("user_1"))
+    # e.g. queued by an older version of the actions
+    bad_row = row("user_2")
+    del bad_row["sender_id"]
+    outbox.append(bad_row)
+    outbox.append(row("user_3"))
+
+    flusher = OutboxFlusher(outbox, feedback_db, max_attempts=2)
+    # the batch is rejected, its rows are delivered one by one
+    assert flusher.flush_once() == 2
+    assert [r.sender_id for r in result_rows(feedback_db)] == ["user_1", "user_3"]
+    assert len(outbox) == 1
+    assert flusher.failed == 1
+
+    with outbox.engine.begin() as connection:
+        connection.execute(outbox_table.update().values(next_attempt=0))
+    assert flusher.flush_once() == 0
+    # given up on after the second attempt
+    assert len(outbox) == 0
+    assert flusher.stats()["dead_lettered"] == 1
+    (key, payload, error), = outbox.dead_letters()
+    assert "sender_id" not in payload
+    assert "sender_id" in error
+
+
+def test_in_memory_outbox_is_shared_between_connections(feedback_db):
+    outbox = Outbox(create_outbox_engine("sqlite://"))
+    outbox.append(row("user"))
+    assert len(outbox) == 1
+    assert OutboxFlusher(outbox, feedback_db).flush_once() == 1
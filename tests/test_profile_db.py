@@ -0,0 +1,432 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+import sqlalchemy as sa
+
+from actions.prewarm_profiles import prewarm
+from actions.profile_db import (
+    CREDIT_CARD_NAMES,
+    GENERAL_ACCOUNTS,
+    PROFILE_BALANCE_CACHE_TTL,
+    Account,
+    AccountBalance,
+    CreditCard,
+    PopulatedTable,
+    ProfileDB,
+    RecipientRelationship,
+    Transaction,
+    create_profile_engine,
+    random_amounts,
+)
+from actions.ttl_cache import TTLCache
+
+
+@pytest.fixture
+def profile_db():
+    return ProfileDB(sa.create_engine("sqlite://"), seed=42)
+
+
+def test_random_amounts_are_distinct_cents_in_range():
+    amounts = random_amounts(np.random.default_rng(0), 5, 50, 1000)
+    assert len(set(amounts.tolist())) == 1000
+    assert amounts.min() >= 5 and amounts.max() < 50
+    assert all(round(amount, 2) == amount for amount in amounts.tolist())
+
+
+def test_populate_profile_db(profile_db):
+    profile_db.populate_profile_db("session")
+
+    account = profile_db.get_account_from_session_id("session")
+    account_number = profile_db.get_account_number(account)
+    assert sorted(profile_db.list_credit_cards("session")) == sorted(CREDIT_CARD_NAMES)
+    recipients = profile_db.list_known_recipients("session")
+    assert 3 <= len(recipients) < len(GENERAL_ACCOUNTS["recipient"])
+    assert set(recipients) <= set(GENERAL_ACCOUNTS["recipient"])
+
+    spent = profile_db.search_transactions("session").all()
+    earned = profile_db.search_transactions("session", deposit=True).all()
+    assert spent and earned
+    assert {t.from_account_number for t in spent} == {account_number}
+    assert all(5 <= t.amount < 50 for t in spent)
+    assert profile_db.get_account_balance("session") == pytest.approx(
+        sum(t.amount for t in earned) - sum(t.amount for t in spent)
+    )
+    vendor_spend = profile_db.search_transactions("session", vendor="amazon").count()
+    assert vendor_spend == len(spent) // len(GENERAL_ACCOUNTS["vendor"])
+
+
+def amounts(db, session_id="session"):
+    db.populate_profile_db(session_id)
+    return [t.amount for t in db.search_transactions(session_id).order_by(Transaction.id)]
+
+
+def count(db, model):
+    return db.session.query(model).count()
+
+
+def test_populate_is_reproducible_with_a_seed():
+    first = amounts(ProfileDB(sa.create_engine("sqlite://"), seed=7))
+    assert first == amounts(ProfileDB(sa.create_engine("sqlite://"), seed=7))
+    assert first != amounts(ProfileDB(sa.create_engine("sqlite://"), seed=8))
+
+
+def test_lazy_mode_only_creates_the_account():
+    lazy_db = ProfileDB(sa.create_engine("sqlite://"), lazy=True)
+    lazy_db.populate_profile_db("session")
+    assert lazy_db.check_session_id_exists("session")
+    for model in (Transaction, CreditCard, RecipientRelationship, PopulatedTable):
+        assert count(lazy_db, model) == 0
+
+    lazy_db.list_credit_cards("session")
+    assert count(lazy_db, CreditCard) == len(CREDIT_CARD_NAMES)
+    assert count(lazy_db, Transaction) == 0
+    # populated only once
+    lazy_db.get_credit_card("session", "emblem")
+    assert count(lazy_db, CreditCard) == len(CREDIT_CARD_NAMES)
+
+
+def test_lazy_data_matches_eager_data():
+    eager_db = ProfileDB(sa.create_engine("sqlite://"))
+    lazy_db = ProfileDB(sa.create_engine("sqlite://"), lazy=True)
+    # tables are materialized in a different order than the eager populate
+    lazy_db.populate_profile_db("session")
+    lazy_db.list_credit_cards("session")
+    assert amounts(lazy_db) == amounts(eager_db)
+    assert lazy_db.list_known_recipients("session") == eager_db.list_known_recipients(
+        "session"
+    )
+
+
+def test_accounts_populated_before_tracking_are_not_populated_again(profile_db):
+    profile_db.populate_profile_db("session")
+    # a database from before the tables were tracked
+    PopulatedTable.__table__.drop(profile_db.engine)
+    transactions = count(profile_db, Transaction)
+
+    lazy_db = ProfileDB(profile_db.engine, lazy=True)
+    lazy_db.get_account_balance("session")
+    assert count(lazy_db, Transaction) == transactions
+    account = lazy_db.get_account_from_session_id("session")
+    claimed = lazy_db.session.query(PopulatedTable).filter(
+        PopulatedTable.account_id == account.id
+    )
+    assert claimed.count() == 3
+
+
+def test_lazy_transfer_before_population_does_not_skip_it():
+    lazy_db = ProfileDB(sa.create_engine("sqlite://"), lazy=True)
+    lazy_db.populate_profile_db("session")
+    account_number = lazy_db.get_account_number(
+        lazy_db.get_account_from_session_id("session")
+    )
+    lazy_db.transact("%0.12d" % 0, account_number, 25)
+
+    assert len(lazy_db.search_transactions("session", deposit=True).all()) > 1
+    assert sorted(lazy_db.list_credit_cards("session")) == sorted(CREDIT_CARD_NAMES)
+
+
+def query_plan(db, sql):
+    with db.engine.connect() as connection:
+        return " ".join(row[-1] for row in connection.execute(f"EXPLAIN QUERY PLAN {sql}"))
+
+
+def test_lookups_use_indexes(profile_db):
+    plan = query_plan(profile_db, "SELECT id FROM account WHERE session_id = 'x'")
+    assert "INDEX ix_account_session_id" in plan
+    plan = query_plan(
+        profile_db,
+        "SELECT amount FROM transactions WHERE to_account_number = 'x' "
+        "AND timestamp >= '2020-01-01'",
+    )
+    assert "INDEX ix_transactions_to_timestamp" in plan
+
+
+def test_migrate_adds_missing_indexes(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path}/profile.db")
+    ProfileDB(engine)
+    with engine.begin() as connection:
+        connection.execute("DROP INDEX ix_account_session_id")
+        connection.execute("DROP INDEX ix_transactions_from_timestamp")
+
+    ProfileDB(engine)
+    index_names = {
+        index["name"]
+        for table_name in ("account", "transactions")
+        for index in sa.inspect(engine).get_indexes(table_name)
+    }
+    assert {"ix_account_session_id", "ix_transactions_from_timestamp"} <= index_names
+
+
+def test_balance_ledger_follows_transfers(profile_db):
+    profile_db.populate_profile_db("session")
+    balance = profile_db.get_account_balance("session")
+    assert balance == pytest.approx(
+        profile_db.compute_balance(
+            profile_db.get_account_number(profile_db.get_account_from_session_id("session"))
+        )
+    )
+
+    card_balance = profile_db.get_credit_card_balance("session", "emblem")
+    profile_db.pay_off_credit_card("session", "emblem", 10)
+    assert profile_db.get_account_balance("session") == pytest.approx(balance - 10)
+    assert profile_db.get_credit_card_balance("session", "emblem") == pytest.approx(
+        card_balance - 10
+    )
+    assert profile_db.check_balances() == {}
+
+
+def test_check_balances_repairs_drift(profile_db):
+    profile_db.populate_profile_db("session")
+    account_number = profile_db.get_account_number(
+        profile_db.get_account_from_session_id("session")
+    )
+    balance = profile_db.get_account_balance("session")
+    # a transfer that bypassed `transact`
+    profile_db.session.add(
+        Transaction(from_account_number=account_number, to_account_number="0", amount=5)
+    )
+    profile_db.session.commit()
+
+    mismatches = profile_db.check_balances(repair=True)
+    assert mismatches[account_number]["ledger"] == pytest.approx(balance)
+    assert profile_db.get_account_balance("session") == pytest.approx(balance - 5)
+    assert profile_db.check_balances() == {}
+
+
+def test_rebuild_balance_keeps_a_concurrently_created_entry(tmp_path):
+    engine = create_profile_engine(f"sqlite:///{tmp_path}/profile.db")
+    profile_db = ProfileDB(engine, lazy=True)
+    profile_db.populate_profile_db("session")
+    account_number = profile_db.get_account_number(
+        profile_db.get_account_from_session_id("session")
+    )
+    # created by another conversation after this one found no entry
+    with engine.begin() as connection:
+        connection.execute(
+            AccountBalance.__table__.insert().values(
+                account_number=account_number, balance=1.5
+            )
+        )
+
+    assert profile_db.rebuild_balance(account_number).balance == 1.5
+    profile_db.session.commit()
+
+
+def test_concurrent_conversations_keep_their_data_apart(tmp_path):
+    profile_db = ProfileDB(
+        create_profile_engine(f"sqlite:///{tmp_path}/profile.db"), lazy=True
+    )
+    shared_account = "%0.12d" % 0
+    with profile_db.session.begin():
+        profile_db.session.add(AccountBalance(account_number=shared_account, balance=0))
+    transfers = 5
+
+    def conversation(i):
+        session_id = f"session_{i}"
+        profile_db.populate_profile_db(session_id)
+        assert len(profile_db.list_credit_cards(session_id)) == len(CREDIT_CARD_NAMES)
+        profile_db.list_known_recipients(session_id)
+        account_number = profile_db.get_account_number(
+            profile_db.get_account_from_session_id(session_id)
+        )
+        for _ in range(transfers):
+            profile_db.transact(account_number, shared_account, 1.5)
+        profile_db.remove_session()
+
+    conversations = 200
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        list(executor.map(conversation, range(conversations)))
+
+    session = profile_db.session
+    accounts = session.query(Account).filter(Account.session_id.startswith("session_"))
+    assert accounts.count() == conversations
+    assert count(profile_db, CreditCard) == conversations * len(CREDIT_CARD_NAMES)
+    assert count(profile_db, Transaction) == conversations * transfers
+    assert session.get(AccountBalance, shared_account).balance == pytest.approx(
+        conversations * transfers * 1.5
+    )
+    assert profile_db.check_balances() == {}
+
+
+@pytest.mark.asyncio
+async def test_tasks_get_their_own_session(profile_db):
+    async def task_session():
+        return profile_db.session
+
+    first, second = await asyncio.gather(task_session(), task_session())
+    assert first is not second
+    # task sessions are dropped once their task is done
+    await asyncio.sleep(0)
+    assert len(profile_db.Session.registry.registry) <= 1
+
+
+def test_iter_transactions_streams_keyset_pages(profile_db):
+    profile_db.populate_profile_db("session")
+    expected = (
+        profile_db.search_transactions("session", deposit=True)
+        .order_by(Transaction.timestamp, Transaction.id)
+        .all()
+    )
+
+    chunks = list(profile_db.iter_transactions("session", chunk_size=50, deposit=True))
+    assert all(len(chunk) == 50 for chunk in chunks[:-1])
+    assert 0 < len(chunks[-1]) <= 50
+    rows = [row for chunk in chunks for row in chunk]
+    assert [row.id for row in rows] == [t.id for t in expected]
+    assert [row.amount for row in rows] == [t.amount for t in expected]
+
+
+def test_aggregate_transactions(profile_db):
+    profile_db.populate_profile_db("session")
+    spent = profile_db.search_transactions("session").all()
+
+    per_vendor = profile_db.aggregate_transactions("session")
+    assert {group["vendor"] for group in per_vendor} == set(GENERAL_ACCOUNTS["vendor"])
+    assert sum(group["count"] for group in per_vendor) == len(spent)
+    assert sum(group["total"] for group in per_vendor) == pytest.approx(
+        sum(t.amount for t in spent)
+    )
+
+    per_month = profile_db.aggregate_transactions("session", group_by="month")
+    january = [t for t in spent if t.timestamp.strftime("%Y-%m") == "2019-01"]
+    assert per_month[0] == {
+        "month": "2019-01",
+        "total": pytest.approx(sum(t.amount for t in january)),
+        "count": len(january),
+    }
+
+    with pytest.raises(ValueError):
+        profile_db.aggregate_transactions("session", group_by="week")
+
+
+def count_queries(engine):
+    statements = []
+    sa.event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+    return statements
+
+
+def test_lookups_are_served_from_the_cache(profile_db):
+    profile_db.populate_profile_db("session")
+    profile_db.list_credit_cards("session")
+    profile_db.list_known_recipients("session")
+    profile_db.list_vendors()
+    profile_db.get_account_balance("session")
+
+    statements = count_queries(profile_db.engine)
+    hits = profile_db.cache_stats()["hits"]
+    assert profile_db.check_session_id_exists("session")
+    assert sorted(profile_db.list_credit_cards("session")) == sorted(CREDIT_CARD_NAMES)
+    profile_db.list_known_recipients("session")
+    assert profile_db.list_vendors() == GENERAL_ACCOUNTS["vendor"]
+    profile_db.get_account_balance("session")
+
+    assert statements == []
+    assert profile_db.cache_stats()["hits"] > hits
+    assert profile_db.cache_stats()["misses"] > 0
+
+
+def test_transfers_invalidate_cached_balances(profile_db):
+    balance = profile_db.get_account_balance("session")
+    profile_db.pay_off_credit_card("session", "emblem", 10)
+    assert profile_db.get_account_balance("session") == pytest.approx(balance - 10)
+
+    account_number = profile_db.get_account_number(
+        profile_db.get_account_from_session_id("session")
+    )
+    profile_db.transact("%0.12d" % 0, account_number, 25)
+    assert profile_db.get_account_balance("session") == pytest.approx(balance + 15)
+
+
+def test_balances_changed_by_another_process_expire(profile_db):
+    balance = profile_db.get_account_balance("session")
+    account_number = profile_db.get_account_number(
+        profile_db.get_account_from_session_id("session")
+    )
+    # e.g. another action server process sharing the database
+    other_db = ProfileDB(profile_db.engine)
+    other_db.transact("%0.12d" % 0, account_number, 25)
+
+    assert profile_db.get_account_balance("session") == pytest.approx(balance)
+    now = profile_db.cache.timer()
+    profile_db.cache.timer = lambda: now + PROFILE_BALANCE_CACHE_TTL + 1
+    assert profile_db.get_account_balance("session") == pytest.approx(balance + 25)
+
+
+def test_populated_tables_are_remembered_within_bounds():
+    lazy_db = ProfileDB(sa.create_engine("sqlite://"), lazy=True)
+    lazy_db._populated = TTLCache(maxsize=2, ttl=None)
+    for session_id in ("a", "b", "c"):
+        lazy_db.populate_profile_db(session_id)
+        lazy_db.list_credit_cards(session_id)
+        lazy_db.list_known_recipients(session_id)
+    assert len(lazy_db._populated) == 2
+
+    # forgotten claims are looked up again, the rows are not generated twice
+    lazy_db.cache.clear()
+    lazy_db.list_credit_cards("a")
+    assert count(lazy_db, CreditCard) == 3 * len(CREDIT_CARD_NAMES)
+
+
+def test_general_accounts_are_bootstrapped_once(tmp_path):
+    engine = create_profile_engine(f"sqlite:///{tmp_path}/profile.db")
+    first = ProfileDB(engine)
+    second = ProfileDB(engine)
+
+    assert second.general_accounts == first.general_accounts
+    for kind, names in GENERAL_ACCOUNTS.items():
+        accounts = first.general_accounts[kind]
+        assert [account.account_holder_name for account in accounts] == names
+    vendors = first.session.query(Account).filter(
+        Account.session_id.startswith("vendor_")
+    )
+    assert sorted(account.id for account in vendors) == [
+        account.id for account in first.general_accounts["vendor"]
+    ]
+
+
+def test_general_accounts_are_looked_up_in_memory(profile_db):
+    profile_db.populate_profile_db("session")
+    statements = count_queries(profile_db.engine)
+
+    assert profile_db.list_vendors() == GENERAL_ACCOUNTS["vendor"]
+    assert profile_db.search_transactions("session", vendor="Starbucks").count() > 0
+    assert profile_db.search_transactions("session", vendor="nowhere").count() == 0
+    profile_db.populate_profile_db("another session")
+
+    assert not [statement for statement in statements if "LIKE" in statement]
+
+
+def test_populate_profile_dbs_matches_populate_profile_db():
+    bulk = ProfileDB(sa.create_engine("sqlite://"), seed=3)
+    single = ProfileDB(sa.create_engine("sqlite://"), seed=3)
+    single.populate_profile_db("b")
+
+    assert bulk.populate_profile_dbs(["a", "b", "a"]) == ["a", "b"]
+    assert bulk.populate_profile_dbs(["a", "b"]) == []
+    assert amounts(bulk, "b") == amounts(single, "b")
+    assert sorted(bulk.list_credit_cards("a")) == sorted(CREDIT_CARD_NAMES)
+    assert bulk.list_known_recipients("a")
+    assert bulk.check_balances() == {}
+    assert count(bulk, PopulatedTable) == 2 * len(ProfileDB.TABLE_POPULATORS)
+
+
+def test_prewarm_profiles_in_worker_processes(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/profile.db"
+    session_ids = [f"warm_{i}" for i in range(4)]
+
+    report = prewarm(db_url, session_ids, workers=2, chunk_size=1, seed=1)
+    assert report["created"] == 4
+    assert report["rows"] > 0
+
+    report = prewarm(db_url, session_ids + ["warm_4"], workers=2, chunk_size=2)
+    assert (report["created"], report["skipped"]) == (1, 4)
+    profile_db = ProfileDB(create_profile_engine(db_url), lazy=True)
+    assert profile_db.session.query(Account).filter(
+        Account.session_id.startswith("warm_")
+    ).count() == 5
@@ -0,0 +1,112 @@
+import threading
+
+import numpy as np
+import pytest
+
+from actions.semantic_cache import SemanticIndex, SpacyEmbedder
+
+VOCABULARY = ["where", "is", "the", "calculator", "page", "report", "a", "bug", "crash"]
+
+
+def bag_of_words(text):
+    words = text.lower().split()
+    return np.array([words.count(word) for word in VOCABULARY], dtype=np.float32)
+
+
+def test_lookup_above_threshold():
+    index = SemanticIndex(bag_of_words, threshold=0.8)
+    index.add("where is the calculator page", "find_page")
+    index.add("report a bug", "provide_bug_report")
+
+    label, similarity = index.lookup("where is calculator page")
+    assert label == "find_page"
+    assert similarity > 0.8
+    assert index.lookup("crash") is None
+    # unknown words only, nothing to compare
+    assert index.lookup("сайн байна уу") is None
+
+
+def test_index_grows_past_initial_capacity():
+    index = SemanticIndex(bag_of_words, threshold=0.99)
+    for i in range(40):
+        index.add("report a bug " + "crash " * i, f"label_{i}")
+    assert index.size == 40
+    assert index.lookup("report a bug " + "crash " * 39)[0] == "label_39"
+
+
+def test_persisted_index_is_memory_mapped(tmp_path):
+    path = str(tmp_path / "fallback_index")
+    index = SemanticIndex(bag_of_words, threshold=0.8, path=path, save_every=100)
+    index.add("where is the calculator page", "find_page")
+    index.save()
+
+    loaded = SemanticIndex(bag_of_words, threshold=0.8, path=path)
+    assert isinstance(loaded.matrix, np.memmap)
+    assert loaded.lookup("where is calculator page")[0] == "find_page"
+
+    loaded.add("report a bug", "provide_bug_report")
+    assert loaded.lookup("report bug")[0] == "provide_bug_report"
+
+
+def test_save_replaces_the_index_in_one_step(tmp_path):
+    path = str(tmp_path / "fallback_index")
+    index = SemanticIndex(bag_of_words, threshold=0.8, path=path, save_every=100)
+    index.add("where is the calculator page", "find_page")
+    index.save()
+    index.add("report a bug", "provide_bug_report")
+    index.save()
+
+    # one matrix, the one the labels were saved with
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "fallback_index.2.npy",
+        "fallback_index.json",
+    ]
+    loaded = SemanticIndex(bag_of_words, threshold=0.8, path=path)
+    assert loaded.size == len(loaded.labels) == 2
+    assert loaded.lookup("report bug")[0] == "provide_bug_report"
+
+
+def test_negated_utterance_does_not_match():
+    index = SemanticIndex(bag_of_words, threshold=0.92)
+    index.add("I want to report a bug", "provide_bug_report")
+
+    # the bag of words cannot tell them apart, similarity is 1.0
+    assert index.lookup("I don't want to report a bug") is None
+    assert index.lookup("I dont want to report a bug") is None
+    assert index.lookup("please report a bug")[0] == "provide_bug_report"
+
+    index.add("I do not want to report a bug", "deny")
+    assert index.lookup("I don't want to report a bug")[0] == "deny"
+    assert index.lookup("I want to report a bug")[0] == "provide_bug_report"
+
+
+@pytest.mark.asyncio
+async def test_async_lookup_and_add_run_off_the_event_loop():
+    threads = set()
+
+    def embed(text):
+        threads.add(threading.get_ident())
+        return bag_of_words(text)
+
+    index = SemanticIndex(embed, threshold=0.8)
+    await index.aadd("where is the calculator page", "find_page")
+    label, _ = await index.alookup("where is calculator page")
+    assert label == "find_page"
+    assert threading.get_ident() not in threads
+
+
+def test_embedder_loads_in_the_background(monkeypatch):
+    loaded = threading.Event()
+    embedder = SpacyEmbedder("missing_model")
+
+    def load():
+        loaded.wait(5)
+        embedder._unavailable = True
+
+    monkeypatch.setattr(embedder, "_load", load)
+    # the first call does not wait for the model
+    assert embedder("report a bug") is None
+    loaded.set()
+    embedder.load_in_background().join(5)
+    assert embedder("report a bug") is None
+    assert embedder._unavailable
@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+from rasa_sdk import Tracker
+from rasa_sdk.events import SlotSet
+from rasa_sdk.executor import CollectingDispatcher
+
+from actions import single_flight as single_flight_module
+from actions.single_flight import SingleFlight, single_flight
+
+
+class SlowAction:
+    def __init__(self):
+        self.runs = 0
+        self.fail = False
+
+    def name(self):
+        return "action_slow"
+
+    @single_flight
+    async def run(self, dispatcher, tracker, domain):
+        self.runs += 1
+        await asyncio.sleep(0.05)
+        if self.fail:
+            raise RuntimeError("LLM unavailable")
+        dispatcher.utter_message(response="utter_feedback_received")
+        return [SlotSet("zz_confirm_form", None)]
+
+
+def make_tracker(events):
+    return Tracker(
+        sender_id="test_user",
+        slots={},
+        latest_message={},
+        events=events,
+        paused=False,
+        followup_action=None,
+        active_loop={"name": None},
+        latest_action_name="action_listen",
+    )
+
+
+@pytest.fixture(autouse=True)
+def action_requests(monkeypatch):
+    requests = SingleFlight(ttl=30)
+    monkeypatch.setattr(single_flight_module, "action_requests", requests)
+    return requests
+
+
+@pytest.mark.asyncio
+async def test_duplicate_requests_share_one_run(action_requests):
+    action = SlowAction()
+    events = [{"event": "user", "timestamp": 1.0, "text": "/affirm"}]
+    dispatchers = [CollectingDispatcher() for _ in range(3)]
+
+    results = await asyncio.gather(
+        *(action.run(d, make_tracker(events), {}) for d in dispatchers)
+    )
+    assert action.runs == 1
+    assert results == [[SlotSet("zz_confirm_form", None)]] * 3
+    assert results[0] is not results[1]
+    for dispatcher in dispatchers:
+        assert dispatcher.messages[0]["response"] == "utter_feedback_received"
+
+    # a late retry is answered from the finished result
+    retry = CollectingDispatcher()
+    assert await action.run(retry, make_tracker(events), {}) == results[0]
+    assert len(retry.messages) == 1
+    assert action.runs == 1
+    assert action_requests.stats() == {
+        "executed": 1,
+        "collapsed": 2,
+        "replayed": 1,
+        "in_flight": 0,
+    }
+
+    # a new event makes it a different request
+    events = events + [{"event": "user", "timestamp": 2.0, "text": "/affirm"}]
+    await action.run(CollectingDispatcher(), make_tracker(events), {})
+    assert action.runs == 2
+
+
+@pytest.mark.asyncio
+async def test_failures_are_shared_but_not_cached():
+    action = SlowAction()
+    action.fail = True
+    events = [{"event": "user", "timestamp": 1.0, "text": "/affirm"}]
+
+    results = await asyncio.gather(
+        *(
+            action.run(CollectingDispatcher(), make_tracker(events), {})
+            for _ in range(2)
+        ),
+        return_exceptions=True,
+    )
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert action.runs == 1
+
+    action.fail = False
+    await action.run(CollectingDispatcher(), make_tracker(events), {})
+    assert action.runs == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_request_does_not_cancel_duplicates():
+    action = SlowAction()
+    events = [{"event": "user", "timestamp": 1.0, "text": "/affirm"}]
+
+    def request():
+        return action.run(CollectingDispatcher(), make_tracker(events), {})
+
+    first = asyncio.ensure_future(request())
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(request())
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == [SlotSet("zz_confirm_form", None)]
+    assert action.runs == 1
+
+
+@pytest.mark.asyncio
+async def test_trackers_without_events_are_not_collapsed():
+    action = SlowAction()
+    await asyncio.gather(
+        *(action.run(CollectingDispatcher(), make_tracker([]), {}) for _ in range(2))
+    )
+    assert action.runs == 2
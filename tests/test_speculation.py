@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+from rasa_sdk.executor import Tracker
+
+from actions import actions
+from actions.actions import ValidateRequestFeatureForm, USER_STORY_SLOTS
+from actions.speculation import SpeculativeTasks
+
+
+@pytest.mark.asyncio
+async def test_take_returns_result_for_same_inputs():
+    tasks = SpeculativeTasks()
+
+    async def draft():
+        return "draft"
+
+    assert tasks.start("user", ("a",), draft)
+    assert not tasks.start("user", ("a",), draft)
+    assert await tasks.take("user", ("a",)) == "draft"
+    assert await tasks.take("user", ("a",)) is None
+    assert tasks.reused == 1
+
+
+@pytest.mark.asyncio
+async def test_new_inputs_cancel_previous_task():
+    tasks = SpeculativeTasks()
+    started = asyncio.Event()
+
+    async def slow_draft():
+        started.set()
+        await asyncio.sleep(10)
+
+    async def draft():
+        return "second"
+
+    tasks.start("user", ("a",), slow_draft)
+    await started.wait()
+    tasks.start("user", ("b",), draft)
+
+    assert await tasks.take("user", ("a",)) is None
+    assert len(tasks) == 0
+
+
+def feature_tracker(**slots):
+    return Tracker(
+        sender_id="test_user",
+        slots={**{slot: "value" for slot in USER_STORY_SLOTS}, **slots},
+        latest_message={},
+        events=[],
+        paused=False,
+        followup_action=None,
+        active_loop={"name": "feature_request_form"},
+        latest_action_name="action_listen",
+    )
+
+
+@pytest.mark.asyncio
+async def test_feature_description_with_details_skips_draft(dispatcher, domain, monkeypatch):
+    prompts = []
+
+    async def slow_draft():
+        await asyncio.sleep(10)
+
+    async def complete_sentences(messages, max_sentences, **params):
+        prompts.append(messages[0]["content"])
+        return "As a user I want PDF exports."
+
+    monkeypatch.setattr(actions.llm_gateway, "complete_sentences", complete_sentences)
+    monkeypatch.setattr(actions, "user_story_drafts", SpeculativeTasks())
+
+    action = ValidateRequestFeatureForm()
+    tracker = feature_tracker()
+    actions.user_story_drafts.start(tracker.sender_id, action.user_story_fields(tracker), slow_draft)
+
+    result = await action.validate_feature_description(
+        "It should also export to PDF", dispatcher, tracker, domain
+    )
+
+    # one completion, without waiting for the draft
+    assert result == {
+        "feature_description": "It should also export to PDF",
+        "user_story": "As a user I want PDF exports.",
+    }
+    assert len(prompts) == 1
+    assert "Description: It should also export to PDF" in prompts[0]
+    assert actions.user_story_drafts.discarded == 1
+    assert len(actions.user_story_drafts) == 0
+
+
+@pytest.mark.asyncio
+async def test_draft_starts_once_the_fields_are_filled(dispatcher, domain, monkeypatch):
+    calls = []
+
+    async def complete_sentences(messages, max_sentences, **params):
+        calls.append(messages)
+        return "drafted story"
+
+    monkeypatch.setattr(actions.llm_gateway, "complete_sentences", complete_sentences)
+    drafts = SpeculativeTasks()
+    monkeypatch.setattr(actions, "user_story_drafts", drafts)
+    action = ValidateRequestFeatureForm()
+
+    # a field the draft depends on is still missing
+    tracker = feature_tracker(AA_CONTINUE_FORM="yes", feature_priority=None, feature_description=None)
+    await action.run(dispatcher, tracker, domain)
+    assert drafts.started == 0
+
+    tracker = feature_tracker(AA_CONTINUE_FORM="yes", feature_description=None)
+    await action.run(dispatcher, tracker, domain)
+    # asking for the description again does not restart the draft
+    await action.run(dispatcher, tracker, domain)
+    assert drafts.started == 1
+
+    assert await drafts.take(tracker.sender_id, action.user_story_fields(tracker)) == "drafted story"
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_feature_description_reuses_draft_without_new_details(dispatcher, domain, monkeypatch):
+    calls = []
+
+    async def complete_sentences(messages, max_sentences, **params):
+        calls.append(messages)
+        return "drafted story"
+
+    monkeypatch.setattr(actions.llm_gateway, "complete_sentences", complete_sentences)
+    monkeypatch.setattr(actions, "user_story_drafts", SpeculativeTasks())
+
+    action = ValidateRequestFeatureForm()
+    tracker = feature_tracker()
+    story_fields = action.user_story_fields(tracker)
+    actions.user_story_drafts.start(
+        tracker.sender_id, story_fields, lambda: action.generate_user_story(story_fields)
+    )
+
+    result = await action.validate_feature_description("No.", dispatcher, tracker, domain)
+
+    assert result["user_story"] == "drafted story"
+    assert len(calls) == 1
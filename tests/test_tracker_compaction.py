@@ -0,0 +1,112 @@
+import json
+import time
+
+import sqlalchemy as sa
+from rasa_sdk import Tracker
+
+from actions import tracker_compaction
+from actions.actions import ActionSessionStart
+from actions.tracker_compaction import (
+    compact_tracker_store,
+    events_table,
+    metadata,
+    read_archive,
+)
+
+DAY = 24 * 60 * 60
+
+
+def add_events(engine, sender_id, events):
+    with engine.begin() as connection:
+        connection.execute(
+            events_table.insert(),
+            [
+                {
+                    "sender_id": sender_id,
+                    "type_name": event["event"],
+                    "timestamp": event["timestamp"],
+                    "data": json.dumps(event),
+                }
+                for event in events
+            ],
+        )
+
+
+def live_events(engine, sender_id):
+    with engine.connect() as connection:
+        rows = connection.execute(
+            sa.select(events_table.c.data)
+            .where(events_table.c.sender_id == sender_id)
+            .order_by(events_table.c.timestamp, events_table.c.id)
+        )
+        return [json.loads(row.data) for row in rows]
+
+
+def carried_over(events):
+    tracker = Tracker("user", {}, {}, events, False, None, {"name": None}, None)
+    return ActionSessionStart._slot_set_events_from_tracker(tracker)
+
+
+def conversation(start):
+    events = [
+        ("session_started", {}),
+        ("slot", {"name": "feature_description", "value": "dark mode"}),
+        ("slot", {"name": "bug_description", "value": "crash"}),
+        ("reset_slots", {}),
+        ("slot", {"name": "feature_description", "value": "export"}),
+        ("user", {"text": "hi"}),
+        ("session_started", {}),
+        ("slot", {"name": "zz_confirm_form", "value": "yes"}),
+        ("user", {"text": "old"}),
+    ]
+    return [
+        {"event": name, "timestamp": start + i * DAY, **data}
+        for i, (name, data) in enumerate(events)
+    ]
+
+
+def test_compaction_archives_old_sessions_and_keeps_slots(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path}/rasa.db")
+    metadata.create_all(engine)
+    old = conversation(time.time() - 100 * DAY)
+    recent = conversation(time.time() - 5 * DAY)
+    add_events(engine, "old", old)
+    add_events(engine, "recent", recent)
+
+    dry_run = compact_tracker_store(engine, 30, str(tmp_path), dry_run=True)
+    assert dry_run["archived"] == 6
+    assert len(live_events(engine, "old")) == len(old)
+
+    stats = compact_tracker_store(engine, 30, str(tmp_path / "archive"))
+    assert (stats["conversations"], stats["archived"], stats["snapshot"]) == (1, 6, 1)
+    assert [row["data"] for row in read_archive(stats["archive"])] == old[:6]
+
+    compacted = live_events(engine, "old")
+    assert compacted[1:] == old[6:]
+    assert compacted[0]["name"] == "feature_description"
+    assert carried_over(compacted) == carried_over(old)
+    assert live_events(engine, "recent") == recent
+
+    # a second run has nothing left to archive
+    stats = compact_tracker_store(engine, 30, str(tmp_path / "archive"))
+    assert (stats["archived"], stats["archive"]) == (0, None)
+    assert live_events(engine, "old") == compacted
+
+
+def test_archive_is_synced_before_events_are_deleted(tmp_path, monkeypatch):
+    engine = sa.create_engine(f"sqlite:///{tmp_path}/rasa.db")
+    metadata.create_all(engine)
+    add_events(engine, "old", conversation(time.time() - 100 * DAY))
+
+    synced = []
+
+    def fsync(fd):
+        # the events are still there while the archive is synced
+        synced.append(len(live_events(engine, "old")))
+
+    monkeypatch.setattr(tracker_compaction.os, "fsync", fsync)
+    compact_tracker_store(engine, 30, str(tmp_path / "archive"))
+
+    # the archive file and its directory
+    assert len(synced) == 2
+    assert synced == [9, 9]